@@ -13,7 +13,7 @@
 # limitations under the License.
 
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Dict
 
 import yaml
 import os
@@ -32,6 +32,84 @@ class WebserviceConfig:
     prompt: str
     host: str
     port: int
+    apikey_cache_ttl: float
+    apikey_cache_size: int
+    stream_flush_interval: float
+    stream_flush_chars: int
+
+
+@dataclass
+class JobsConfig:
+    workers: int
+    max_pending: int
+    poll_interval: float
+    concurrency: Dict[str, int]
+    priority: Dict[str, int]
+
+
+@dataclass
+class IngestionConfig:
+    max_buffered_pages: int
+    max_buffered_chunks: int
+    index_batch_size: int
+    http_cache_max_mb: int
+    transform_workers: int
+    transform_chunk_size: int
+
+
+@dataclass
+class AnswerCacheConfig:
+    enabled: bool
+    similarity_threshold: float
+    max_entries_per_project: int
+
+
+@dataclass
+class ChatConfig:
+    standalone_heuristic: bool
+    speculative_retrieval: bool
+    coalesce_first_questions: bool
+    context_tokens: int
+
+
+@dataclass
+class RetrievalConfig:
+    vector_weight: float
+    lexical_weight: float
+    rrf_k: int
+    fetch_k: int
+    mmr_lambda: float
+    # weights overriding the ones above, by project id
+    projects: Dict[str, Dict[str, float]]
+
+
+@dataclass
+class QueryEmbeddingCacheConfig:
+    max_entries: int
+    persist_db: Optional[str]
+    max_persisted_mb: int
+
+
+@dataclass
+class AdmissionConfig:
+    max_running: int
+    max_running_per_project: int
+    max_waiting: int
+    wait_timeout: float
+
+
+@dataclass
+class BenchmarkConfig:
+    enabled: bool
+    documents: int
+    answer_tokens: int
+    # medians (seconds) and log-normal sigmas of the latencies of the stand-in models
+    first_token_latency: float
+    first_token_latency_sigma: float
+    token_latency: float
+    token_latency_sigma: float
+    embedding_latency: float
+    embedding_latency_sigma: float
 
 
 @dataclass
@@ -44,11 +122,22 @@ class ByteBrainConfig:
     resources_db: str
     projects_db: str
     users_db: str
+    lexical_index_db: str
+    http_cache_db: str
     embeddings_dir: Optional[str]
     discord_cache_dir: Optional[str]
+    git_mirrors_dir: Optional[str]
     weaviate_url: Optional[str]
     webservice: WebserviceConfig
     discord: DiscordBotConfig
+    jobs: JobsConfig
+    ingestion: IngestionConfig
+    answer_cache: AnswerCacheConfig
+    chat: ChatConfig
+    retrieval: RetrievalConfig
+    query_embedding_cache: QueryEmbeddingCacheConfig
+    admission: AdmissionConfig
+    benchmark: BenchmarkConfig
 
 
 def load_config() -> ByteBrainConfig:
@@ -63,12 +152,24 @@ def load_config() -> ByteBrainConfig:
     resources_db = config['resources_db']
     projects_db = config['projects_db']
     users_db = config['users_db']
+    lexical_index_db = config['lexical_index_db']
+    http_cache_db = config['http_cache_db']
     embeddings_dir = config['embeddings_dir']
     discord_cache_dir = config['discord_cache_dir']
+    git_mirrors_dir = config['git_mirrors_dir']
     weaviate_url = config['weaviate_url'] \
         if os.environ.get('APP_ENV', 'development') == 'production' else "http://localhost:8080"
     webservice = WebserviceConfig(**config['webservice'])
     discord = DiscordBotConfig(**config['discord'])
+    jobs = JobsConfig(**config['jobs'])
+    ingestion = IngestionConfig(**config['ingestion'])
+    answer_cache = AnswerCacheConfig(**config['answer_cache'])
+    chat = ChatConfig(**config['chat'])
+    retrieval = RetrievalConfig(**config['retrieval'])
+    query_embedding_cache = QueryEmbeddingCacheConfig(**config['query_embedding_cache'])
+    admission = AdmissionConfig(**config['admission'])
+    benchmark = BenchmarkConfig(**config['benchmark'])
+    benchmark.enabled = benchmark.enabled or os.environ.get('APP_ENV') == 'benchmark'
 
     return ByteBrainConfig(name,
                            project_name,
@@ -78,8 +179,19 @@ def load_config() -> ByteBrainConfig:
                            resources_db,
                            projects_db,
                            users_db,
+                           lexical_index_db,
+                           http_cache_db,
                            embeddings_dir,
                            discord_cache_dir,
+                           git_mirrors_dir,
                            weaviate_url,
                            webservice,
-                           discord)
+                           discord,
+                           jobs,
+                           ingestion,
+                           answer_cache,
+                           chat,
+                           retrieval,
+                           query_embedding_cache,
+                           admission,
+                           benchmark)
@@ -26,15 +26,20 @@ from langchain.embeddings import CacheBackedEmbeddings
 from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.storage import LocalFileStore
 from langchain.vectorstores import VectorStore
-from langchain.vectorstores import Weaviate
 from structlog import getLogger
 from weaviate import Client
 
 import discord_utils
 from config import load_config
+from core.dao.lexical_index_dao import LexicalIndexDao
 from core.dao.metadata_dao import MetadataDao
 from core.docs.discord_loader import dump_channel_history, fetch_message_thread
-from core.llm.chains import make_question_answering_chain
+from core.llm.callbacks import QuestionTimer
+from core.llm.chains import get_question_answering_chain, ChainSettings
+from core.llm.embeddings import query_embedding_cache
+from core.llm.question_answering import aanswer_question
+from core.llm.vectorstores import WeaviateVectorStore
+from core.services.admission_service import AdmissionService, ServerBusy
 from core.services.document_service import DocumentService
 from core.services.vectorstore_service import VectorStoreService
 from core.utils.utils import annotate_history_with_turns_v2
@@ -50,21 +55,24 @@ embeddings_dir = config.embeddings_dir
 weaviate_client = Client(url=config.weaviate_url)
 underlying_embeddings: OpenAIEmbeddings = OpenAIEmbeddings()
 fs = LocalFileStore(config.embeddings_dir)
-cached_embedder = CacheBackedEmbeddings.from_bytes_store(
+cached_embedder = query_embedding_cache(CacheBackedEmbeddings.from_bytes_store(
     underlying_embeddings, fs, namespace=underlying_embeddings.model
-)
+), underlying_embeddings.model, config.query_embedding_cache)
 index_name = 'Zio'
 text_key = "text"
 
-weaviate: VectorStore = Weaviate(weaviate_client,
-                                 index_name=index_name,
-                                 text_key=text_key,
-                                 attributes=['source'],
-                                 embedding=cached_embedder,
-                                 by_text=False)
+weaviate: VectorStore = WeaviateVectorStore(weaviate_client,
+                                            index_name=index_name,
+                                            text_key=text_key,
+                                            attributes=['source'],
+                                            embedding=cached_embedder,
+                                            by_text=False)
 
-vectorstore_service = VectorStoreService(weaviate, weaviate_client, cached_embedder, index_name, text_key)
+lexical_index_dao = LexicalIndexDao(config.lexical_index_db)
+vectorstore_service = VectorStoreService(weaviate, weaviate_client, cached_embedder, index_name, text_key,
+                                         lexical_index_dao)
 metadata_dao = MetadataDao(config.metadata_docs_db)
+admission_service = AdmissionService(config.admission)
 indexer = DocumentService(vectorstore_service, metadata_dao)
 
 intents = discord.Intents.default()
@@ -193,23 +201,35 @@ async def on_message(message):
     if bot.user.mentioned_in(message) or is_private_message(message):
         async with message.channel.typing():
             log.info(f"received message from {message.channel} channel")
-            qa = make_question_answering_chain(
-                websocket=None,
+            timer = QuestionTimer(config.project_name)
+            qa = get_question_answering_chain(
+                project_id=config.project_name,
                 vector_store=weaviate,
-                prompt_template=config.discord.prompt
+                prompt_template=config.discord.prompt,
+                settings=ChainSettings.for_project(config.project_name, config.chat, config.retrieval),
+                lexical_index=lexical_index_dao,
+                # The index of the bot only holds the documents of its project
+                scope_to_project=False
             )
 
-            chat_history = ["FULL CHAT HISTORY:"] + annotate_history_with_turns_v2(
-                await fetch_message_thread(ctx, message))
-
-            result: dict[str, Any] = await qa.acall(
-                {
-                    "question": remove_discord_mention(message.content),
-                    "project_name": config.project_name,
-                    "chat_history": chat_history
-                },
-                return_only_outputs=True
-            )
+            with timer.stage("history"):
+                chat_history = ["FULL CHAT HISTORY:"] + annotate_history_with_turns_v2(
+                    await fetch_message_thread(ctx, message))
+
+            try:
+                async with admission_service.admit(config.project_name):
+                    result: dict[str, Any] = await aanswer_question(
+                        qa,
+                        question=remove_discord_mention(message.content),
+                        chat_history=chat_history,
+                        standalone_heuristic=config.chat.standalone_heuristic,
+                        speculative_retrieval=config.chat.speculative_retrieval,
+                        timer=timer
+                    )
+            except ServerBusy as e:
+                log.warning("Rejected a message, the bot is busy", reason=e.reason)
+                await message.reply("I'm answering too many questions right now, please ask again in a moment.")
+                return
             log.info("response for discord is ready", response={
                 "question": message.content,
                 "result": result['answer']
@@ -249,6 +269,7 @@ async def on_message(message):
             await message.reply(chunks[0])
             for chunk in chunks[1:]:
                 await ctx.send(chunk)
+            timer.observe()
     else:
         await bot.process_commands(message)
 
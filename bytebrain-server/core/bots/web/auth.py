@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from datetime import timedelta
 from typing import Annotated, Optional
@@ -23,6 +25,7 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 import os
 
+from core.dao.database import run_in_executor
 from core.dao.user_dao import UserInDB, UserDao, User
 
 # to get a string like this run:
@@ -30,9 +33,13 @@ from core.dao.user_dao import UserInDB, UserDao, User
 SECRET_KEY = os.environ['AUTH_SECRET_KEY']
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+PASSWORD_HASHING_WORKERS = 2
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/access_token")
+# bcrypt spends a few hundred milliseconds of CPU per password by design. It has its own threads so a burst of logins
+# queues behind itself instead of taking the DAO executor threads from the chat sockets.
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASHING_WORKERS, thread_name_prefix="password")
 
 
 def verify_password(plain_password, hashed_password) -> bool:
@@ -43,6 +50,15 @@ def get_password_hash(password) -> str:
     return pwd_context.hash(password)
 
 
+async def averify_password(plain_password, hashed_password) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_password_executor, verify_password, plain_password,
+                                                            hashed_password)
+
+
+async def aget_password_hash(password) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_password_executor, get_password_hash, password)
+
+
 def authenticate_user(email: str, password: str, user_dao: Annotated[UserDao, Depends()]) -> Optional[UserInDB]:
     user = user_dao.get_user_with_password(email)
     if not user:
@@ -52,6 +68,18 @@ def authenticate_user(email: str, password: str, user_dao: Annotated[UserDao, De
     return user
 
 
+async def aauthenticate_user(email: str, password: str, user_dao: UserDao) -> Optional[UserInDB]:
+    """
+    Like `authenticate_user`, with the user read on the DAO executor and the password verified on the password one.
+    """
+    user = await run_in_executor(user_dao.get_user_with_password, email)
+    if not user:
+        return None
+    if not await averify_password(password, user.hashed_password):
+        return None
+    return user
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -85,7 +113,7 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)],
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user: Optional[UserInDB] = user_dao.get_user(email=email)
+    user: Optional[UserInDB] = await run_in_executor(user_dao.get_user, email=email)
     if user is None:
         raise credentials_exception
     return user
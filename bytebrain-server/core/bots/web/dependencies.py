@@ -12,84 +12,218 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import dataclasses
 import os
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Optional
 
+from fastapi import FastAPI
 from langchain.embeddings import CacheBackedEmbeddings
 from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.storage import LocalFileStore
 from langchain.vectorstores import Weaviate
+from structlog import getLogger
 from weaviate import Client
 
-from config import load_config
+from config import load_config, ByteBrainConfig
 from core.bots.web.auth import *
 from core.dao.apikey_dao import ApiKeyDao
 from core.dao.feedback_dao import FeedbackDao
+from core.dao.http_cache_dao import HttpCacheDao
+from core.dao.job_dao import JobDao
+from core.dao.lexical_index_dao import LexicalIndexDao
 from core.dao.metadata_dao import MetadataDao
 from core.dao.project_dao import ProjectDao
 from core.dao.resource_dao import ResourceDao
+from core.llm.chains import set_llm_factory
+from core.llm.embeddings import QueryEmbeddingCache, query_embedding_cache
+from core.llm.fakes import FakeChatModel, FakeEmbeddings, InMemoryVectorStore, add_benchmark_documents
+from core.llm.vectorstores import WeaviateVectorStore
+from core.services.admission_service import AdmissionService
+from core.services.answer_cache_service import AnswerCacheService
+from core.services.job_service import JobService
 from core.services.project_service import ProjectService
 from core.services.resource_service import ResourceService
 from core.services.vectorstore_service import VectorStoreService
 
 config = load_config()
 
-# Feedback service setup
-feedback_service = FeedbackDao(config.feedbacks_db)
+log = getLogger()
+
+
+class ServiceContainer:
+    """
+    Holds the application-wide singletons of the webservice.
+
+    DAOs and services are built once when the application starts, so table creation and the recovery of
+    unfinished resources happen exactly once instead of on every request that depends on them.
+    """
+    index_name = 'Bytebrain'
+    text_key = "text"
+
+    def __init__(self, config: ByteBrainConfig):
+        self.config = config
+        self.weaviate_client: Optional[Client] = None
+        self.embedder: Optional[QueryEmbeddingCache] = None
+        self.weaviate: Optional[Weaviate] = None
+        self.lexical_index_dao: Optional[LexicalIndexDao] = None
+        self.vectorstore_service: Optional[VectorStoreService] = None
+        self.metadata_dao: Optional[MetadataDao] = None
+        self.resource_dao: Optional[ResourceDao] = None
+        self.project_dao: Optional[ProjectDao] = None
+        self.apikey_dao: Optional[ApiKeyDao] = None
+        self.feedback_dao: Optional[FeedbackDao] = None
+        self.job_dao: Optional[JobDao] = None
+        self.http_cache_dao: Optional[HttpCacheDao] = None
+        self.job_service: Optional[JobService] = None
+        self.answer_cache_service: Optional[AnswerCacheService] = None
+        self.resource_service: Optional[ResourceService] = None
+        self.project_service: Optional[ProjectService] = None
+        self.admission_service: Optional[AdmissionService] = None
+        self.benchmark_dir: Optional[tempfile.TemporaryDirectory] = None
+        self.benchmark_apikey: Optional[str] = None
+
+    def _start_backends(self):
+        # Vectorstore setup
+        os.environ['WEAVIATE_URL'] = self.config.weaviate_url
+        self.weaviate_client = Client(url=self.config.weaviate_url)
+        underlying_embeddings: OpenAIEmbeddings = OpenAIEmbeddings()
+        fs = LocalFileStore(self.config.embeddings_dir)
+        self.embedder = query_embedding_cache(CacheBackedEmbeddings.from_bytes_store(
+            underlying_embeddings, fs, namespace=underlying_embeddings.model
+        ), underlying_embeddings.model, self.config.query_embedding_cache)
+        self.weaviate = WeaviateVectorStore(self.weaviate_client,
+                                            index_name=self.index_name,
+                                            text_key=self.text_key,
+                                            attributes=['source'],
+                                            embedding=self.embedder,
+                                            by_text=False)
+        self.lexical_index_dao = LexicalIndexDao(self.config.lexical_index_db)
+        self.vectorstore_service = VectorStoreService(self.weaviate, self.weaviate_client, self.embedder,
+                                                      self.index_name, self.text_key, self.lexical_index_dao)
+
+    def _start_benchmark_backends(self):
+        # Stand-in models and vector store, and throwaway databases, so the chat pipeline runs without network
+        benchmark = self.config.benchmark
+        self.benchmark_dir = tempfile.TemporaryDirectory()
+        self.config = dataclasses.replace(self.config, **{
+            name: os.path.join(self.benchmark_dir.name, f"{name}.db")
+            for name in ["metadata_docs_db", "feedbacks_db", "background_jobs_db", "resources_db", "projects_db",
+                         "lexical_index_db", "http_cache_db"]
+        }, git_mirrors_dir=os.path.join(self.benchmark_dir.name, "git-mirrors"))
+        self.embedder = QueryEmbeddingCache(FakeEmbeddings(latency=benchmark.embedding_latency,
+                                                           latency_sigma=benchmark.embedding_latency_sigma),
+                                            namespace="fake", max_size=self.config.query_embedding_cache.max_entries)
+        self.weaviate = InMemoryVectorStore(self.embedder)
+        self.lexical_index_dao = LexicalIndexDao(self.config.lexical_index_db)
+        self.vectorstore_service = VectorStoreService(self.weaviate, None, self.embedder,
+                                                      self.index_name, self.text_key, self.lexical_index_dao)
+        set_llm_factory(lambda model_name, temperature, streaming: FakeChatModel.from_config(
+            benchmark, streaming, answer_tokens=None if streaming else 16))
+
+    def _create_benchmark_project(self):
+        project = self.project_service.create_project("Benchmark", user_id="benchmark",
+                                                      description="Generated documents of the benchmark mode")
+        add_benchmark_documents(self.weaviate, self.config.benchmark.documents, lexical_index=self.lexical_index_dao,
+                                project_id=project.id)
+        apikey = self.project_service.generate_apikey(project.id, "benchmark", allowed_domains=[])
+        self.benchmark_apikey = apikey.apikey
+        log.info("Started in benchmark mode", apikey=self.benchmark_apikey)
+
+    def start(self):
+        if self.config.benchmark.enabled:
+            self._start_benchmark_backends()
+        else:
+            self._start_backends()
+
+        # DAOs setup
+        self.metadata_dao = MetadataDao(self.config.metadata_docs_db)
+        self.resource_dao = ResourceDao(self.config.resources_db)
+        self.project_dao = ProjectDao(self.config.projects_db)
+        self.apikey_dao = ApiKeyDao(self.config.projects_db)
+        self.feedback_dao = FeedbackDao(self.config.feedbacks_db)
+        self.job_dao = JobDao(self.config.background_jobs_db)
+        self.http_cache_dao = HttpCacheDao(self.config.http_cache_db, self.config.ingestion.http_cache_max_mb * 2 ** 20)
+
+        # Services setup
+        self.job_service = JobService(self.job_dao, self.config.jobs)
+        if self.config.answer_cache.enabled:
+            self.answer_cache_service = AnswerCacheService(self.embedder, self.config.answer_cache)
+        self.resource_service = ResourceService(self.resource_dao, self.vectorstore_service, self.metadata_dao,
+                                                self.job_service, self.config.ingestion, self.answer_cache_service,
+                                                self.http_cache_dao, self.config.git_mirrors_dir)
+        self.project_service = ProjectService(self.project_dao, self.resource_service, self.apikey_dao,
+                                              apikey_cache_ttl=self.config.webservice.apikey_cache_ttl,
+                                              apikey_cache_size=self.config.webservice.apikey_cache_size)
+        self.admission_service = AdmissionService(self.config.admission)
+
+        self.job_service.start()
+        self.resource_service.resume_unfinished_resources()
+        if self.config.benchmark.enabled:
+            self._create_benchmark_project()
+        log.info("Service container started")
+
+    def stop(self):
+        self.job_service.stop(timeout=5)
+        if self.benchmark_dir is not None:
+            self.benchmark_dir.cleanup()
+        log.info("Service container stopped")
+
+
+container = ServiceContainer(config)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    container.start()
+    yield
+    container.stop()
+
 
-# Vectorstore setup
-index_name = 'Bytebrain'
-text_key = "text"
-os.environ['WEAVIATE_URL'] = config.weaviate_url
-embeddings_dir = config.embeddings_dir
-weaviate_client = Client(url=config.weaviate_url)
-underlying_embeddings: OpenAIEmbeddings = OpenAIEmbeddings()
-fs = LocalFileStore(config.embeddings_dir)
-cached_embedder = CacheBackedEmbeddings.from_bytes_store(
-    underlying_embeddings, fs, namespace=underlying_embeddings.model
-)
+def weaviate() -> Weaviate:
+    return container.weaviate
 
 
-def weaviate():
-    return Weaviate(weaviate_client,
-                    index_name=index_name,
-                    text_key=text_key,
-                    attributes=['source'],
-                    embedding=cached_embedder,
-                    by_text=False)
+def lexical_index_dao() -> LexicalIndexDao:
+    return container.lexical_index_dao
 
 
-# Vectorstore service setup
-def vectorstore_service(weaviate: Annotated[Weaviate, Depends(weaviate)]):
-    return VectorStoreService(weaviate, weaviate_client, cached_embedder, index_name, text_key)
+def vectorstore_service() -> VectorStoreService:
+    return container.vectorstore_service
 
 
-# Resource service setup
-def metadata_dao():
-    return MetadataDao(config.metadata_docs_db)
+def metadata_dao() -> MetadataDao:
+    return container.metadata_dao
 
 
-def resource_dao():
-    return ResourceDao(config.resources_db)
+def resource_dao() -> ResourceDao:
+    return container.resource_dao
 
 
-def resource_service(
-        resource_dao: Annotated[ResourceDao, Depends(resource_dao)],
-        vectorstore_service: Annotated[VectorStoreService, Depends(vectorstore_service)],
-        metadata_dao: Annotated[MetadataDao, Depends(metadata_dao)]):
-    return ResourceService(resource_dao, vectorstore_service, metadata_dao)
+def resource_service() -> ResourceService:
+    return container.resource_service
 
 
-# document_service = DocumentService(vectorstore_service, metadata_dao)
+def project_dao() -> ProjectDao:
+    return container.project_dao
 
-def project_dao():
-    return ProjectDao(config.projects_db)
 
+def apikey_dao() -> ApiKeyDao:
+    return container.apikey_dao
 
-def apikey_dao():
-    return ApiKeyDao(config.projects_db)
 
+def feedback_dao() -> FeedbackDao:
+    return container.feedback_dao
 
-def project_service(project_dao: Annotated[ProjectDao, Depends(project_dao)],
-                    resource_service: Annotated[ResourceService, Depends(resource_service)],
-                    apikey_dao: Annotated[ApiKeyDao, Depends(apikey_dao)]):
-    return ProjectService(project_dao, resource_service, apikey_dao)
+
+def project_service() -> ProjectService:
+    return container.project_service
+
+
+def answer_cache_service() -> Optional[AnswerCacheService]:
+    return container.answer_cache_service
+
+
+def admission_service() -> AdmissionService:
+    return container.admission_service
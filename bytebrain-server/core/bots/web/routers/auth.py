@@ -23,6 +23,7 @@ from fastapi.param_functions import Form
 from pydantic.main import BaseModel
 
 from core.bots.web.auth import *
+from core.dao.database import run_in_executor
 from core.dao.user_dao import UserInDB, UserDao
 
 auth_router = router = APIRouter()
@@ -58,15 +59,16 @@ async def register(
         form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
         user_dao: Annotated[UserDao, Depends(UserDao)]
 ):
-    existing_user = user_dao.get_user(form_data.username)  # TODO: use email instead of username
+    existing_user = await run_in_executor(user_dao.get_user, form_data.username)  # TODO: use email instead of username
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="This user is already registered",
         )
 
-    hashed_password = get_password_hash(form_data.password)
-    user_dao.save_user(
+    hashed_password = await aget_password_hash(form_data.password)
+    await run_in_executor(
+        user_dao.save_user,
         UserInDB(
             id=str(uuid.uuid4()),
             email=form_data.username,  # TODO: use email instead of username
@@ -88,7 +90,7 @@ async def login_for_access_token(
         form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
         user_dao: Annotated[UserDao, Depends(UserDao)]
 ):
-    user = authenticate_user(
+    user = await aauthenticate_user(
         form_data.username,  # TODO: use email instead of username
         form_data.password,
         user_dao
@@ -110,9 +112,10 @@ async def get_access_token(
     github_access_token = await get_github_access_token(code)
     github_user = await get_user_data_from_github(f"Bearer {github_access_token}")
     email = github_user['email']
-    user = user_dao.get_user(email)
+    user = await run_in_executor(user_dao.get_user, email)
     if user is None:
-        user_dao.save_user(
+        await run_in_executor(
+            user_dao.save_user,
             UserInDB(
                 id=str(uuid.uuid5(namespace=USER_ID_NAMESPACE, name=email)),
                 email=email,
@@ -13,26 +13,39 @@
 # limitations under the License.
 
 import asyncio
+import functools
 import json
 import time
-from typing import Any, List
+from typing import Any, List, Optional
 from typing import Dict
 
 from fastapi import APIRouter
 from fastapi import WebSocket
+from langchain.schema import Document
 from langchain.vectorstores import Weaviate
-from prometheus_client import Counter, Histogram, CollectorRegistry, generate_latest
+from prometheus_client import Counter, Histogram, generate_latest
 from starlette.responses import Response
 from structlog import getLogger
 from websockets.exceptions import WebSocketException
 
 from config import load_config
 from core.bots.web.auth import *
-from core.bots.web.dependencies import project_service
+from core.bots.web.dependencies import admission_service
+from core.bots.web.dependencies import answer_cache_service
+from core.bots.web.dependencies import lexical_index_dao
 from core.bots.web.dependencies import project_service
 from core.bots.web.dependencies import weaviate
-from core.llm.chains import make_question_answering_chain
+from core.dao.database import run_in_executor
+from core.dao.lexical_index_dao import LexicalIndexDao
+from core.llm.callbacks import StreamingLLMCallbackHandler, QuestionTimer
+from core.llm.chains import get_question_answering_chain, ChainSettings, PackedConversationalRetrievalChain
+from core.llm.question_answering import aprepare_question, aget_documents, agenerate_answer, normalize_question, \
+    CACHED, COALESCED
+from core.llm.single_flight import SingleFlight
+from core.services.admission_service import AdmissionService, ServerBusy
+from core.services.answer_cache_service import AnswerCacheService, CachedAnswer
 from core.services.project_service import ProjectService
+from core.utils.metrics import registry, apikey_check_latency_histogram
 
 config = load_config()
 
@@ -40,6 +53,12 @@ chat_router = router = APIRouter()
 
 log = getLogger()
 
+single_flight = SingleFlight()
+
+_UNRESOLVED = object()
+
+SERVER_BUSY_MESSAGE = "The server is busy right now, please ask your question again in a moment."
+
 
 class ProjectNotFoundException(WebSocketException):
     def __init__(self, project_id, message, *args):
@@ -52,48 +71,71 @@ class ProjectNotFoundException(WebSocketException):
 @router.websocket("/chat/{apikey}")
 async def websocket_chat_endpoint(websocket: WebSocket, apikey: str,
                                   project_service: Annotated[ProjectService, Depends(project_service)],
-                                  weaviate: Annotated[Weaviate, Depends(weaviate)]):
+                                  weaviate: Annotated[Weaviate, Depends(weaviate)],
+                                  lexical_index_dao: Annotated[LexicalIndexDao, Depends(lexical_index_dao)],
+                                  answer_cache_service: Annotated[Optional[AnswerCacheService],
+                                                                  Depends(answer_cache_service)],
+                                  admission_service: Annotated[AdmissionService, Depends(admission_service)]):
     try:
         await websocket.accept()
 
         domain = websocket.headers.get('host').split(':')[0]
 
-        if not project_service.is_allowed(domain, apikey):
+        start_time = time.perf_counter()
+        # A warm apikey is resolved from memory, only a miss goes to the database executor
+        resolved = project_service.get_cached_apikey(apikey, default=_UNRESOLVED)
+        if resolved is _UNRESOLVED:
+            resolved = await run_in_executor(project_service.resolve_apikey, apikey)
+        if not ProjectService.allows_domain(resolved, domain):
             await websocket.close()
             raise WebSocketException("You cannot access this api from this domain!")
 
-        project = project_service.get_project_by_apikey(apikey)
-        if project is None:
-            raise Exception("Project not found!")
+        # The cached project is shared between the connections
+        project = resolved[1].copy()
+        apikey_check_latency_histogram.labels(project=project.id).observe(time.perf_counter() - start_time)
 
-        start_time = time.time()
         request_counter.inc()
 
-        qa = make_question_answering_chain(
-            websocket=websocket,
+        qa = get_question_answering_chain(
+            project_id=project.id,
             vector_store=weaviate,
-            prompt_template=config.webservice.prompt
+            prompt_template=config.webservice.prompt,
+            settings=ChainSettings.for_project(project.id, config.chat, config.retrieval),
+            lexical_index=lexical_index_dao
         )
+        streaming_handler = StreamingLLMCallbackHandler(websocket,
+                                                        flush_interval=config.webservice.stream_flush_interval,
+                                                        flush_chars=config.webservice.stream_flush_chars)
 
         while True:
             query = json.loads(await websocket.receive_text())
             log.info("Received a new query!", query=query)
-
-            result: dict[str, Any] = await qa.acall(
-                {
-                    "question": query["question"],
-                    "project_name": config.project_name,
-                    "chat_history": query["history"]
-                },
-                return_only_outputs=True
-            )
-
-            source_documents = extract_source_documents(result)
-            unique_refs = extract_references(source_documents)
-
-            await websocket.send_json({"token": "", "completed": True, "references": unique_refs[:3]})
-            duration = time.time() - start_time
-            response_time_histogram.labels(path="/chat").observe(duration)
+            timer = QuestionTimer(project.id)
+
+            async def admitted_answer_query(stream: StreamingLLMCallbackHandler) -> List[Dict[str, Any]]:
+                async with admission_service.admit(project.id):
+                    return await answer_query(qa, project.id, query, stream, answer_cache_service, timer)
+
+            try:
+                if config.chat.coalesce_first_questions and not query["history"]:
+                    # Identical first questions don't depend on anything but the project, so concurrent ones share
+                    # a single answer
+                    references, shared = await single_flight.run(
+                        (project.id, normalize_question(query["question"])), streaming_handler, admitted_answer_query,
+                        callbacks=[timer])
+                    if shared:
+                        timer.path = COALESCED
+                else:
+                    references = await admitted_answer_query(streaming_handler)
+            except ServerBusy as e:
+                log.warning("Rejected a query, the server is busy", reason=e.reason)
+                await websocket.send_json({"token": SERVER_BUSY_MESSAGE, "completed": True, "references": [],
+                                           "error": "server_busy"})
+                continue
+
+            await websocket.send_json({"token": "", "completed": True, "references": references})
+            timer.observe()
+            response_time_histogram.labels(path="/chat").observe(time.perf_counter() - timer.start_time)
             response_counter.inc()
 
     except ProjectNotFoundException as e:
@@ -110,15 +152,57 @@ async def websocket_chat_endpoint(websocket: WebSocket, apikey: str,
         log.error(f"WebSocket error!", cause=str(e))
 
 
+async def answer_query(qa: PackedConversationalRetrievalChain, project_id: str, query: dict,
+                       streaming_handler: StreamingLLMCallbackHandler,
+                       answer_cache_service: Optional[AnswerCacheService],
+                       timer: QuestionTimer) -> List[Dict[str, Any]]:
+    """
+    Stream the answer of a chat query to the client and return its references.
+    """
+    prepared = await aprepare_question(qa, query["question"], query["history"],
+                                       standalone_heuristic=config.chat.standalone_heuristic,
+                                       speculative_retrieval=config.chat.speculative_retrieval,
+                                       timer=timer)
+    question = prepared.question
+    question_embedding = None
+    cached_answer = None
+    generation = None
+    if answer_cache_service is not None:
+        with timer.stage("answer_cache"):
+            generation = answer_cache_service.generation(project_id)
+            question_embedding = await answer_cache_service.aembed_question(question)
+            cached_answer = answer_cache_service.lookup(project_id, question_embedding)
+
+    if cached_answer is not None:
+        log.info("Answering from the answer cache", question=question, cached_question=cached_answer.question)
+        prepared.discard()
+        timer.path = CACHED
+        await streaming_handler.replay(cached_answer.answer, callbacks=[timer])
+        references = cached_answer.references
+    else:
+        documents = await aget_documents(qa, prepared, timer=timer)
+        with timer.stage("generate"):
+            answer = await agenerate_answer(qa, question, documents, callbacks=[streaming_handler, timer])
+            await streaming_handler.flush()
+
+        source_documents = extract_source_documents(documents)
+        references = extract_references(source_documents)[:3]
+        if answer_cache_service is not None:
+            answer_cache_service.store(project_id, question_embedding,
+                                       CachedAnswer(question=question, answer=answer, references=references),
+                                       generation)
+    return references
+
+
 def extract_references(source_documents) -> List[Dict[str, Any]]:
     references = [{k: v for k, v in d.items() if k != "page_content"} for d in source_documents]
     unique_refs = [dict(t) for t in {tuple(d.items()) for d in references}]
     return unique_refs
 
 
-def extract_source_documents(result) -> list[dict[str, Any]]:
+def extract_source_documents(documents: List[Document]) -> list[dict[str, Any]]:
     source_documents: list[dict[str, Any]] = []
-    for src_doc in result["source_documents"]:
+    for src_doc in documents:
         metadata = src_doc.metadata
         if "doc_source_id" in metadata:
             doc_source_id = metadata["doc_source_id"]
@@ -137,16 +221,20 @@ def extract_source_documents(result) -> list[dict[str, Any]]:
     return source_documents
 
 
+@functools.lru_cache(maxsize=None)
+def dummy_chat_response() -> str:
+    with open('core/bots/web/dummy/chat.md', 'r') as file:
+        return file.read()
+
+
 # WebSocket endpoint for dummy chat
 @router.websocket("/dummy_chat/{project_id}")
 async def websocket_dummy_chat_endpoint(websocket: WebSocket):
     await websocket.accept()
+    response = dummy_chat_response()
     while True:
         await websocket.receive_text()
 
-        with open('core/bots/web/dummy/chat.md', 'r') as file:
-            response = file.read()
-
         tokens = [{"token": token + " ", "completed": False} for token in response.split(" ")]
         tokens.append(
             {"completed": True,
@@ -162,10 +250,9 @@ async def websocket_dummy_chat_endpoint(websocket: WebSocket):
 
 
 # Prometheus metrics setup
-registry = CollectorRegistry()
 request_counter = Counter("requests_total", "Total requests", registry=registry)
 response_counter = Counter("responses_total", "Total responses", registry=registry)
-response_time_histogram = Histogram("response_latency", "Response latency (seconds)",
+response_time_histogram = Histogram("response_latency", "Latency of answering a chat question (seconds)",
                                     labelnames=["path"], registry=registry)
 
 
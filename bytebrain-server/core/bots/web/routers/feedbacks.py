@@ -12,16 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from fastapi import APIRouter
+from typing import Annotated
+
+from fastapi import APIRouter, Depends
 from starlette.responses import JSONResponse
 
-from core.bots.web.dependencies import feedback_service
-from core.dao.feedback_dao import Feedback
+from core.bots.web.dependencies import feedback_dao
+from core.dao.feedback_dao import Feedback, FeedbackDao
 
 feedbacks_router = router = APIRouter()
 
 
 @router.post("/feedbacks/", response_model=Feedback)
-def create_feedback(feedback: Feedback):
-    feedback_service.add_feedback(feedback)
+def create_feedback(feedback: Feedback, feedback_dao: Annotated[FeedbackDao, Depends(feedback_dao)]):
+    feedback_dao.add_feedback(feedback)
     return JSONResponse(content={"message": "Feedback received"}, status_code=200)
@@ -20,6 +20,7 @@ from starlette.responses import JSONResponse
 
 from core.bots.web.auth import *
 from core.bots.web.dependencies import project_service
+from core.dao.database import run_in_executor
 from core.dao.apikey_dao import ApiKey
 from core.dao.project_dao import Project
 from core.dao.user_dao import User
@@ -37,7 +38,8 @@ class ProjectCreation(BaseModel):
 async def create_project(project: ProjectCreation,
                          current_user: Annotated[User, Depends(get_current_active_user)],
                          project_service: Annotated[ProjectService, Depends(project_service)]):
-    return project_service.create_project(
+    return await run_in_executor(
+        project_service.create_project,
         name=project.name,
         user_id=current_user.id,
         description=project.description
@@ -49,27 +51,27 @@ async def delete_project(
         project_id,
         current_user: Annotated[User, Depends(get_current_active_user)],
         project_service: Annotated[ProjectService, Depends(project_service)]):
-    project_service.delete_project(project_id, current_user.id)
+    await run_in_executor(project_service.delete_project, project_id, current_user.id)
 
 
 @router.delete("/projects/", status_code=204, tags=["Projects"])
 async def delete_all_project(
         current_user: Annotated[User, Depends(get_current_active_user)],
         project_service: Annotated[ProjectService, Depends(project_service)]):
-    project_service.delete_projects_owned_by(current_user.id)
+    await run_in_executor(project_service.delete_projects_owned_by, current_user.id)
 
 
 @router.get("/projects/", response_model=list[Project], tags=["Projects"])
 # TODO: exclude resources when its empty
 async def get_all_projects(current_user: Annotated[User, Depends(get_current_active_user)],
                            project_service: Annotated[ProjectService, Depends(project_service)]):
-    return project_service.get_all_projects(current_user.id)
+    return await run_in_executor(project_service.get_all_projects, current_user.id)
 
 
 @router.get("/projects/{project_id}", tags=["Projects"])
 async def get_project_by_id(project_id: str, current_user: Annotated[User, Depends(get_current_active_user)],
                             project_service: Annotated[ProjectService, Depends(project_service)]):
-    project = project_service.get_project_by_id(project_id)
+    project = await run_in_executor(project_service.get_project_by_id, project_id)
     if project.user_id == current_user.id:
         if project:
             return project
@@ -96,10 +98,11 @@ async def generate_apikey(
         apikey: CreateApiKey,
         current_user: Annotated[User, Depends(get_current_active_user)],
         project_service: Annotated[ProjectService, Depends(project_service)]):
-    users_projects = project_service.get_all_projects(current_user.id)
+    users_projects = await run_in_executor(project_service.get_all_projects, current_user.id)
     project_ids = [u.user_id for u in users_projects]
     if current_user.id in project_ids:
-        return project_service.generate_apikey(
+        return await run_in_executor(
+            project_service.generate_apikey,
             project_id=project_id,
             name=apikey.name,
             allowed_domains=apikey.allowed_domains,
@@ -111,10 +114,10 @@ async def generate_apikey(
 @router.get("/projects/{project_id}/apikeys", response_model=List[ApiKey], tags=["Projects"])
 async def get_apikeys(project_id: str, current_user: Annotated[User, Depends(get_current_active_user)],
                       project_service: Annotated[ProjectService, Depends(project_service)]):
-    project = project_service.get_project_by_id(project_id)
+    project = await run_in_executor(project_service.get_project_by_id, project_id)
     if project:
         if project.user_id == current_user.id:
-            return project_service.apikey_dao.get_apikeys(project_id)
+            return await run_in_executor(project_service.apikey_dao.get_apikeys, project_id)
         else:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -130,4 +133,4 @@ async def delete_project(
         api_key,
         current_user: Annotated[User, Depends(get_current_active_user)],
         project_service: Annotated[ProjectService, Depends(project_service)]):
-    project_service.delete_apikey(api_key, project_id, current_user.id)
+    await run_in_executor(project_service.delete_apikey, api_key, project_id, current_user.id)
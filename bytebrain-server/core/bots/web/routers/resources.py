@@ -20,6 +20,7 @@ from starlette.responses import JSONResponse
 
 from core.bots.web.auth import *
 from core.bots.web.dependencies import project_service, resource_service
+from core.dao.database import run_in_executor
 from core.dao.user_dao import User
 from core.services.project_service import ProjectService
 from core.services.resource_service import ResourceService
@@ -39,10 +40,11 @@ async def submit_new_website_resource(resource: WebsiteResourceRequest,
                                       current_user: Annotated[User, Depends(get_current_active_user)],
                                       project_service: Annotated[ProjectService, Depends(project_service)],
                                       resource_service: Annotated[ResourceService, Depends(resource_service)]):
-    project = project_service.get_project_by_id(resource.project_id)
+    project = await run_in_executor(project_service.get_project_by_id, resource.project_id)
     if project is not None:
         if project.user_id == current_user.id:
-            resource_id = resource_service.submit_website_resource(resource.name, resource.url, resource.project_id)
+            resource_id = await run_in_executor(resource_service.submit_website_resource,
+                                                resource.name, resource.url, resource.project_id)
         else:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -68,10 +70,11 @@ async def submit_new_webpage_resource(resource: WebpageResourceRequest,
                                       current_user: Annotated[User, Depends(get_current_active_user)],
                                       project_service: Annotated[ProjectService, Depends(project_service)],
                                       resource_service: Annotated[ResourceService, Depends(resource_service)]):
-    project = project_service.get_project_by_id(resource.project_id)
+    project = await run_in_executor(project_service.get_project_by_id, resource.project_id)
     if project is not None:
         if project.user_id == current_user.id:
-            resource_id = resource_service.submit_webpage_resource(resource.name, resource.url, resource.project_id)
+            resource_id = await run_in_executor(resource_service.submit_webpage_resource,
+                                                resource.name, resource.url, resource.project_id)
         else:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -97,10 +100,11 @@ async def submit_new_youtube_resource(resource: YoutubeResourceRequest,
                                       current_user: Annotated[User, Depends(get_current_active_user)],
                                       project_service: Annotated[ProjectService, Depends(project_service)],
                                       resource_service: Annotated[ResourceService, Depends(resource_service)]):
-    project = project_service.get_project_by_id(resource.project_id)
+    project = await run_in_executor(project_service.get_project_by_id, resource.project_id)
     if project is not None:
         if project.user_id == current_user.id:
-            resource_id = resource_service.submit_youtube_resource(resource.name, resource.url, resource.project_id)
+            resource_id = await run_in_executor(resource_service.submit_youtube_resource,
+                                                resource.name, resource.url, resource.project_id)
         else:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -152,15 +156,16 @@ async def submit_new_github_resource(resource: GithubResourceRequest,
                                      project_service: Annotated[ProjectService, Depends(project_service)],
                                      resource_service: Annotated[ResourceService, Depends(resource_service)]):
     paths = resource.paths if resource.paths is not None else "*"
-    project = project_service.get_project_by_id(resource.project_id)
+    project = await run_in_executor(project_service.get_project_by_id, resource.project_id)
     if project is not None:
         if project.user_id == current_user.id:
-            resource_id = resource_service.submit_github_resource(resource.name,
-                                                                  resource.language.value,
-                                                                  resource.clone_url,
-                                                                  paths,
-                                                                  resource.branch,
-                                                                  resource.project_id)
+            resource_id = await run_in_executor(resource_service.submit_github_resource,
+                                                resource.name,
+                                                resource.language.value,
+                                                resource.clone_url,
+                                                paths,
+                                                resource.branch,
+                                                resource.project_id)
         else:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -185,10 +190,10 @@ async def update_resource(
         current_user: Annotated[User, Depends(get_current_active_user)],
         project_service: Annotated[ProjectService, Depends(project_service)],
         resource_service: Annotated[ResourceService, Depends(resource_service)]):
-    resource = resource_service.get_resource_by_id(resource_id)
-    project = project_service.get_project_by_id(resource.project_id)
+    resource = await run_in_executor(resource_service.get_resource_by_id, resource_id)
+    project = await run_in_executor(project_service.get_project_by_id, resource.project_id)
     if project.user_id == current_user.id:
-        if resource_service.submit_resource_update(resource_id):
+        if await run_in_executor(resource_service.submit_resource_update, resource_id):
             return JSONResponse({
                 "resource_id": resource_id,
                 "message": "The update request has been submitted successfully."
@@ -210,12 +215,12 @@ async def delete_resource(resource_id: str,
                           current_user: Annotated[User, Depends(get_current_active_user)],
                           project_service: Annotated[ProjectService, Depends(project_service)],
                           resource_service: Annotated[ResourceService, Depends(resource_service)]):
-    resource = resource_service.get_resource_by_id(resource_id)
+    resource = await run_in_executor(resource_service.get_resource_by_id, resource_id)
     if resource is not None:
-        project = project_service.get_project_by_id(resource.project_id)
+        project = await run_in_executor(project_service.get_project_by_id, resource.project_id)
         if project is not None:
             if project.user_id == current_user.id:
-                resource_service.delete_resource(resource_id)
+                await run_in_executor(resource_service.delete_resource, resource_id)
             else:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
@@ -13,18 +13,21 @@
 # limitations under the License.
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
 
 from config import load_config
+from core.bots.web.dependencies import lifespan
 from core.bots.web.routers.auth import auth_router
 from core.bots.web.routers.users import users_router
 from core.bots.web.routers.chat import chat_router
 from core.bots.web.routers.feedbacks import feedbacks_router
 from core.bots.web.routers.projects import projects_router
 from core.bots.web.routers.resources import resources_router
+from core.services.job_service import JobQueueFull
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.include_router(users_router)
 app.include_router(auth_router)
 app.include_router(resources_router)
@@ -32,6 +35,13 @@ app.include_router(projects_router)
 app.include_router(chat_router)
 app.include_router(feedbacks_router)
 
+
+@app.exception_handler(JobQueueFull)
+async def job_queue_full_handler(request: Request, e: JobQueueFull):
+    return JSONResponse({"message": "Too many resources are waiting to be indexed, please try again later."},
+                        status_code=503)
+
+
 origins = ['http://localhost:5173']
 
 app.add_middleware(
@@ -12,12 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import sqlite3
 from datetime import datetime
 from typing import List, Optional
 
 from pydantic import BaseModel
 
+from core.dao.database import get_pool
+
 
 class ChatModel(BaseModel):
     id: str
@@ -30,40 +31,35 @@ class ChatModel(BaseModel):
 class ChatModelDao:
     def __init__(self, project_db):
         self.db_path = project_db
+        self.db = get_pool(project_db)
         self._create_table()
 
     def add_model(self, chatmodel: ChatModel) -> Optional[ChatModel]:
-        with sqlite3.connect(self.db_path) as connection:
-            cursor = connection.cursor()
-            query = '''
-                INSERT OR IGNORE INTO chatmodel (id, project_id, name, prompt, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            '''
-            values = (
-                chatmodel.id,
-                chatmodel.project_id,
-                chatmodel.name,
-                chatmodel.prompt,
-                chatmodel.created_at,
-            )
-            cursor.execute(query, values)
-            connection.commit()
-
-            # Check if a new row was inserted
-            if cursor.rowcount > 0:
-                return chatmodel
-            else:
-                return None
+        query = '''
+            INSERT OR IGNORE INTO chatmodel (id, project_id, name, prompt, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        '''
+        values = (
+            chatmodel.id,
+            chatmodel.project_id,
+            chatmodel.name,
+            chatmodel.prompt,
+            chatmodel.created_at,
+        )
+        inserted_rows = self.db.execute(query, values)
+
+        # Check if a new row was inserted
+        if inserted_rows > 0:
+            return chatmodel
+        else:
+            return None
 
     def get_models(self, project_id) -> List[ChatModel]:
         chatmodels = []
 
         try:
-            connection = sqlite3.connect(self.db_path)
-            cursor = connection.cursor()
-
             # Fetch API keys based on project_id
-            cursor.execute(
+            rows = self.db.fetchall(
                 """
                 SELECT id, name, prompt, created_at
                 FROM chatmodels
@@ -72,9 +68,6 @@ class ChatModelDao:
                 (project_id,)
             )
 
-            # Fetch all rows
-            rows = cursor.fetchall()
-
             # Convert rows to ApiKey objects
             for row in rows:
                 id, name, prompt, created_at = row
@@ -87,8 +80,6 @@ class ChatModelDao:
                 )
                 chatmodels.append(chatmodel)
 
-            connection.close()
-
         except Exception as e:
             print(f"Error fetching chatmodel: {e}")
 
@@ -96,60 +87,44 @@ class ChatModelDao:
 
     def get_model(self, id) -> Optional[ChatModel]:
         try:
-            with sqlite3.connect(self.db_path) as connection:
-                cursor = connection.cursor()
-
-                cursor.execute(
-                    """
-                    SELECT id, project_id, name, prompt, created_at
-                    FROM chatmodels 
-                    WHERE id = ?
-                    """,
-                    (id,)
-                )
+            row = self.db.fetchone(
+                """
+                SELECT id, project_id, name, prompt, created_at
+                FROM chatmodels 
+                WHERE id = ?
+                """,
+                (id,)
+            )
 
-                # Fetch the first row
-                row = cursor.fetchone()
-
-                if row:
-                    id, project_id, name, prompt, created_at = row
-                    chatmodel = ChatModel(
-                        id=id,
-                        project_id=project_id,
-                        name=name,
-                        prompt=prompt,
-                        created_at=datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S')
-                    )
-                    return chatmodel
-                else:
-                    return None
+            if row:
+                id, project_id, name, prompt, created_at = row
+                chatmodel = ChatModel(
+                    id=id,
+                    project_id=project_id,
+                    name=name,
+                    prompt=prompt,
+                    created_at=datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S')
+                )
+                return chatmodel
+            else:
+                return None
 
         except Exception as e:
             print(f"Error fetching chatmodel: {e}")
             return None
 
     def delete_model(self, id):
-        with sqlite3.connect(self.db_path) as connection:
-            cursor = connection.cursor()
-
-            resource_query = 'DELETE FROM apikeys WHERE id = ?'
-            resource_values = (id,)
-            cursor.execute(resource_query, resource_values)
-
-            connection.commit()
+        self.db.execute('DELETE FROM apikeys WHERE id = ?', (id,))
 
     def _create_table(self):
-        with sqlite3.connect(self.db_path) as connection:
-            cursor = connection.cursor()
-            query = f'''
-                CREATE TABLE IF NOT EXISTS chatmodels (
-                    id VARCHAR(255) PRIMARY KEY,
-                    project_id VARCHAR(255) NOT NULL,
-                    name VARCHAR(255) NOT NULL,
-                    prompt TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')),
-                    FOREIGN KEY (project_id) REFERENCES projects(id)
-                );
-            '''
-            cursor.execute(query)
-            connection.commit()
+        query = f'''
+            CREATE TABLE IF NOT EXISTS chatmodels (
+                id VARCHAR(255) PRIMARY KEY,
+                project_id VARCHAR(255) NOT NULL,
+                name VARCHAR(255) NOT NULL,
+                prompt TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')),
+                FOREIGN KEY (project_id) REFERENCES projects(id)
+            );
+        '''
+        self.db.execute(query)
@@ -0,0 +1,143 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, TypeVar
+
+BUSY_TIMEOUT = 5.0  # seconds
+CACHED_STATEMENTS = 256
+EXECUTOR_WORKERS = 8
+
+T = TypeVar('T')
+
+
+class ConnectionPool:
+    """
+    Shared access to a single SQLite database file.
+
+    Each thread gets its own long-lived connection, so the number of connections is bounded by the number of
+    threads (the web server's thread pool and the job workers) and connections and prepared statements are reused
+    across DAO calls instead of being opened for every query. The database runs in WAL mode, so readers on the chat
+    path are not blocked by the writes of the ingestion jobs; concurrent writers wait up to `BUSY_TIMEOUT` for the
+    write lock.
+
+    Connections are in autocommit mode; writes that must be atomic go through `transaction()`.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path,
+                                         timeout=BUSY_TIMEOUT,
+                                         isolation_level=None,
+                                         cached_statements=CACHED_STATEMENTS)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+        return connection
+
+    @contextmanager
+    def transaction(self, immediate: bool = True) -> Iterator[sqlite3.Cursor]:
+        """
+        Run the statements executed on the yielded cursor in a single transaction, which is committed on exit and
+        rolled back if an exception is raised. Immediate transactions take the write lock up front, which avoids
+        failing with "database is locked" when a read transaction is later upgraded to a write one.
+        """
+        connection = self.connection()
+        cursor = connection.cursor()
+        cursor.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        try:
+            yield cursor
+        except BaseException:
+            connection.rollback()
+            raise
+        else:
+            connection.commit()
+        finally:
+            cursor.close()
+
+    def execute(self, query: str, parameters: Sequence[Any] = ()) -> int:
+        """
+        Execute a single write statement in its own transaction and return the number of affected rows.
+        """
+        with self.transaction() as cursor:
+            cursor.execute(query, parameters)
+            return cursor.rowcount
+
+    def fetchone(self, query: str, parameters: Sequence[Any] = ()) -> Optional[tuple]:
+        cursor = self.connection().execute(query, parameters)
+        try:
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+
+    def fetchall(self, query: str, parameters: Sequence[Any] = ()) -> List[tuple]:
+        cursor = self.connection().execute(query, parameters)
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def close(self):
+        """
+        Close the connection of the calling thread, a new one is opened on its next use.
+        """
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """
+    Return the connection pool of a database file, DAOs sharing a file (e.g. projects and API keys) share its pool.
+    """
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_path)
+        return pool
+
+
+_executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="dao")
+
+
+async def run_in_executor(function: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run a blocking DAO or service call on the DAO thread pool and await its result.
+
+    Async request handlers must use this instead of calling DAOs directly: a call that waits for the SQLite write
+    lock, e.g. while an indexing job is writing, would otherwise stall the event loop and every open chat socket
+    with it. The pool is small and fixed, which also bounds the number of per-thread connections it opens.
+
+    Example:
+        >>> project = await run_in_executor(project_service.get_project_by_id, project_id)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(function, *args, **kwargs))
@@ -0,0 +1,124 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+
+from core.dao.database import get_pool
+
+
+@dataclass
+class HttpCacheEntry:
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    body_hash: str
+    body: str
+
+
+class HttpCacheDao:
+    """
+    The last response of each crawled URL with its validators, so a re-crawl sends conditional requests and gets a
+    304 without a body for the pages that didn't change.
+
+    Bodies are stored compressed and the total size of the stored bodies is bounded by `max_size` bytes: once it is
+    exceeded, the least recently fetched entries are evicted until the cache is back below 90% of its size. The total
+    size is maintained by triggers, so checking it doesn't scan the cache on every write.
+    """
+
+    EVICTION_RATIO = 0.9
+
+    def __init__(self, db_path: str, max_size: int):
+        self.db_path = db_path
+        self.db = get_pool(db_path)
+        self.max_size = max_size
+        self._create_table_if_not_exists()
+
+    def _create_table_if_not_exists(self):
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS http_cache (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body_hash TEXT,
+                body BLOB,
+                size INTEGER,
+                fetched_at REAL
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS http_cache_fetched_at ON http_cache (fetched_at)')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS http_cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER)
+        ''')
+        self.db.execute('INSERT OR IGNORE INTO http_cache_size (id, total) VALUES (0, 0)')
+        self.db.execute('''
+            CREATE TRIGGER IF NOT EXISTS http_cache_insert AFTER INSERT ON http_cache BEGIN
+                UPDATE http_cache_size SET total = total + NEW.size;
+            END
+        ''')
+        self.db.execute('''
+            CREATE TRIGGER IF NOT EXISTS http_cache_update AFTER UPDATE OF size ON http_cache BEGIN
+                UPDATE http_cache_size SET total = total + NEW.size - OLD.size;
+            END
+        ''')
+        self.db.execute('''
+            CREATE TRIGGER IF NOT EXISTS http_cache_delete AFTER DELETE ON http_cache BEGIN
+                UPDATE http_cache_size SET total = total - OLD.size;
+            END
+        ''')
+
+    def get(self, url: str) -> Optional[HttpCacheEntry]:
+        row = self.db.fetchone('SELECT etag, last_modified, body_hash, body FROM http_cache WHERE url = ?', (url,))
+        if row is None:
+            return None
+        etag, last_modified, body_hash, body = row
+        return HttpCacheEntry(url, etag, last_modified, body_hash, zlib.decompress(body).decode())
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], body_hash: str, body: str):
+        compressed_body = zlib.compress(body.encode())
+        with self.db.transaction() as cursor:
+            # An upsert rather than a replace, which would delete the row without firing the delete trigger
+            cursor.execute('''
+                INSERT INTO http_cache (url, etag, last_modified, body_hash, body, size, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified,
+                    body_hash = excluded.body_hash, body = excluded.body, size = excluded.size,
+                    fetched_at = excluded.fetched_at
+            ''', (url, etag, last_modified, body_hash, compressed_body, len(compressed_body), time.time()))
+            self._evict(cursor)
+
+    def touch(self, url: str):
+        self.db.execute('UPDATE http_cache SET fetched_at = ? WHERE url = ?', (time.time(), url))
+
+    def delete(self, url: str):
+        self.db.execute('DELETE FROM http_cache WHERE url = ?', (url,))
+
+    def size(self) -> int:
+        return self.db.fetchone('SELECT total FROM http_cache_size')[0]
+
+    def _evict(self, cursor):
+        size = cursor.execute('SELECT total FROM http_cache_size').fetchone()[0]
+        if size <= self.max_size:
+            return
+        excess = size - self.max_size * self.EVICTION_RATIO
+        evicted = []
+        for url, entry_size in cursor.execute('SELECT url, size FROM http_cache ORDER BY fetched_at'):
+            if excess <= 0:
+                break
+            evicted.append((url,))
+            excess -= entry_size
+        cursor.executemany('DELETE FROM http_cache WHERE url = ?', evicted)
@@ -0,0 +1,209 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import uuid
+from datetime import datetime
+from enum import Enum
+from typing import Optional, List
+
+from pydantic import BaseModel
+
+from core.dao.database import get_pool
+
+
+class JobStatus(str, Enum):
+    Pending = 'pending'
+    Running = 'running'
+    Finished = 'finished'
+    Failed = 'failed'
+    Cancelled = 'cancelled'
+
+
+class JobQueueFull(Exception):
+    def __init__(self, pending_jobs: int):
+        super().__init__(f"Job queue is full: {pending_jobs} jobs are waiting to be processed")
+        self.pending_jobs = pending_jobs
+
+
+class Job(BaseModel):
+    id: str
+    job_type: str
+    job_group: str
+    priority: int
+    payload: dict
+    dedup_key: Optional[str]
+    status: JobStatus
+    error: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+    serial_key: Optional[str]
+
+
+# `SELECT *` would depend on the order the columns were added to the table
+JOB_COLUMNS = 'id, job_type, job_group, priority, payload, dedup_key, status, error, created_at, updated_at, serial_key'
+
+
+class JobDao:
+    def __init__(self, jobs_db):
+        self.db_path = jobs_db
+        self.db = get_pool(jobs_db)
+        self._create_table()
+
+    def _create_table(self):
+        with self.db.transaction() as cursor:
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    job_type TEXT NOT NULL,
+                    job_group TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    payload JSON,
+                    dedup_key TEXT,
+                    status TEXT DEFAULT '{JobStatus.Pending.value}',
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')),
+                    updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')),
+                    serial_key TEXT
+                )
+            ''')
+            # Jobs databases created before jobs could be serialized lack the column
+            columns = [row[1] for row in cursor.execute('PRAGMA table_info(jobs)').fetchall()]
+            if 'serial_key' not in columns:
+                cursor.execute('ALTER TABLE jobs ADD COLUMN serial_key TEXT')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS jobs_status_priority ON jobs (status, priority, created_at)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS jobs_dedup_key ON jobs (dedup_key, status)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS jobs_serial_key ON jobs (serial_key, status)
+            ''')
+
+    def add_job(self, job_type: str, job_group: str, priority: int, payload: dict,
+                dedup_key: Optional[str] = None, serial_key: Optional[str] = None,
+                max_pending: Optional[int] = None) -> Optional[str]:
+        """
+        Add a new pending job. Returns None if a pending or running job with the same dedup_key already exists, and
+        raises `JobQueueFull` if `max_pending` jobs are already pending.
+
+        Jobs with the same `serial_key` run one at a time, in the order they were added. A serialized job is only
+        deduplicated against pending jobs: it is queued behind a running job with the same dedup_key instead, as the
+        running job may have started before what the new job is meant to pick up.
+        """
+        job_id = str(uuid.uuid4())
+        with self.db.transaction() as cursor:
+            if dedup_key is not None:
+                statuses = [JobStatus.Pending.value] if serial_key is not None else \
+                    [JobStatus.Pending.value, JobStatus.Running.value]
+                cursor.execute(f'''
+                    SELECT id FROM jobs WHERE dedup_key = ? AND status IN ({', '.join('?' for _ in statuses)})
+                ''', (dedup_key, *statuses))
+                if cursor.fetchone():
+                    return None
+            if max_pending is not None:
+                # Counted in the same immediate transaction as the insert, so concurrent submissions can't exceed it
+                pending_jobs = cursor.execute('SELECT COUNT(*) FROM jobs WHERE status = ?',
+                                              (JobStatus.Pending.value,)).fetchone()[0]
+                if pending_jobs >= max_pending:
+                    raise JobQueueFull(pending_jobs)
+            cursor.execute('''
+                INSERT INTO jobs (id, job_type, job_group, priority, payload, dedup_key, status, serial_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (job_id, job_type, job_group, priority, json.dumps(payload), dedup_key, JobStatus.Pending.value,
+                  serial_key))
+        return job_id
+
+    def cancel_pending_jobs(self, dedup_key: str) -> int:
+        return self.db.execute('''
+            UPDATE jobs
+            SET status = ?,
+                updated_at = (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+            WHERE dedup_key = ? AND status = ?
+        ''', (JobStatus.Cancelled.value, dedup_key, JobStatus.Pending.value))
+
+    def claim_next_job(self, excluded_groups: List[str]) -> Optional[Job]:
+        """
+        Mark the pending job with the highest priority, which doesn't belong to one of the excluded groups and isn't
+        queued behind a job with the same serial key, as running and return it.
+        """
+        placeholders = ', '.join('?' for _ in excluded_groups)
+        group_filter = f'AND job_group NOT IN ({placeholders})' if excluded_groups else ''
+        with self.db.transaction() as cursor:
+            cursor.execute(f'''
+                SELECT {JOB_COLUMNS} FROM jobs
+                WHERE status = ? {group_filter}
+                  AND (serial_key IS NULL OR NOT EXISTS (
+                    SELECT 1 FROM jobs AS earlier
+                    WHERE earlier.serial_key = jobs.serial_key
+                      AND (earlier.status = ?
+                           OR earlier.status = ? AND (earlier.created_at, earlier.rowid) < (jobs.created_at, jobs.rowid))
+                  ))
+                ORDER BY priority, created_at
+                LIMIT 1
+            ''', (JobStatus.Pending.value, *excluded_groups, JobStatus.Running.value, JobStatus.Pending.value))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute('''
+                UPDATE jobs
+                SET status = ?,
+                    updated_at = (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+                WHERE id = ?
+            ''', (JobStatus.Running.value, row[0]))
+        job = self._to_job(row)
+        job.status = JobStatus.Running
+        return job
+
+    def set_status(self, job_id: str, status: JobStatus, error: Optional[str] = None):
+        self.db.execute('''
+            UPDATE jobs
+            SET status = ?,
+                error = ?,
+                updated_at = (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+            WHERE id = ?
+        ''', (status.value, error, job_id))
+
+    def get_by_id(self, job_id: str) -> Optional[Job]:
+        row = self.db.fetchone(f'SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?', (job_id,))
+        return self._to_job(row) if row else None
+
+    def get_pending_jobs_count(self) -> int:
+        return self.db.fetchone('SELECT COUNT(*) FROM jobs WHERE status = ?', (JobStatus.Pending.value,))[0]
+
+    def requeue_running_jobs(self) -> int:
+        """
+        Move the jobs that were running when the process stopped back to the pending state.
+        """
+        return self.db.execute('''
+            UPDATE jobs
+            SET status = ?,
+                updated_at = (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+            WHERE status = ?
+        ''', (JobStatus.Pending.value, JobStatus.Running.value))
+
+    @staticmethod
+    def _to_job(row) -> Job:
+        return Job(id=row[0],
+                   job_type=row[1],
+                   job_group=row[2],
+                   priority=row[3],
+                   payload=json.loads(row[4]),
+                   dedup_key=row[5],
+                   status=JobStatus(row[6]),
+                   error=row[7],
+                   created_at=datetime.strptime(row[8], '%Y-%m-%d %H:%M:%S.%f'),
+                   updated_at=datetime.strptime(row[9], '%Y-%m-%d %H:%M:%S.%f'),
+                   serial_key=row[10])
@@ -0,0 +1,199 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from langchain.schema import Document
+
+from core.dao.database import get_pool
+
+# Number of distinct terms of a question matched against the index, longer questions are truncated
+MAX_QUERY_TERMS = 64
+# Number of rows deleted by a single statement, below SQLite's limit of host parameters
+DELETE_BATCH_SIZE = 500
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*|[0-9]+")
+_CAMEL_CASE_PART = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+def lexical_terms(text: str) -> List[str]:
+    """
+    Split a text into the terms of the lexical index. A qualified identifier is kept as a whole, so an exact mention of
+    it is a rare term that scores high, and it is also split into its names and the words of its camel case names, so
+    a partial mention still matches.
+
+    Example:
+        >>> lexical_terms("ZLayer.fromFunction")
+        ['zlayer_fromfunction', 'zlayer', 'layer', 'fromfunction', 'from', 'function']
+    """
+    terms = []
+    for identifier in _IDENTIFIER.findall(text):
+        names = identifier.split(".")
+        if len(names) > 1:
+            terms.append("_".join(names).lower())
+        for name in names:
+            terms.append(name.lower())
+            parts = [part.lower() for part in _CAMEL_CASE_PART.findall(name)]
+            if len(parts) > 1:
+                terms.extend(part for part in parts if len(part) > 1)
+    return terms
+
+
+def _match_expression(query: str) -> str:
+    terms = list(dict.fromkeys(lexical_terms(query)))[:MAX_QUERY_TERMS]
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def _terms_table(project_id: Optional[str]) -> str:
+    if project_id is None:
+        return "lexical_terms"
+    return "lexical_terms_" + hashlib.sha1(project_id.encode()).hexdigest()[:16]
+
+
+class LexicalIndexDao:
+    """
+    A BM25 full-text index of the indexed chunks, kept next to the vector store to retrieve the chunks mentioning
+    the exact identifiers of a question, which embeddings match poorly.
+
+    Chunks are stored in `lexical_docs` and their terms in SQLite FTS5 tables, sharing the same rowid; both are
+    updated in the same transaction as chunks are indexed and deleted. Each project has its own FTS5 table, so a
+    search only reads the posting lists of the chunks of its project and its latency doesn't grow with the number of
+    projects. Chunks indexed without a project are in `lexical_terms`.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.db = get_pool(db_path)
+        self.terms_tables: Set[str] = set()
+        self._create_tables_if_not_exist()
+
+    def _create_tables_if_not_exist(self):
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS lexical_docs (
+                id INTEGER PRIMARY KEY,
+                uuid TEXT UNIQUE,
+                doc_source_id TEXT,
+                project_id TEXT,
+                text TEXT,
+                metadata JSON
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS lexical_docs_source ON lexical_docs (doc_source_id)')
+
+    def _terms_table_exists(self, table: str) -> bool:
+        if table not in self.terms_tables and self.db.fetchone(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)):
+            self.terms_tables.add(table)
+        return table in self.terms_tables
+
+    def _create_terms_table(self, cursor, table: str):
+        if table not in self.terms_tables:
+            cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(terms, tokenize = "unicode61 tokenchars '_'")
+            ''')
+            self.terms_tables.add(table)
+
+    @staticmethod
+    def _delete_rows(cursor, where: str, parameters: Tuple) -> int:
+        rows = cursor.execute(f'SELECT id, project_id FROM lexical_docs WHERE {where}', parameters).fetchall()
+        ids_by_table: Dict[str, List[int]] = defaultdict(list)
+        for id, project_id in rows:
+            ids_by_table[_terms_table(project_id)].append(id)
+        for table, ids in ids_by_table.items():
+            for start in range(0, len(ids), DELETE_BATCH_SIZE):
+                chunk = ids[start:start + DELETE_BATCH_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                cursor.execute(f'DELETE FROM {table} WHERE rowid IN ({placeholders})', chunk)
+                cursor.execute(f'DELETE FROM lexical_docs WHERE id IN ({placeholders})', chunk)
+        return len(rows)
+
+    def add_docs(self, uuids: Iterable[UUID], docs: List[Document]):
+        """
+        Index the chunks with the given ids, replacing the chunks previously indexed with the same ids. Chunks are
+        scoped to the project in their `project_id` metadata, if any.
+        """
+        with self.db.transaction() as cursor:
+            for uuid, doc in zip(uuids, docs):
+                project_id = doc.metadata.get('project_id')
+                table = _terms_table(project_id)
+                self._create_terms_table(cursor, table)
+                self._delete_rows(cursor, 'uuid = ?', (str(uuid),))
+                cursor.execute('''
+                    INSERT INTO lexical_docs (uuid, doc_source_id, project_id, text, metadata) VALUES (?, ?, ?, ?, ?)
+                ''', (str(uuid), doc.metadata.get('doc_source_id'), project_id, doc.page_content,
+                      json.dumps(doc.metadata)))
+                cursor.execute(f'INSERT INTO {table} (rowid, terms) VALUES (?, ?)',
+                               (cursor.lastrowid, " ".join(lexical_terms(doc.page_content))))
+
+    def delete_docs(self, uuids: Iterable[UUID]) -> int:
+        deleted = 0
+        with self.db.transaction() as cursor:
+            for uuid in uuids:
+                deleted += self._delete_rows(cursor, 'uuid = ?', (str(uuid),))
+        return deleted
+
+    def delete_docs_by_source_id(self, doc_source_id: str) -> int:
+        with self.db.transaction() as cursor:
+            return self._delete_rows(cursor, 'doc_source_id = ?', (doc_source_id,))
+
+    def count_docs_by_source_id(self) -> Dict[str, int]:
+        return dict(self.db.fetchall('SELECT doc_source_id, COUNT(*) FROM lexical_docs GROUP BY doc_source_id'))
+
+    def get_docs_ids_by_source_id(self, doc_source_id: str) -> Set[UUID]:
+        return {UUID(row[0]) for row in
+                self.db.fetchall('SELECT uuid FROM lexical_docs WHERE doc_source_id = ?', (doc_source_id,))}
+
+    def set_project_id(self, doc_source_id: str, project_id: str) -> int:
+        """
+        Scope the chunks of a source indexed without a project to `project_id`, moving their terms to the FTS5
+        table of the project.
+        """
+        table = _terms_table(project_id)
+        with self.db.transaction() as cursor:
+            rows = cursor.execute(
+                'SELECT id, metadata FROM lexical_docs WHERE doc_source_id = ? AND project_id IS NULL',
+                (doc_source_id,)).fetchall()
+            if not rows:
+                return 0
+            self._create_terms_table(cursor, table)
+            for id, metadata in rows:
+                cursor.execute(f'INSERT INTO {table} (rowid, terms) SELECT rowid, terms FROM lexical_terms '
+                               f'WHERE rowid = ?', (id,))
+                cursor.execute('DELETE FROM lexical_terms WHERE rowid = ?', (id,))
+                cursor.execute('UPDATE lexical_docs SET project_id = ?, metadata = ? WHERE id = ?',
+                               (project_id, json.dumps({**json.loads(metadata), 'project_id': project_id}), id))
+            return len(rows)
+
+    def search(self, query: str, k: int, project_id: Optional[str] = None) -> List[Tuple[Document, float]]:
+        """
+        Return the `k` chunks of a project matching the most terms of the query, best first, with their BM25 scores
+        (higher is better). Without `project_id`, the chunks indexed without a project are searched.
+        """
+        match = _match_expression(query)
+        table = _terms_table(project_id)
+        if not match or not self._terms_table_exists(table):
+            return []
+        rows = self.db.fetchall(f'''
+            SELECT lexical_docs.text, lexical_docs.metadata, bm25({table}) AS rank
+            FROM {table} JOIN lexical_docs ON lexical_docs.id = {table}.rowid
+            WHERE {table} MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        ''', (match, k))
+        return [(Document(page_content=text, metadata=json.loads(metadata)), -rank) for text, metadata, rank in rows]
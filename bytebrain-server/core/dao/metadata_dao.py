@@ -15,13 +15,14 @@
 import json
 import sqlite3
 from datetime import datetime
-from sqlite3 import Connection
-from typing import Optional, List
+from typing import Dict, Optional, List
 from uuid import UUID
 from structlog import getLogger
 
 from langchain.schema import Document
 
+from core.dao.database import get_pool
+
 
 class MetadataServiceError(Exception):
     pass
@@ -47,22 +48,13 @@ class MetadataDao:
 
     def __init__(self, database_file: str):
         self.database_file = database_file
+        self.db = get_pool(database_file)
         self.create_table()
         self.logger = getLogger(name=self.__class__.__name__)
 
-    def create_connection(self) -> Optional[Connection]:
-        try:
-            conn: Connection = sqlite3.connect(self.database_file)
-            return conn
-        except sqlite3.Error as e:
-            print(e)
-        return None
-
     def create_table(self):
         try:
-            conn = self.create_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
+            self.db.execute('''
                 CREATE TABLE IF NOT EXISTS stored_docs (
                     uuid TEXT PRIMARY KEY,
                     source_id TEXT,
@@ -71,66 +63,80 @@ class MetadataDao:
                     metadata JSON
                 )
             ''')
-            conn.commit()
         except sqlite3.Error as e:
             print(e)
 
     def get_docs_ids_by_source_id(self, resource_id) -> List[UUID]:
-        with sqlite3.connect(self.database_file) as connection:
-            try:
-                cursor = connection.cursor()
-                select_query = "SELECT uuid FROM stored_docs WHERE source_id = ?"
-                cursor.execute(select_query, (resource_id,))
-                doc_ids = [UUID(row[0]) for row in cursor.fetchall()]
-                return doc_ids
-
-            except sqlite3.Error as e:
-                print(f"Error retrieving document IDs: {e}")
-                return []
+        try:
+            select_query = "SELECT uuid FROM stored_docs WHERE source_id = ?"
+            return [UUID(row[0]) for row in self.db.fetchall(select_query, (resource_id,))]
+
+        except sqlite3.Error as e:
+            print(f"Error retrieving document IDs: {e}")
+            return []
 
     def delete_docs_by_resource_id(self, resource_id: str) -> Optional[int]:
-        with sqlite3.connect(self.database_file) as connection:
-            try:
-                cursor = connection.cursor()
-                delete_query = "DELETE FROM stored_docs WHERE source_id = ?"
-                cursor.execute(delete_query, (resource_id,))
-                connection.commit()
-
-                if cursor.rowcount > 0:
-                    self.logger.info(f"Deleted {cursor.rowcount} rows with source_id {resource_id}")
-                    return cursor.rowcount
-                else:
-                    self.logger.warning(f"No rows found with source_id {resource_id}. Nothing deleted.")
-                    return None
-
-            except sqlite3.Error as e:
-                raise DeletionError(f"Error deleting documents by resource : {e}")
+        try:
+            deleted_rows = self.db.execute("DELETE FROM stored_docs WHERE source_id = ?", (resource_id,))
+
+            if deleted_rows > 0:
+                self.logger.info(f"Deleted {deleted_rows} rows with source_id {resource_id}")
+                return deleted_rows
+            else:
+                self.logger.warning(f"No rows found with source_id {resource_id}. Nothing deleted.")
+                return None
+
+        except sqlite3.Error as e:
+            raise DeletionError(f"Error deleting documents by resource : {e}")
+
+    def delete_docs(self, uuids: List[UUID]) -> int:
+        try:
+            with self.db.transaction() as cursor:
+                cursor.executemany("DELETE FROM stored_docs WHERE uuid = ?", [(str(uuid),) for uuid in uuids])
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            raise DeletionError(f"Error deleting documents by id : {e}")
+
+    def get_unscoped_source_ids(self) -> List[str]:
+        try:
+            return [row[0] for row in self.db.fetchall(
+                "SELECT DISTINCT source_id FROM stored_docs WHERE json_extract(metadata, '$.project_id') IS NULL")]
+        except sqlite3.Error as e:
+            raise FetchError(f"Error while fetching the sources of documents without project: {e}")
+
+    def count_docs_by_source_id(self) -> Dict[str, int]:
+        try:
+            return dict(self.db.fetchall("SELECT source_id, COUNT(*) FROM stored_docs GROUP BY source_id"))
+        except sqlite3.Error as e:
+            raise FetchError(f"Error while counting documents: {e}")
+
+    def set_project_id(self, doc_source_id: str, project_id: str) -> int:
+        try:
+            return self.db.execute(
+                "UPDATE stored_docs SET metadata = json_set(metadata, '$.project_id', ?) WHERE source_id = ?",
+                (project_id, doc_source_id))
+        except sqlite3.Error as e:
+            raise InsertionError(f"Error while setting the project of doc_source_id: {doc_source_id}: {e}")
 
     def get_metadata_list(self, doc_source_type: str, doc_source_id: str) -> List[dict]:
-        conn = self.create_connection()
-        cur = conn.cursor()
-        sql_query = f"""
+        sql_query = """
           SELECT uuid, source_id, source_type, created_at, metadata 
           FROM stored_docs
-          WHERE source_id = '{doc_source_id}' AND source_type = '{doc_source_type}'
+          WHERE source_id = ? AND source_type = ?
           ORDER BY created_at;
           """
         try:
-            cur.execute(sql_query)
-            result = cur.fetchall()
+            result = self.db.fetchall(sql_query, (doc_source_id, doc_source_type))
             return [json.loads(item[4]) for item in result]
         except sqlite3.Error as e:
             raise FetchError(f"Error while fetching metadata for doc_source_id: {doc_source_id}: {e}")
 
     def insert_data(self, doc_uuid, doc_source_id, doc_source_type, created_at, metadata):
         try:
-            conn = self.create_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
+            self.db.execute('''
                 INSERT or REPLACE INTO stored_docs (uuid, source_id, source_type, created_at, metadata)
                 VALUES (?, ?, ?, ?, ?)
             ''', (str(doc_uuid), doc_source_id, doc_source_type, created_at, json.dumps(metadata)))
-            conn.commit()
         except sqlite3.Error as e:
             raise InsertionError(f"Error occurred while inserting metadata {e}")
 
@@ -143,42 +149,30 @@ class MetadataDao:
 
     def insert_batch_data(self, data_list):
         try:
-            conn = self.create_connection()
-            cursor = conn.cursor()
-
-            cursor.executemany('''
-                INSERT OR REPLACE INTO stored_docs (uuid, source_id, source_type, created_at, metadata)
-                VALUES (?, ?, ?, ?, ?)
-            ''', [(str(doc_uuid), doc_source_id, doc_source_type, created_at, json.dumps(metadata)) for
-                  doc_uuid, doc_source_id, doc_source_type, created_at, metadata in data_list])
-
-            conn.commit()
+            with self.db.transaction() as cursor:
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO stored_docs (uuid, source_id, source_type, created_at, metadata)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [(str(doc_uuid), doc_source_id, doc_source_type, created_at, json.dumps(metadata)) for
+                      doc_uuid, doc_source_id, doc_source_type, created_at, metadata in data_list])
         except sqlite3.Error as e:
             raise InsertionError(f"Error occurred while batch insertion of metadata {e}")
 
     def fetch_last_item(self, doc_source_id: str):
         try:
-            conn = self.create_connection()
-            cursor = conn.cursor()
-
-            cursor.execute('''
+            return self.db.fetchone('''
                 SELECT * FROM stored_docs
                 WHERE source_id = ?
                 ORDER BY created_at DESC
                 LIMIT 1
             ''', (doc_source_id,))
 
-            return cursor.fetchone()
-
         except sqlite3.Error:
             return None
 
     def fetch_last_item_in_discord_channel(self, doc_source_id: str, channel_id: id):
         try:
-            conn = self.create_connection()
-            cursor = conn.cursor()
-
-            cursor.execute('''
+            return self.db.fetchone('''
                 SELECT * FROM stored_docs
                 WHERE source_id = ? AND
                       json_extract(metadata, '$.channel_id') = ?
@@ -186,7 +180,5 @@ class MetadataDao:
                 LIMIT 1
             ''', (doc_source_id, channel_id))
 
-            return cursor.fetchone()
-
         except sqlite3.Error:
             return None
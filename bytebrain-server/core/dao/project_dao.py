@@ -12,13 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import sqlite3
 import uuid
 from datetime import datetime
 from typing import Optional
 
 from pydantic import BaseModel
 
+from core.dao.database import get_pool
 from core.dao.resource_dao import Resource
 
 
@@ -43,83 +43,63 @@ class Project(BaseModel):
 class ProjectDao:
     def __init__(self, db_path):
         self.db_path = db_path
+        self.db = get_pool(db_path)
         self._create_table_if_not_exists()
 
     def _create_table_if_not_exists(self):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS projects (
-                    id TEXT PRIMARY KEY,
-                    name TEXT,
-                    user_id TEXT,
-                    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')),
-                    description TEXT
-                )
-            ''')
-            conn.commit()
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS projects (
+                id TEXT PRIMARY KEY,
+                name TEXT,
+                user_id TEXT,
+                created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')),
+                description TEXT
+            )
+        ''')
 
     def create_project(self, project: Project):  # TODO: rename to save_project
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO projects (id, name, user_id, description)
-                VALUES (?, ?, ?, ?)
-            ''', (project.id, project.name, project.user_id, project.description))
-            conn.commit()
+        self.db.execute('''
+            INSERT INTO projects (id, name, user_id, description)
+            VALUES (?, ?, ?, ?)
+        ''', (project.id, project.name, project.user_id, project.description))
 
     def get_project_by_id(self, project_id: str) -> Optional[Project]:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, name, user_id, created_at, description FROM projects WHERE id = ?
-            ''', (project_id,))
-            result = cursor.fetchone()
-
-            if result:
-                return Project(id=result[0], name=result[1], user_id=result[2],
-                               created_at=datetime.strptime(result[3], '%Y-%m-%d %H:%M:%S'),
-                               description=result[4])
-            else:
-                return None
+        result = self.db.fetchone('''
+            SELECT id, name, user_id, created_at, description FROM projects WHERE id = ?
+        ''', (project_id,))
+
+        if result:
+            return Project(id=result[0], name=result[1], user_id=result[2],
+                           created_at=datetime.strptime(result[3], '%Y-%m-%d %H:%M:%S'),
+                           description=result[4])
+        else:
+            return None
 
     def get_all_projects(self, user_id: str) -> list[Project]:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, name, user_id, created_at, description FROM projects
-                    WHERE user_id = ?
-            ''', (user_id,))
-            results = cursor.fetchall()
-
-            return [Project(id=result[0], name=result[1], user_id=result[2],
-                            created_at=datetime.strptime(result[3], '%Y-%m-%d %H:%M:%S'),
-                            description=result[4]) for result in results]
+        results = self.db.fetchall('''
+            SELECT id, name, user_id, created_at, description FROM projects
+                WHERE user_id = ?
+        ''', (user_id,))
+
+        return [Project(id=result[0], name=result[1], user_id=result[2],
+                        created_at=datetime.strptime(result[3], '%Y-%m-%d %H:%M:%S'),
+                        description=result[4]) for result in results]
 
     def get_all_projects_count(self) -> int:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT COUNT(*) FROM projects
-            ''')
-            result = cursor.fetchone()
-            if result:
-                return result[0]
-            else:
-                return 0
+        result = self.db.fetchone('''
+            SELECT COUNT(*) FROM projects
+        ''')
+        if result:
+            return result[0]
+        else:
+            return 0
 
     def update_project(self, project: Project):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE projects SET name = ? WHERE id = ?
-            ''', (project.name, project.id))
-            conn.commit()
+        self.db.execute('''
+            UPDATE projects SET name = ? WHERE id = ?
+        ''', (project.name, project.id))
 
     def delete_project(self, project_id: str):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                DELETE FROM projects WHERE id = ?
-            ''', (project_id,))
-            conn.commit()
+        self.db.execute('''
+            DELETE FROM projects WHERE id = ?
+        ''', (project_id,))
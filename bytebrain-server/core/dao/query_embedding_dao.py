@@ -0,0 +1,117 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import zlib
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from langchain.schema import BaseStore
+
+from core.dao.database import get_pool
+
+
+class QueryEmbeddingDao(BaseStore[str, bytes]):
+    """
+    The persisted embeddings of the asked questions, used as the store of a `QueryEmbeddingCache`.
+
+    Questions are asked by anyone on the public chat endpoints, so the total size of the stored values is bounded by
+    `max_size` bytes: once it is exceeded, the least recently used entries are evicted until the store is back below
+    90% of its size. As in `HttpCacheDao`, the total size is maintained by triggers.
+    """
+
+    EVICTION_RATIO = 0.9
+
+    def __init__(self, db_path: str, max_size: int):
+        self.db_path = db_path
+        self.db = get_pool(db_path)
+        self.max_size = max_size
+        self._create_table_if_not_exists()
+
+    def _create_table_if_not_exists(self):
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS query_embeddings (
+                key TEXT PRIMARY KEY,
+                value BLOB,
+                size INTEGER,
+                used_at REAL
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS query_embeddings_used_at ON query_embeddings (used_at)')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS query_embeddings_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER)
+        ''')
+        self.db.execute('INSERT OR IGNORE INTO query_embeddings_size (id, total) VALUES (0, 0)')
+        self.db.execute('''
+            CREATE TRIGGER IF NOT EXISTS query_embeddings_insert AFTER INSERT ON query_embeddings BEGIN
+                UPDATE query_embeddings_size SET total = total + NEW.size;
+            END
+        ''')
+        self.db.execute('''
+            CREATE TRIGGER IF NOT EXISTS query_embeddings_update AFTER UPDATE OF size ON query_embeddings BEGIN
+                UPDATE query_embeddings_size SET total = total + NEW.size - OLD.size;
+            END
+        ''')
+        self.db.execute('''
+            CREATE TRIGGER IF NOT EXISTS query_embeddings_delete AFTER DELETE ON query_embeddings BEGIN
+                UPDATE query_embeddings_size SET total = total - OLD.size;
+            END
+        ''')
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        values = []
+        for key in keys:
+            row = self.db.fetchone('SELECT value FROM query_embeddings WHERE key = ?', (key,))
+            values.append(zlib.decompress(row[0]) if row is not None else None)
+        used_keys = [(time.time(), key) for key, value in zip(keys, values) if value is not None]
+        if used_keys:
+            with self.db.transaction() as cursor:
+                cursor.executemany('UPDATE query_embeddings SET used_at = ? WHERE key = ?', used_keys)
+        return values
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, bytes]]) -> None:
+        with self.db.transaction() as cursor:
+            for key, value in key_value_pairs:
+                compressed_value = zlib.compress(value)
+                # An upsert rather than a replace, which would delete the row without firing the delete trigger
+                cursor.execute('''
+                    INSERT INTO query_embeddings (key, value, size, used_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size,
+                        used_at = excluded.used_at
+                ''', (key, compressed_value, len(compressed_value), time.time()))
+            self._evict(cursor)
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        with self.db.transaction() as cursor:
+            cursor.executemany('DELETE FROM query_embeddings WHERE key = ?', [(key,) for key in keys])
+
+    def yield_keys(self, prefix: Optional[str] = None) -> Iterator[str]:
+        for (key,) in self.db.fetchall('SELECT key FROM query_embeddings'):
+            if prefix is None or key.startswith(prefix):
+                yield key
+
+    def size(self) -> int:
+        return self.db.fetchone('SELECT total FROM query_embeddings_size')[0]
+
+    def _evict(self, cursor):
+        size = cursor.execute('SELECT total FROM query_embeddings_size').fetchone()[0]
+        if size <= self.max_size:
+            return
+        excess = size - self.max_size * self.EVICTION_RATIO
+        evicted = []
+        for key, entry_size in cursor.execute('SELECT key, size FROM query_embeddings ORDER BY used_at'):
+            if excess <= 0:
+                break
+            evicted.append((key,))
+            excess -= entry_size
+        cursor.executemany('DELETE FROM query_embeddings WHERE key = ?', evicted)
@@ -12,12 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import sqlite3
 from typing import Optional
 
 from pydantic import BaseModel
 
 import config
+from core.dao.database import get_pool
 
 
 class User(BaseModel):
@@ -38,13 +38,12 @@ class UserDao:
         if cls._instance is None:
             cls._instance = super(UserDao, cls).__new__(cls)
             cls._instance.db_path = config.load_config().users_db
+            cls._instance.db = get_pool(cls._instance.db_path)
             cls.create_user_table(cls._instance)
         return cls._instance
 
     def create_user_table(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
+        self.db.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 id TEXT PRIMARY KEY,
                 email TEXT UNIQUE NOT NULL,
@@ -54,27 +53,18 @@ class UserDao:
                 enabled BOOLEAN DEFAULT FALSE NOT NULL
             )
         """)
-        conn.commit()
-        conn.close()
 
     def save_user(self, user: UserInDB):
-        with sqlite3.connect(self.db_path) as connection:
-            cursor = connection.cursor()
-            cursor.execute(
-                """
-                INSERT INTO users (id, email, full_name, enabled, hashed_password)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (user.id, user.email, user.full_name, user.enabled, user.hashed_password),
-            )
-            connection.commit()
+        self.db.execute(
+            """
+            INSERT INTO users (id, email, full_name, enabled, hashed_password)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (user.id, user.email, user.full_name, user.enabled, user.hashed_password),
+        )
 
     def get_user_with_password(self, email: str) -> Optional[UserInDB]:
-        with sqlite3.connect(self.db_path) as connection:
-            cursor = connection.cursor()
-
-            cursor.execute("SELECT * FROM users WHERE email=?", (email,))
-            user = cursor.fetchone()
+        user = self.db.fetchone("SELECT * FROM users WHERE email=?", (email,))
 
         if user:
             return UserInDB(id=user[0], email=user[1], full_name=user[2], hashed_password=user[3])
@@ -82,11 +72,7 @@ class UserDao:
             return None
 
     def get_user(self, email: str) -> Optional[User]:
-        with sqlite3.connect(self.db_path) as connection:
-            cursor = connection.cursor()
-
-            cursor.execute("SELECT * FROM users WHERE email=?", (email,))
-            user = cursor.fetchone()
+        user = self.db.fetchone("SELECT * FROM users WHERE email=?", (email,))
 
         if user:
             return User(id=user[0], email=user[1], full_name=user[2])
@@ -94,8 +80,4 @@ class UserDao:
             return None
 
     def set_enabled(self, id: str, value: bool):
-        with sqlite3.connect(self.db_path) as connection:
-            cursor = connection.cursor()
-
-            cursor.execute("UPDATE users SET enabled=? WHERE id=?", (value, id))
-            connection.commit()
+        self.db.execute("UPDATE users SET enabled=? WHERE id=?", (value, id))
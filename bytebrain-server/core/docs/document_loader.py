@@ -12,34 +12,47 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import os
 import re
 import sys
 import tempfile
 import uuid
 from datetime import datetime
-from typing import List, Dict, Callable
+from typing import List, Dict, Callable, Iterator
 from typing import Optional
 from uuid import UUID
 
+import requests
 import yaml
 from discord.ext.commands import Bot
 from langchain.document_loaders import GitLoader
 from langchain.document_loaders import UnstructuredMarkdownLoader
 from langchain.document_loaders import YoutubeLoader, UnstructuredURLLoader
-from langchain.document_loaders.recursive_url_loader import RecursiveUrlLoader
 from langchain.document_transformers.html2text import Html2TextTransformer
 from langchain.schema import Document
 from langchain.text_splitter import Language
 from langchain.text_splitter import MarkdownTextSplitter
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from structlog import getLogger
 from wcmatch import glob
 
+from core.dao.http_cache_dao import HttpCacheDao
 from core.docs.discord_loader import dump_channel_history
+from core.docs.git_mirror import GitMirror
+from core.docs.http_cache import ConditionalRecursiveUrlLoader, PAGE_HASH, fetch_page, is_unchanged_page, \
+    unchanged_page
+from core.docs.pipeline import buffered, batched, ordered_map, get_process_pool
 from core.models.discord.ChannelHistory import ChannelHistory
 from core.models.discord.DiscordMessage import DiscordMessage
 from core.utils.utils import calculate_md5_checksum
 
+log = getLogger()
+
+# Source files larger than this are generated or data files rather than code worth indexing
+MAX_SOURCE_FILE_SIZE = 2 ** 20
+BINARY_CHECK_SIZE = 8000
+
 NAMESPACE_DOCUMENT = UUID('f924e0a9-69a7-11ee-aa84-6c02e09469ba')
 NAMESPACE_WEBSITE = UUID('c88b857e-be16-4d80-9f45-b5c41fdd4a11')
 NAMESPACE_WEBPAGE = UUID('e48c5a31-a290-4b79-b47e-2b2999f18d3d')
@@ -106,9 +119,38 @@ def load_sourcecode_from_git_repo(
         doc_source_type: str,
         language: str,
         branch: Optional[str],
-        paths: Optional[str] = None
+        paths: Optional[str] = None,
+        transform_workers: int = 0
+) -> (List[UUID], List[Document]):
+    with tempfile.TemporaryDirectory() as repo_path:
+        mirror = GitMirror(repo_path, clone_url, branch, paths)
+        mirror.sync()
+        return load_sourcecode_files(repo_path=repo_path,
+                                     files=mirror.tracked_files(),
+                                     doc_source_id=doc_source_id,
+                                     doc_source_type=doc_source_type,
+                                     language=language,
+                                     paths=paths,
+                                     transform_workers=transform_workers)
+
+
+def load_sourcecode_files(
+        repo_path: str,
+        files: List[str],
+        doc_source_id: str,
+        doc_source_type: str,
+        language: str,
+        paths: Optional[str] = None,
+        transform_workers: int = 0,
+        transform_chunk_size: int = 16
 ) -> (List[UUID], List[Document]):
-    repo_path = tempfile.mkdtemp()
+    """
+    Load and split the text files of a checked out repository, given by their path relative to `repo_path`, which
+    match the `paths` glob. Files that don't exist, e.g. those deleted by a commit or outside of a sparse checkout, are
+    skipped, and so are binary files and files larger than `MAX_SOURCE_FILE_SIZE`, without reading them whole.
+
+    With `transform_workers`, the files are split on a process pool, `transform_chunk_size` files at a time.
+    """
     file_filter: Optional[Callable[[str], bool]] = None
     if paths:
         try:
@@ -116,16 +158,38 @@ def load_sourcecode_from_git_repo(
                                                            flags=glob.GLOBSTAR)
         except re.error:
             raise ValueError("Invalid regular expression pattern")
-    loader = GitLoader(
-        repo_path=repo_path,
-        clone_url=clone_url,
-        branch=branch,
-        file_filter=file_filter
-    )
-    docs = loader.load()
 
-    splitter = RecursiveCharacterTextSplitter.from_language(language=Language(language))
-    docs = splitter.transform_documents(docs)
+    docs: List[Document] = []
+    for rel_file_path in files:
+        file_path = os.path.join(repo_path, rel_file_path)
+        if not os.path.isfile(file_path) or (file_filter and not file_filter(file_path)):
+            continue
+        if os.path.getsize(file_path) > MAX_SOURCE_FILE_SIZE:
+            log.info(f"Skipped {rel_file_path}, it is larger than {MAX_SOURCE_FILE_SIZE} bytes")
+            continue
+        try:
+            with open(file_path, "rb") as f:
+                # Like git, a file with a NUL byte in its first bytes is binary
+                if b"\0" in f.read(BINARY_CHECK_SIZE):
+                    continue
+                f.seek(0)
+                text_content = f.read().decode("utf-8")
+        except UnicodeDecodeError:
+            # loads only text files
+            continue
+        file_name = os.path.basename(rel_file_path)
+        # The same metadata as GitLoader, so the ids of the chunks don't change
+        docs.append(Document(page_content=text_content, metadata={
+            "source": rel_file_path,
+            "file_path": rel_file_path,
+            "file_name": file_name,
+            "file_type": os.path.splitext(file_name)[1],
+        }))
+
+    docs = [doc for chunks in ordered_map(functools.partial(_split_source_files, language),
+                                          batched(docs, transform_chunk_size), get_process_pool(transform_workers),
+                                          max_pending=2 * transform_workers)
+            for doc in chunks]
 
     for index, doc in enumerate(docs):
         doc.metadata.setdefault("doc_source_type", doc_source_type)
@@ -145,6 +209,10 @@ def load_sourcecode_from_git_repo(
     return ids, docs
 
 
+def _split_source_files(language: str, docs: List[Document]) -> List[Document]:
+    return RecursiveCharacterTextSplitter.from_language(language=Language(language)).transform_documents(docs)
+
+
 def load_source_code(
         repo_path: str,
         branch: Optional[str],
@@ -286,7 +354,13 @@ def load_youtube_docs(url: str, doc_source_id: str, doc_source_type: str) -> (Li
         doc.metadata.setdefault("doc_publish_date", doc.metadata.pop("publish_date"))
         doc.metadata.setdefault("doc_length", doc.metadata.pop("length"))
         doc.metadata.setdefault("doc_author", doc.metadata.pop("author"))
-        doc.metadata.setdefault("doc_uuid", str(uuid.uuid5(NAMESPACE_YOUTUBE, url + doc.page_content)))
+        doc.metadata.setdefault("doc_hash", calculate_md5_checksum(doc.page_content))
+        doc.metadata.setdefault("doc_uuid",
+                                str(generate_uuid(NAMESPACE_YOUTUBE,
+                                                  doc.metadata['doc_source_type'],
+                                                  doc.metadata['doc_source_id'],
+                                                  doc.metadata['doc_url'],
+                                                  doc.metadata['doc_hash'])))
     ids = [UUID(c.metadata['doc_uuid']) for c in docs]
     assert (len(ids) == len(docs))
     return ids, docs
@@ -294,11 +368,32 @@ def load_youtube_docs(url: str, doc_source_id: str, doc_source_type: str) -> (Li
 
 def load_docs_from_webpage(url: str,
                            doc_source_id: str,
-                           doc_source_type: str) -> (List[UUID], List[Document]):
-    loader = UnstructuredURLLoader(urls=[url])
-    docs = loader.load()
+                           doc_source_type: str,
+                           http_cache: Optional[HttpCacheDao] = None,
+                           indexed_pages: Optional[Dict[str, str]] = None) -> (List[UUID], List[Document]):
+    """
+    Load a webpage. With an `http_cache`, the page is first requested conditionally, and if it didn't change since it
+    was indexed (see `ConditionalRecursiveUrlLoader`) an `unchanged_page` placeholder is returned instead of its chunks.
+    """
+    page = None
+    if http_cache is not None:
+        try:
+            page = fetch_page(http_cache, url)
+            if page.not_modified and (indexed_pages or {}).get(url) == page.page_hash:
+                return [], [unchanged_page(url)]
+        except requests.RequestException as e:
+            log.warning(f"Conditional request of {url} failed, loading it without the cache: {e}")
+    if page is not None and page.status_code == 200:
+        # The fetched body is partitioned, so the indexed page is the one whose hash and validators were cached
+        from unstructured.partition.html import partition_html
+        elements = partition_html(text=page.text)
+        docs = [Document(page_content="\n\n".join(str(element) for element in elements), metadata={"source": url})]
+    else:
+        docs = UnstructuredURLLoader(urls=[url]).load()
     docs = Html2TextTransformer(ignore_images=True).transform_documents(docs)
     for index, doc in enumerate(docs):
+        if page is not None and page.status_code == 200:
+            doc.metadata.setdefault(PAGE_HASH, page.page_hash)
         doc.metadata.setdefault("doc_source_id", doc_source_id)
         doc.metadata.setdefault("doc_source_type", doc_source_type)
         doc.metadata.setdefault("doc_url", doc.metadata["source"])
@@ -322,10 +417,37 @@ def load_docs_from_webpage(url: str,
 
 
 def load_docs_from_site(doc_source_id: str, doc_source_type: str, **kwargs) -> (List[UUID], List[Document]):
+    docs = list(lazy_load_docs_from_site(doc_source_id, doc_source_type, **kwargs))
+    ids: List[UUID] = [UUID(doc.metadata['doc_uuid']) for doc in docs]
+
+    assert (len(ids) == len(docs))
+    return ids, docs
+
+
+def lazy_load_docs_from_site(doc_source_id: str,
+                             doc_source_type: str,
+                             max_buffered_pages: int = 16,
+                             http_cache: Optional[HttpCacheDao] = None,
+                             indexed_pages: Optional[Dict[str, str]] = None,
+                             transform_workers: int = 0,
+                             transform_chunk_size: int = 8,
+                             **kwargs) -> Iterator[Document]:
+    """
+    Crawl a website and yield the chunks of each page as soon as the page is downloaded and split.
+
+    Crawling runs on a background thread which is at most `max_buffered_pages` pages ahead of the consumer, so the
+    memory usage doesn't grow with the size of the site. With an `http_cache`, pages are requested conditionally and an
+    `unchanged_page` placeholder is yielded for each page that didn't change since it was indexed, see
+    `ConditionalRecursiveUrlLoader`.
+
+    Converting the pages to text and splitting them is CPU bound and can take longer than the crawl, with
+    `transform_workers` it runs on a process pool, `transform_chunk_size` pages at a time. The chunks are yielded in
+    the order of the pages regardless of which worker finishes first, so their ids don't depend on the scheduling.
+    """
     # Set default values
     default_loader_params = {
         "max_depth": sys.maxsize,
-        "use_async": True,
+        "use_async": False,  # The async crawler of RecursiveUrlLoader isn't lazy
         "extractor": None,
         "exclude_dirs": None,
         "timeout": None,
@@ -335,33 +457,47 @@ def load_docs_from_site(doc_source_id: str, doc_source_type: str, **kwargs) -> (
     # Update default values with user-specified values
     loader_params = {**default_loader_params, **kwargs}
 
-    loader = RecursiveUrlLoader(**loader_params)
-    docs = loader.load()
-
-    docs = Html2TextTransformer(ignore_images=True).transform_documents(docs)
-    docs = MarkdownTextSplitter().transform_documents(docs)
-    for index, doc in enumerate(docs):
-        doc.metadata.setdefault("doc_source_id", doc_source_id)
-        doc.metadata.setdefault("doc_source_type", doc_source_type)
-        doc.metadata.setdefault("doc_url", doc.metadata["source"])
-        if title := doc.metadata.pop('title', None):
-            doc.metadata.setdefault("doc_title", title)
-        if description := doc.metadata.pop('description', None):
-            doc.metadata.setdefault("doc_description", description)
-        if language := doc.metadata.pop('language', None):
-            doc.metadata.setdefault("doc_language", language)
-        doc.metadata.setdefault("doc_hash", calculate_md5_checksum(doc.page_content))
-        doc.metadata.setdefault("doc_uuid",
-                                str(generate_uuid(NAMESPACE_WEBSITE,
-                                                  doc.metadata['doc_source_type'],
-                                                  doc.metadata['doc_source_id'],
-                                                  doc.metadata['doc_url'],
-                                                  doc.metadata['doc_hash'])))
-
-    ids: List[UUID] = [UUID(doc.metadata['doc_uuid']) for doc in docs]
-
-    assert (len(ids) == len(docs))
-    return ids, docs
+    loader = ConditionalRecursiveUrlLoader(http_cache=http_cache, indexed_pages=indexed_pages or {}, **loader_params)
+    pages = buffered(loader.lazy_load(), max_size=max_buffered_pages)
+    # Without a pool, pages are split as soon as they are downloaded; with one, enough chunks are submitted to keep
+    # every worker busy while the oldest one is consumed
+    chunk_size = transform_chunk_size if transform_workers > 0 else 1
+    for docs in ordered_map(_transform_website_pages, batched(pages, chunk_size), get_process_pool(transform_workers),
+                            max_pending=2 * transform_workers):
+        for doc in docs:
+            yield doc if is_unchanged_page(doc) else _add_website_metadata(doc, doc_source_id, doc_source_type)
+
+
+def _transform_website_pages(pages: List[Document]) -> List[Document]:
+    html2text = Html2TextTransformer(ignore_images=True)
+    splitter = MarkdownTextSplitter()
+    docs = []
+    for page in pages:
+        if is_unchanged_page(page):
+            docs.append(page)
+        else:
+            docs.extend(splitter.transform_documents(html2text.transform_documents([page])))
+    return docs
+
+
+def _add_website_metadata(doc: Document, doc_source_id: str, doc_source_type: str) -> Document:
+    doc.metadata.setdefault("doc_source_id", doc_source_id)
+    doc.metadata.setdefault("doc_source_type", doc_source_type)
+    doc.metadata.setdefault("doc_url", doc.metadata["source"])
+    if title := doc.metadata.pop('title', None):
+        doc.metadata.setdefault("doc_title", title)
+    if description := doc.metadata.pop('description', None):
+        doc.metadata.setdefault("doc_description", description)
+    if language := doc.metadata.pop('language', None):
+        doc.metadata.setdefault("doc_language", language)
+    doc.metadata.setdefault("doc_hash", calculate_md5_checksum(doc.page_content))
+    doc.metadata.setdefault("doc_uuid",
+                            str(generate_uuid(NAMESPACE_WEBSITE,
+                                              doc.metadata['doc_source_type'],
+                                              doc.metadata['doc_source_id'],
+                                              doc.metadata['doc_url'],
+                                              doc.metadata['doc_hash'])))
+    return doc
 
 
 async def load_discord_channel_messages(
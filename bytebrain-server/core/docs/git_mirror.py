@@ -0,0 +1,115 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import shutil
+from typing import List, Optional
+
+from git import GitCommandError, InvalidGitRepositoryError, NoSuchPathError, Repo
+from structlog import getLogger
+
+log = getLogger()
+
+
+def sparse_checkout_pattern(paths: str) -> str:
+    """
+    The sparse checkout pattern of the files matched by a `paths` glob relative to the root of the repository.
+
+    Example:
+        >>> sparse_checkout_pattern("docs/**/*.md")
+        '/docs/**/*.md'
+    """
+    return "/" + paths.lstrip("/")
+
+
+class GitMirror:
+    """
+    A clone of a repository kept on disk and reused across the indexings of a resource.
+
+    `sync` fetches the new commits of the branch and checks them out, so an update downloads only what changed since
+    the previous one, and `changed_files` lists the files touched since the commit indexed last, so only those are
+    split and embedded again.
+
+    When only the files matching a `paths` glob are indexed, the clone is a blob-less partial clone with a sparse
+    checkout of the glob: the commits and trees are downloaded, but only the contents of the matching files, so a
+    monorepo costs the size of its indexed files rather than of its whole history. Servers without partial clone
+    support send the full clone instead.
+    """
+
+    def __init__(self, path: str, clone_url: str, branch: Optional[str], paths: Optional[str] = None):
+        self.path = path
+        self.clone_url = clone_url
+        self.branch = branch
+        self.paths = paths
+
+    def _open(self) -> Optional[Repo]:
+        try:
+            repo = Repo(self.path)
+        except (InvalidGitRepositoryError, NoSuchPathError):
+            return None
+        if repo.remotes and repo.remotes.origin.url == self.clone_url and not repo.head.is_detached:
+            return repo
+        return None
+
+    def sync(self) -> str:
+        """
+        Clone the repository or fetch its new commits, check out the head of the branch and return its commit.
+        """
+        repo = self._open()
+        if repo is None:
+            self.delete()
+            log.info(f"Cloning {self.clone_url}", path=self.path, paths=self.paths)
+            options = ["--single-branch"]
+            if self.paths:
+                options += ["--filter=blob:none", "--no-checkout"]
+            repo = Repo.clone_from(self.clone_url, self.path, multi_options=options,
+                                   **({"branch": self.branch} if self.branch else {}))
+            if self.paths:
+                self._set_sparse_checkout(repo)
+                repo.git.checkout(repo.active_branch.name)
+        else:
+            repo.git.fetch("--prune", "--force", "origin")
+            if self.paths:
+                self._set_sparse_checkout(repo)
+            # The local branch of a single branch clone is the one tracked on origin
+            repo.git.reset("--hard", f"origin/{repo.active_branch.name}")
+            repo.git.clean("-ffdx")
+            repo.git.gc("--auto", "--quiet")
+        return repo.head.commit.hexsha
+
+    def _set_sparse_checkout(self, repo: Repo):
+        # Without --no-cone sparse checkout only takes directories; the non-cone patterns have the syntax of
+        # .gitignore, in which a glob anchored at the root matches the same files as the `paths` glob
+        repo.git.sparse_checkout("set", "--no-cone", sparse_checkout_pattern(self.paths))
+
+    def tracked_files(self) -> List[str]:
+        return [file for file in Repo(self.path).git.ls_files("-z").split("\0") if file]
+
+    def changed_files(self, since_commit: str) -> Optional[List[str]]:
+        """
+        The files added, modified or deleted between `since_commit` and the checked out commit, or None if
+        `since_commit` isn't in the history anymore, e.g. after a force push.
+        """
+        repo = Repo(self.path)
+        try:
+            repo.git.cat_file("-e", f"{since_commit}^{{commit}}")
+        except GitCommandError:
+            return None
+        # Renames are listed as a deletion and an addition
+        entries = repo.git.diff("--name-status", "--no-renames", "-z", since_commit, "HEAD").split("\0")
+        return [path for path in entries[1::2] if path]
+
+    def delete(self):
+        shutil.rmtree(self.path, ignore_errors=True)
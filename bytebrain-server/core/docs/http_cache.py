@@ -0,0 +1,125 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from typing import Dict, Iterator, NamedTuple, Optional, Set
+
+import requests
+from langchain.document_loaders.recursive_url_loader import RecursiveUrlLoader
+from langchain.schema import Document
+from langchain.utils.html import extract_sub_links
+from structlog import getLogger
+
+from core.dao.http_cache_dao import HttpCacheDao
+from core.utils.metrics import crawled_pages_counter
+from core.utils.utils import calculate_md5_checksum
+
+# Hash of the page a chunk was split from, to tell whether the chunks of a not modified page are up-to-date
+PAGE_HASH = "doc_page_hash"
+# Set on the placeholder yielded instead of the chunks of a page that didn't change since it was indexed
+UNCHANGED_PAGE = "doc_unchanged_page"
+
+log = getLogger()
+
+
+class FetchedPage(NamedTuple):
+    status_code: int
+    text: str
+    page_hash: str
+    not_modified: bool
+
+
+def fetch_page(http_cache: Optional[HttpCacheDao], url: str, timeout: Optional[float] = None,
+               headers: Optional[dict] = None) -> FetchedPage:
+    """
+    Download a page with a conditional request if a previous response of it is cached. On a 304 the cached body is
+    returned, with `not_modified` set.
+    """
+    entry = http_cache.get(url) if http_cache is not None else None
+    request_headers = dict(headers or {})
+    if entry is not None:
+        if entry.etag:
+            request_headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            request_headers["If-Modified-Since"] = entry.last_modified
+
+    response = requests.get(url, timeout=timeout, headers=request_headers)
+    if entry is not None and response.status_code == 304:
+        http_cache.touch(url)
+        crawled_pages_counter.labels(result="not_modified").inc()
+        return FetchedPage(200, entry.body, entry.body_hash, not_modified=True)
+
+    crawled_pages_counter.labels(result="downloaded").inc()
+    page_hash = calculate_md5_checksum(response.text)
+    if http_cache is not None:
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code == 200 and (etag or last_modified):
+            http_cache.put(url, etag, last_modified, page_hash, response.text)
+        elif entry is not None:
+            http_cache.delete(url)
+    return FetchedPage(response.status_code, response.text, page_hash, not_modified=False)
+
+
+def unchanged_page(url: str) -> Document:
+    return Document(page_content="", metadata={"doc_url": url, UNCHANGED_PAGE: True})
+
+
+def is_unchanged_page(doc: Document) -> bool:
+    return doc.metadata.get(UNCHANGED_PAGE, False)
+
+
+class ConditionalRecursiveUrlLoader(RecursiveUrlLoader):
+    """
+    A `RecursiveUrlLoader` which re-crawls a site with conditional requests.
+
+    `indexed_pages` maps the URLs of the pages indexed by the previous crawl to the hash of the page they were split
+    from. A page that is not modified since then is only parsed for its links, and an `unchanged_page` placeholder is
+    yielded instead of the page, so it is neither split nor embedded again. Other pages are yielded with their hash
+    in their metadata.
+    """
+
+    def __init__(self, url: str, http_cache: Optional[HttpCacheDao], indexed_pages: Dict[str, str], **kwargs):
+        super().__init__(url, **kwargs)
+        self.http_cache = http_cache
+        self.indexed_pages = indexed_pages
+
+    def _get_child_links_recursive(self, url: str, visited: Set[str], *, depth: int = 0) -> Iterator[Document]:
+        if depth >= self.max_depth:
+            return
+
+        visited.add(url)
+        try:
+            page = fetch_page(self.http_cache, url, timeout=self.timeout, headers=self.headers)
+            if self.check_response_status and 400 <= page.status_code <= 599:
+                raise ValueError(f"Received HTTP status {page.status_code}")
+        except Exception as e:
+            log.warning(f"Unable to load from {url}. Received error {e} of type {e.__class__.__name__}")
+            return
+
+        if page.not_modified and self.indexed_pages.get(url) == page.page_hash:
+            yield unchanged_page(url)
+        elif content := self.extractor(page.text):
+            yield Document(page_content=content,
+                           metadata={**self.metadata_extractor(page.text, url), PAGE_HASH: page.page_hash})
+
+        sub_links = extract_sub_links(page.text,
+                                      url,
+                                      base_url=self.url,
+                                      pattern=self.link_regex,
+                                      prevent_outside=self.prevent_outside,
+                                      exclude_prefixes=self.exclude_dirs)
+        for link in sub_links:
+            if link not in visited:
+                yield from self._get_child_links_recursive(link, visited, depth=depth + 1)
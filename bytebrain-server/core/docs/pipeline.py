@@ -0,0 +1,138 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import multiprocessing
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+_END_OF_STAGE = object()
+
+
+def buffered(iterable: Iterable[T], max_size: int) -> Iterator[T]:
+    """
+    Consume an iterable on a background thread, holding at most `max_size` produced items in memory.
+
+    This decouples two stages of a pipeline: the producer keeps working while the consumer processes the previous
+    items, and it blocks as soon as the consumer falls `max_size` items behind. Exceptions raised by the producer are
+    re-raised in the consumer. If the consumer stops early, the producer is stopped at its next item.
+
+    Example:
+        >>> list(buffered(range(5), max_size=2))
+        [0, 1, 2, 3, 4]
+    """
+    items: queue.Queue = queue.Queue(maxsize=max_size)
+    stopped = threading.Event()
+    errors: List[BaseException] = []
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            put(_END_OF_STAGE)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while (item := items.get()) is not _END_OF_STAGE:
+            yield item
+        if errors:
+            raise errors[0]
+    finally:
+        stopped.set()
+
+
+def batched(iterable: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    """
+    Group the items of an iterable into lists of `batch_size` items; the last batch may be smaller.
+
+    Example:
+        >>> list(batched(range(5), batch_size=2))
+        [[0, 1], [2, 3], [4]]
+    """
+    batch: List[T] = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ordered_map(function: Callable[[T], R], iterable: Iterable[T], executor: Optional[Executor],
+                max_pending: int) -> Iterator[R]:
+    """
+    Apply a function to the items of an iterable on an executor, e.g. a process pool for CPU bound work, and yield
+    the results in the order of the items, so the output doesn't depend on the scheduling of the workers.
+
+    At most `max_pending` items are submitted ahead of the consumer, which bounds the memory usage of a lazy iterable.
+    Without an executor, the function is applied in the calling thread.
+
+    Example:
+        >>> list(ordered_map(abs, [-1, 2, -3], executor=None, max_pending=2))
+        [1, 2, 3]
+    """
+    if executor is None:
+        yield from map(function, iterable)
+        return
+
+    pending: Deque[Future] = deque()
+    try:
+        for item in iterable:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+_process_pools: Dict[int, ProcessPoolExecutor] = {}
+_process_pools_lock = threading.Lock()
+
+
+def get_process_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """
+    Return the process pool with `workers` processes shared by the ingestion jobs, or None if `workers` is 0. Workers
+    are started on demand from a fork server, as forking the multithreaded server process itself isn't safe.
+    """
+    if workers <= 0:
+        return None
+    with _process_pools_lock:
+        pool = _process_pools.get(workers)
+        if pool is None:
+            pool = _process_pools[workers] = ProcessPoolExecutor(max_workers=workers,
+                                                                 mp_context=multiprocessing.get_context("forkserver"))
+        return pool
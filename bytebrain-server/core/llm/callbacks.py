@@ -12,21 +12,151 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import re
+import time
 from abc import ABC
-from typing import Any
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set
 
 from fastapi import WebSocket
 from langchain.callbacks.base import AsyncCallbackHandler
+from langchain.schema import LLMResult
+from structlog import getLogger
+
+from core.utils.metrics import chat_stage_latency_histogram, chat_question_latency_histogram, \
+    chat_time_to_first_token_histogram, chat_tokens_per_second_histogram, chat_context_tokens_histogram
+
+log = getLogger()
 
 
 class StreamingLLMCallbackHandler(AsyncCallbackHandler, ABC):
-    """Callback handler for streaming LLM responses."""
+    """
+    Callback handler for streaming LLM responses.
+
+    Tokens are sent in `{"token": ..., "completed": false}` frames. With a `flush_interval` (seconds), consecutive
+    tokens are coalesced into one frame, which is sent once the oldest buffered token is `flush_interval` old or,
+    if `flush_chars` is set, `flush_chars` characters are buffered, whichever comes first. Clients concatenate the
+    tokens of the frames, so they don't see a difference. Callers must `flush()` before sending the completed frame.
+    """
 
-    def __init__(self, websocket: WebSocket):
+    def __init__(self, websocket: WebSocket, flush_interval: float = 0.0, flush_chars: int = 0):
         self.websocket = websocket
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self.buffer: List[str] = []
+        self.buffered_chars = 0
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        # The flushes started by the timer, awaited by `flush` so the frames are sent before the completed frame
+        self.flush_tasks: Set[asyncio.Task] = set()
+        self.send_lock = asyncio.Lock()
 
     async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
         """Run on new LLM token. Only available when streaming is enabled."""
-        print(token, end="")
-        resp = {"token": token, "completed": False}
-        await self.websocket.send_json(resp)
+        self.buffer.append(token)
+        self.buffered_chars += len(token)
+        if self.flush_interval <= 0 or 0 < self.flush_chars <= self.buffered_chars:
+            await self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self._start_timed_flush)
+
+    async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        await self.flush()
+
+    def _start_timed_flush(self) -> None:
+        self.flush_handle = None
+        task = asyncio.ensure_future(self._send_buffer())
+        self.flush_tasks.add(task)
+        task.add_done_callback(self._timed_flush_done)
+
+    def _timed_flush_done(self, task: asyncio.Task) -> None:
+        self.flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error(f"Failed to send the buffered tokens: {task.exception()!r}")
+
+    async def flush(self) -> None:
+        """Send the buffered tokens, if any, in a single frame, once the pending timed flushes are done."""
+        if self.flush_tasks:
+            # Their errors are logged by `_timed_flush_done`
+            await asyncio.wait(set(self.flush_tasks))
+        await self._send_buffer()
+
+    async def _send_buffer(self) -> None:
+        async with self.send_lock:
+            if self.flush_handle is not None:
+                self.flush_handle.cancel()
+                self.flush_handle = None
+            if not self.buffer:
+                return
+            token = "".join(self.buffer)
+            self.buffer = []
+            self.buffered_chars = 0
+            await self.websocket.send_json({"token": token, "completed": False})
+
+    async def replay(self, text: str, callbacks: Sequence[AsyncCallbackHandler] = ()) -> None:
+        """
+        Stream an already generated answer word by word, the same way the LLM tokens are streamed. The tokens are
+        passed to `callbacks` as well, e.g. to a `QuestionTimer`.
+        """
+        for token in re.split(r'(?<=\s)(?=\S)', text):
+            await self.on_llm_new_token(token)
+            for callback in callbacks:
+                await callback.on_llm_new_token(token)
+        await self.flush()
+
+
+class QuestionTimer(AsyncCallbackHandler):
+    """
+    Measures where the time of answering a single chat question goes, and records it in the chat Prometheus metrics.
+
+    The stages of the pipeline are timed with `stage`; passed as a callback of the answer LLM, the timer also
+    measures the time to the first token and the rate of the streamed tokens, and `context_tokens` is set to the
+    size of the packed context. `observe` records everything,
+    labeled by the project and the path the answer took (see `core.llm.question_answering`).
+
+    Example:
+        >>> timer = QuestionTimer(project_id)
+        >>> with timer.stage("condense"):
+        ...     ...
+        >>> timer.observe()
+    """
+
+    def __init__(self, project: str):
+        self.project = project
+        self.path = "unknown"
+        self.start_time = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.first_token_time: Optional[float] = None
+        self.last_token_time: Optional[float] = None
+        self.tokens = 0
+        self.context_tokens: Optional[int] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start_time
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.last_token_time = time.perf_counter()
+        if self.first_token_time is None:
+            self.first_token_time = self.last_token_time
+        self.tokens += 1
+
+    async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        self.last_token_time = time.perf_counter()
+
+    def observe(self):
+        labels = {"project": self.project, "path": self.path}
+        for name, duration in self.stages.items():
+            chat_stage_latency_histogram.labels(stage=name, **labels).observe(duration)
+        if self.first_token_time is not None:
+            chat_time_to_first_token_histogram.labels(**labels).observe(self.first_token_time - self.start_time)
+            streaming_time = self.last_token_time - self.first_token_time
+            if self.tokens > 1 and streaming_time > 0:
+                chat_tokens_per_second_histogram.labels(**labels).observe((self.tokens - 1) / streaming_time)
+        if self.context_tokens is not None:
+            chat_context_tokens_histogram.labels(**labels).observe(self.context_tokens)
+        chat_question_latency_histogram.labels(**labels).observe(time.perf_counter() - self.start_time)
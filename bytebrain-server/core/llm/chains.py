@@ -12,9 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Optional
+import math
+import threading
+from dataclasses import dataclass
+from typing import Callable, Optional, Dict, Tuple, List
 
-from fastapi import WebSocket
 from langchain.callbacks.stdout import StdOutCallbackHandler
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
 from langchain.chains.conversational_retrieval.base import ConversationalRetrievalChain
@@ -22,18 +24,70 @@ from langchain.chains.llm import BaseLanguageModel
 from langchain.chains.llm import LLMChain
 from langchain.chains.question_answering import load_qa_chain
 from langchain.chat_models import ChatOpenAI
+from langchain.chat_models.base import BaseChatModel
 from langchain.embeddings import OpenAIEmbeddings
-from langchain.llms import OpenAI
 from langchain.prompts import PromptTemplate
+from langchain.schema import Document
 from langchain.vectorstores import Chroma
 from langchain.vectorstores.base import VectorStore
 
-from core.llm.callbacks import StreamingLLMCallbackHandler
+from config import ChatConfig, RetrievalConfig
+from core.dao.lexical_index_dao import LexicalIndexDao
+from core.llm.context import ContextPacker, PackedContext, token_counter
+from core.llm.retrievers import HybridRetriever, RRF_K
 from core.utils.upgrade_sqlite import upgrade_sqlite_version
 
 
+@dataclass(frozen=True)
+class ChainSettings:
+    model_name: str = "gpt-3.5-turbo"
+    temperature: float = 0
+    # tokens of retrieved documents stuffed into the prompt
+    context_tokens: int = 3000
+    # expected tokens of an indexed chunk, the markdown splitter cuts pages into chunks of up to 4000 characters
+    chunk_tokens: int = 1000
+    # weights of the vector and lexical searches in the fusion of their rankings, see `HybridRetriever`
+    vector_weight: float = 1.0
+    lexical_weight: float = 0.0
+    rrf_k: int = RRF_K
+    # number of vector search results re-ranked by maximal marginal relevance, and the weight of relevance against
+    # diversity in the re-ranking; 1 disables it
+    fetch_k: int = 30
+    mmr_lambda: float = 1.0
+
+    @classmethod
+    def for_project(cls, project_id: str, chat: ChatConfig, retrieval: RetrievalConfig) -> "ChainSettings":
+        weights = retrieval.projects.get(project_id, {})
+        return cls(context_tokens=chat.context_tokens,
+                   vector_weight=weights.get("vector_weight", retrieval.vector_weight),
+                   lexical_weight=weights.get("lexical_weight", retrieval.lexical_weight),
+                   rrf_k=retrieval.rrf_k,
+                   fetch_k=retrieval.fetch_k,
+                   mmr_lambda=retrieval.mmr_lambda)
+
+    @property
+    def k(self) -> int:
+        """Number of documents to retrieve: enough to fill the context, and two more for the ones dropped as
+        duplicates."""
+        return math.ceil(self.context_tokens / self.chunk_tokens) + 2
+
+
+class PackedConversationalRetrievalChain(ConversationalRetrievalChain):
+    """
+    A `ConversationalRetrievalChain` that stuffs the retrieved documents into the prompt with a `ContextPacker`,
+    instead of dropping the last documents until they fit in `max_tokens_limit`.
+    """
+    context_packer: ContextPacker
+
+    def pack_context(self, docs: List[Document]) -> PackedContext:
+        return self.context_packer.pack(docs)
+
+    def _reduce_tokens_below_limit(self, docs: List[Document]) -> List[Document]:
+        return self.pack_context(docs).documents
+
+
 def qa_with_stuffed_docs_chain(
-        websocket: Optional[WebSocket],
+        llm: BaseLanguageModel,
         template: Optional[str] = None):
     qa_with_stuffed_docs_template = template or """Use the following pieces of context to answer the question at the end. If you don't know the answer, just say that you don't know, don't try to make up an answer.
 
@@ -47,13 +101,7 @@ def qa_with_stuffed_docs_chain(
     )
 
     chain = load_qa_chain(
-        ChatOpenAI(
-            client=OpenAI,
-            streaming=True,
-            callbacks=[(StreamingLLMCallbackHandler(websocket))] if websocket is not None else [],
-            temperature=0,
-            verbose=False
-        ),
+        llm,
         chain_type="stuff",
         verbose=True,
         prompt=QA_WITH_STUFFED_DOCS_TEMPLATE,
@@ -92,36 +140,104 @@ def make_doc_search(persistent_dir: str):
     )
 
 
+def make_chat_openai(model_name: str, temperature: float, streaming: bool) -> BaseChatModel:
+    return ChatOpenAI(
+        model_name=model_name,
+        streaming=streaming,
+        callbacks=[] if streaming else [StreamingStdOutCallbackHandler()],
+        temperature=temperature,
+        verbose=not streaming
+    )
+
+
+_llm_factory: Callable[[str, float, bool], BaseChatModel] = make_chat_openai
+_llms: Dict[Tuple[str, float, bool], BaseChatModel] = {}
+_chains: Dict[Tuple[str, VectorStore, str, ChainSettings, Optional[LexicalIndexDao], bool],
+              PackedConversationalRetrievalChain] = {}
+_lock = threading.Lock()
+
+
+def set_llm_factory(factory: Callable[[str, float, bool], BaseChatModel]):
+    """
+    Build the chat models of all chains with `factory(model_name, temperature, streaming)` from now on, e.g. to run
+    the benchmark mode with stand-in models. Chains and models built before are dropped.
+    """
+    global _llm_factory
+    with _lock:
+        _llm_factory = factory
+        _llms.clear()
+        _chains.clear()
+
+
+def get_llm(model_name: str, temperature: float, streaming: bool) -> BaseChatModel:
+    """
+    Return the shared chat model with the given settings, so all chains reuse its pooled OpenAI HTTP clients.
+    """
+    key = (model_name, temperature, streaming)
+    with _lock:
+        if key not in _llms:
+            _llms[key] = _llm_factory(model_name, temperature, streaming)
+        return _llms[key]
+
+
 def make_question_answering_chain(
-        websocket: Optional[WebSocket],
         vector_store: VectorStore,
-        prompt_template: str):
-    search_kwargs = {
-        'k': 10,
-        'fetch_k': 30
-    }
-
-    # TODO: Find the best options for retrieving docs
-    # search_type="similarity_score_threshold",
-    # search_kwargs={'score_threshold': 0.8}
-    # or
-    # search_type="mmr",
-    document_retriever = vector_store.as_retriever(search_kwargs=search_kwargs)
-
-    llm = ChatOpenAI(
-        client=OpenAI,
-        streaming=False,
-        callbacks=[StreamingStdOutCallbackHandler()],
-        temperature=0,
-        verbose=True
-    )
-    qa = ConversationalRetrievalChain(
+        prompt_template: str,
+        settings: ChainSettings = ChainSettings(),
+        lexical_index: Optional[LexicalIndexDao] = None,
+        project_id: Optional[str] = None) -> PackedConversationalRetrievalChain:
+    """
+    Build a question answering chain. The chain doesn't hold any per-request state: the streaming callback of a
+    request is passed along with the call, e.g.
+    `await aanswer_question(qa, question, history, callbacks=[StreamingLLMCallbackHandler(websocket)])`.
+    Only the answer LLM streams, so only the tokens of the answer reach the callback.
+
+    Documents are retrieved from the vector store, diversified by MMR if `settings.mmr_lambda` is below 1, and fused
+    with the results of `lexical_index` if it is given and `settings.lexical_weight` is positive. If `project_id` is
+    given, only the documents indexed for that project are retrieved.
+    """
+    document_retriever = HybridRetriever(vector_store=vector_store,
+                                         lexical_index=lexical_index,
+                                         k=settings.k,
+                                         candidates=2 * settings.k,
+                                         fetch_k=settings.fetch_k,
+                                         lambda_mult=settings.mmr_lambda,
+                                         vector_weight=settings.vector_weight,
+                                         lexical_weight=settings.lexical_weight,
+                                         rrf_k=settings.rrf_k,
+                                         project_id=project_id)
+
+    answer_llm = get_llm(settings.model_name, settings.temperature, streaming=True)
+    qa = PackedConversationalRetrievalChain(
         retriever=document_retriever,
-        combine_docs_chain=qa_with_stuffed_docs_chain(websocket, prompt_template),
-        question_generator=condense_question_chain(llm),
+        combine_docs_chain=qa_with_stuffed_docs_chain(answer_llm, prompt_template),
+        question_generator=condense_question_chain(
+            get_llm(settings.model_name, settings.temperature, streaming=False)
+        ),
         get_chat_history=get_chat_history,
         callbacks=[StdOutCallbackHandler()],
         return_source_documents=True,
-        max_tokens_limit=3600,
+        context_packer=ContextPacker(token_counter(answer_llm), settings.context_tokens),
     )
     return qa
+
+
+def get_question_answering_chain(
+        project_id: str,
+        vector_store: VectorStore,
+        prompt_template: str,
+        settings: ChainSettings = ChainSettings(),
+        lexical_index: Optional[LexicalIndexDao] = None,
+        scope_to_project: bool = True) -> PackedConversationalRetrievalChain:
+    """
+    Return the question answering chain of a project, building it on first use. The chain only retrieves the
+    documents of the project unless `scope_to_project` is unset, e.g. for a vector store holding a single project.
+    """
+    key = (project_id, vector_store, prompt_template, settings, lexical_index, scope_to_project)
+    chain = _chains.get(key)
+    if chain is None:
+        chain = make_question_answering_chain(vector_store, prompt_template, settings, lexical_index,
+                                              project_id=project_id if scope_to_project else None)
+        with _lock:
+            chain = _chains.setdefault(key, chain)
+    return chain
@@ -0,0 +1,148 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+import tiktoken
+from langchain.chat_models import ChatOpenAI
+from langchain.chains.llm import BaseLanguageModel
+from langchain.schema import Document
+
+MIN_OVERLAP_CHARS = 32
+MAX_OVERLAP_CHARS = 1000
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model_name: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def token_counter(llm: BaseLanguageModel) -> Callable[[str], int]:
+    """
+    Return a function counting the tokens of a text exactly as the model does. The tokenizer of OpenAI models is
+    loaded once per model, on first use; other models count with their own `get_num_tokens`.
+    """
+    if isinstance(llm, ChatOpenAI):
+        model_name = llm.model_name
+        return lambda text: len(get_encoding(model_name).encode(text, disallowed_special=()))
+    return llm.get_num_tokens
+
+
+def _overlap(first: str, second: str) -> int:
+    """
+    Return the length of the longest suffix of `first` that is a prefix of `second`, if it is at least
+    `MIN_OVERLAP_CHARS` long, or 0.
+    """
+    tail = first[-MAX_OVERLAP_CHARS:]
+    seed = second[:MIN_OVERLAP_CHARS]
+    if len(seed) < MIN_OVERLAP_CHARS:
+        return 0
+    position = tail.find(seed)
+    while position != -1:
+        if second.startswith(tail[position:]):
+            return len(tail) - position
+        position = tail.find(seed, position + 1)
+    return 0
+
+
+def _source(document: Document) -> Optional[str]:
+    metadata = document.metadata
+    return metadata.get("doc_url") or metadata.get("source") or metadata.get("doc_source_id")
+
+
+@dataclass
+class PackedContext:
+    documents: List[Document]
+    tokens: int
+    dropped: int
+    trimmed: int
+
+
+class ContextPacker:
+    """
+    Packs retrieved documents into the context of the prompt, within a budget of `token_budget` tokens.
+
+    Documents are taken in retrieval (score) order. Duplicates, and documents contained in a document already
+    packed, are dropped; the text a document shares with a packed document of the same source, e.g. the overlap of
+    two neighbouring chunks of a page, is trimmed. The first document that doesn't fit in the remaining budget is
+    cut to it, if at least `min_document_tokens` remain, and packing stops there.
+
+    Example:
+        >>> packer = ContextPacker(lambda text: len(text.split()), token_budget=3, min_document_tokens=1)
+        >>> packed = packer.pack([Document(page_content="a b"), Document(page_content="a b"),
+        ...                       Document(page_content="c d")])
+        >>> [document.page_content for document in packed.documents], packed.tokens
+        (['a b', 'c'], 3)
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], token_budget: int, min_document_tokens: int = 64):
+        self.count_tokens = count_tokens
+        self.token_budget = token_budget
+        self.min_document_tokens = min_document_tokens
+
+    def _deduplicate(self, document: Document, packed: List[Document]) -> Tuple[Optional[str], bool]:
+        text = document.page_content
+        trimmed = False
+        for other in packed:
+            if text.strip() in other.page_content:
+                return None, False
+            if _source(other) is not None and _source(other) == _source(document):
+                if overlap := _overlap(other.page_content, text):
+                    text, trimmed = text[overlap:], True
+                elif overlap := _overlap(text, other.page_content):
+                    text, trimmed = text[:-overlap], True
+        return (text, trimmed) if text.strip() else (None, False)
+
+    def _cut(self, text: str, tokens: int) -> str:
+        # The longest prefix of the text with at most `tokens` tokens
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(text[:middle]) <= tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low].rstrip()
+
+    def pack(self, documents: List[Document]) -> PackedContext:
+        packed: List[Document] = []
+        tokens = dropped = trimmed = 0
+        for i, document in enumerate(documents):
+            remaining = self.token_budget - tokens
+            if remaining < self.min_document_tokens:
+                dropped += len(documents) - i
+                break
+            text, was_trimmed = self._deduplicate(document, packed)
+            if text is None:
+                dropped += 1
+                continue
+            text_tokens = self.count_tokens(text)
+            cut = text_tokens > remaining
+            if cut:
+                text = self._cut(text, remaining)
+                text_tokens = self.count_tokens(text)
+            if text != document.page_content:
+                document = Document(page_content=text, metadata=document.metadata)
+            packed.append(document)
+            tokens += text_tokens
+            trimmed += was_trimmed or cut
+            if cut:
+                dropped += len(documents) - i - 1
+                break
+        return PackedContext(documents=packed, tokens=tokens, dropped=dropped, trimmed=trimmed)
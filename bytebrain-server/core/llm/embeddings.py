@@ -0,0 +1,135 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import math
+import threading
+import time
+from typing import List, Optional
+
+from langchain.embeddings.base import Embeddings
+from langchain.schema import BaseStore
+
+from config import QueryEmbeddingCacheConfig
+from core.dao.database import run_in_executor
+from core.dao.query_embedding_dao import QueryEmbeddingDao
+from core.utils.cache import TTLCache
+from core.utils.metrics import query_embedding_cache_counter, query_embedding_saved_seconds_counter
+
+# Weight of the latest embedding request in the moving average of their latency
+LATENCY_SMOOTHING = 0.1
+
+_MISSING = object()
+
+
+def normalize_query(text: str) -> str:
+    """
+    Collapse the whitespace of a query, the only difference between two queries that can't change their embedding.
+
+    Example:
+        >>> normalize_query("  What is a\\n  Fiber? ")
+        'What is a Fiber?'
+    """
+    return " ".join(text.split())
+
+
+class QueryEmbeddingCache(Embeddings):
+    """
+    Embeddings caching the embeddings of queries, which `CacheBackedEmbeddings` doesn't, so repeated questions and
+    the question embedded by both the answer cache and the retriever are only sent to the embedding API once.
+
+    The `max_size` most recently used query embeddings are kept in memory, and in `store` as well if given, keyed by
+    the `namespace` of the model and the normalized query. Document embeddings are passed through to `underlying`.
+    """
+
+    def __init__(self, underlying: Embeddings, namespace: str, max_size: int,
+                 store: Optional[BaseStore[str, bytes]] = None):
+        self.underlying = underlying
+        self.namespace = namespace
+        self.store = store
+        self.entries: TTLCache[str, List[float]] = TTLCache(ttl=math.inf, max_size=max_size)
+        self.latency: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.namespace}:{normalize_query(text)}".encode()).hexdigest()
+
+    def _record_hit(self, source: str):
+        query_embedding_cache_counter.labels(result=source).inc()
+        if self.latency is not None:
+            query_embedding_saved_seconds_counter.inc(self.latency)
+
+    def _record_miss(self, key: str, embedding: List[float], latency: float):
+        query_embedding_cache_counter.labels(result="miss").inc()
+        with self.lock:
+            self.latency = latency if self.latency is None else \
+                (1 - LATENCY_SMOOTHING) * self.latency + LATENCY_SMOOTHING * latency
+        self.entries.put(key, embedding)
+        if self.store is not None:
+            self.store.mset([(key, json.dumps(embedding).encode())])
+
+    def _lookup(self, key: str):
+        embedding = self.entries.get(key, _MISSING)
+        if embedding is not _MISSING:
+            self._record_hit("memory")
+            return embedding
+        if self.store is not None:
+            value = self.store.mget([key])[0]
+            if value is not None:
+                embedding = json.loads(value)
+                self.entries.put(key, embedding)
+                self._record_hit("disk")
+                return embedding
+        return _MISSING
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.underlying.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        embedding = self._lookup(key)
+        if embedding is _MISSING:
+            start_time = time.perf_counter()
+            embedding = self.underlying.embed_query(text)
+            self._record_miss(key, embedding, time.perf_counter() - start_time)
+        return embedding
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        embedding = self.entries.get(key, _MISSING)
+        if embedding is not _MISSING:
+            self._record_hit("memory")
+            return embedding
+        if self.store is None:
+            start_time = time.perf_counter()
+            embedding = await self.underlying.aembed_query(text)
+            self._record_miss(key, embedding, time.perf_counter() - start_time)
+            return embedding
+        # The store reads and writes a database, keep it off the event loop
+        embedding = await run_in_executor(self._lookup, key)
+        if embedding is _MISSING:
+            start_time = time.perf_counter()
+            embedding = await self.underlying.aembed_query(text)
+            await run_in_executor(self._record_miss, key, embedding, time.perf_counter() - start_time)
+        return embedding
+
+
+def query_embedding_cache(underlying: Embeddings, namespace: str,
+                          config: QueryEmbeddingCacheConfig) -> QueryEmbeddingCache:
+    store = QueryEmbeddingDao(config.persist_db, config.max_persisted_mb * 2 ** 20) if config.persist_db else None
+    return QueryEmbeddingCache(underlying, namespace, config.max_entries, store)
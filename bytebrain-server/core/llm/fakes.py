@@ -0,0 +1,289 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import math
+import random
+import re
+import time
+import uuid
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain.chat_models.base import BaseChatModel
+from langchain.embeddings.base import Embeddings
+from langchain.schema import AIMessage, BaseMessage, ChatGeneration, ChatResult, Document
+from langchain.vectorstores import VectorStore
+
+from config import BenchmarkConfig
+from core.dao.lexical_index_dao import LexicalIndexDao
+from core.llm.vectorstores import PROJECT_ID
+
+# Stand-ins for the OpenAI models and the Weaviate vector store, used by the benchmark mode of the webservice
+# (`APP_ENV=benchmark`) to run the whole chat pipeline without any network access.
+
+VOCABULARY = ["ZIO", "effect", "fiber", "layer", "Ref", "STM", "stream", "schedule", "retry", "scope", "resource",
+              "interrupt", "environment", "service", "error", "defect", "queue", "hub", "promise", "semaphore",
+              "runtime", "test", "assertion", "clock", "console", "random", "acquire", "release", "fork", "join",
+              "race", "timeout", "parallel", "sequential", "compose", "provide", "dependency", "typed", "value",
+              "the", "a", "of", "to", "with", "and", "is", "in", "for", "when", "use"]
+
+
+def sample_latency(median: float, sigma: float) -> float:
+    """
+    Draw a latency (seconds) from a log-normal distribution with the given median; `sigma` controls the length of
+    its tail, 0 always returns the median.
+    """
+    if median <= 0:
+        return 0.0
+    return random.lognormvariate(math.log(median), sigma)
+
+
+def generate_text(seed: str, words: int) -> str:
+    generator = random.Random(seed)
+    return " ".join(generator.choice(VOCABULARY) for _ in range(words))
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    A chat model answering with generated text, after the first token latency and with the token latency of a real
+    model; when `streaming`, every token is passed to the `on_llm_new_token` callbacks as it is produced.
+    """
+    streaming: bool = False
+    answer_tokens: int = 200
+    first_token_latency: float = 0.5
+    first_token_latency_sigma: float = 0.0
+    token_latency: float = 0.02
+    token_latency_sigma: float = 0.0
+
+    @classmethod
+    def from_config(cls, config: BenchmarkConfig, streaming: bool, answer_tokens: Optional[int] = None):
+        return cls(streaming=streaming,
+                   answer_tokens=answer_tokens or config.answer_tokens,
+                   first_token_latency=config.first_token_latency,
+                   first_token_latency_sigma=config.first_token_latency_sigma,
+                   token_latency=config.token_latency,
+                   token_latency_sigma=config.token_latency_sigma)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def get_token_ids(self, text: str) -> List[int]:
+        # Words and punctuation approximate the OpenAI tokens well enough; the default tokenizer of langchain needs
+        # `transformers`, and tiktoken downloads its encodings
+        return [zlib.crc32(token.encode()) for token in re.findall(r"\w+|[^\w\s]", text)]
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        text = generate_text("".join(str(message.content) for message in messages), self.answer_tokens)
+        return [word if i == 0 else f" {word}" for i, word in enumerate(text.split(" "))]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(sample_latency(self.first_token_latency, self.first_token_latency_sigma))
+        for i, token in enumerate(tokens):
+            if i > 0:
+                time.sleep(sample_latency(self.token_latency, self.token_latency_sigma))
+            if self.streaming and run_manager is not None:
+                run_manager.on_llm_new_token(token)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(sample_latency(self.first_token_latency, self.first_token_latency_sigma))
+        for i, token in enumerate(tokens):
+            if i > 0:
+                await asyncio.sleep(sample_latency(self.token_latency, self.token_latency_sigma))
+            if self.streaming and run_manager is not None:
+                await run_manager.on_llm_new_token(token)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Embeds a text as the normalized counts of its hashed words, so texts sharing words get similar vectors, after
+    the latency of a real embedding request.
+    """
+
+    def __init__(self, dimensions: int = 256, latency: float = 0.0, latency_sigma: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in text.lower().split():
+            vector[zlib.crc32(word.strip("?.,!:;`'\"()").encode()) % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(sample_latency(self.latency, self.latency_sigma))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(sample_latency(self.latency, self.latency_sigma))
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(sample_latency(self.latency, self.latency_sigma))
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(sample_latency(self.latency, self.latency_sigma))
+        return self._embed(text)
+
+
+class InMemoryVectorStore(VectorStore):
+    """
+    A vector store keeping its documents and their embeddings in memory, searched by cosine similarity. Like
+    Weaviate, adding a document with the id of a stored one replaces it.
+    """
+
+    def __init__(self, embedding: Embeddings):
+        self.embedding = embedding
+        self.ids: List[str] = []
+        self.documents: List[Document] = []
+        self.vectors: Optional[np.ndarray] = None
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = [str(id) for id in kwargs.get("uuids") or [uuid.uuid4() for _ in texts]]
+        vectors = np.array(self.embedding.embed_documents(texts), dtype=np.float32)
+        positions = {id: i for i, id in enumerate(self.ids)}
+        new = []
+        for id, text, metadata, vector in zip(ids, texts, metadatas, vectors):
+            document = Document(page_content=text, metadata=metadata)
+            if id in positions:
+                self.documents[positions[id]] = document
+                self.vectors[positions[id]] = vector
+            else:
+                positions[id] = len(self.ids) + len(new)
+                new.append((id, document, vector))
+        if new:
+            self.ids.extend(id for id, _, _ in new)
+            self.documents.extend(document for _, document, _ in new)
+            vectors = np.array([vector for _, _, vector in new], dtype=np.float32)
+            self.vectors = vectors if self.vectors is None else np.vstack([self.vectors, vectors])
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        ids = {str(id) for id in ids or []}
+        return self._delete_positions({i for i, id in enumerate(self.ids) if id in ids}) > 0
+
+    def delete_where(self, where_filter: dict) -> int:
+        """
+        Delete the documents matching a where filter and return their number. Besides the filters supported by the
+        searches, the "ContainsAny" filters on the "id" path of `VectorStoreService.delete_docs` are supported.
+        """
+        if where_filter["path"] == ["id"] and where_filter["operator"] == "ContainsAny":
+            ids = set(where_filter["valueTextArray"])
+            return self._delete_positions({i for i, id in enumerate(self.ids) if id in ids})
+        return self._delete_positions(set(self._candidates(where_filter).tolist()))
+
+    def _delete_positions(self, positions: Set[int]) -> int:
+        if positions:
+            kept = [i for i in range(len(self.ids)) if i not in positions]
+            self.ids = [self.ids[i] for i in kept]
+            self.documents = [self.documents[i] for i in kept]
+            self.vectors = self.vectors[kept] if kept else None
+        return len(positions)
+
+    def update_metadata(self, uuids: Iterable[uuid.UUID], metadata: Dict[str, Any]) -> int:
+        ids = {str(id) for id in uuids}
+        documents = [document for id, document in zip(self.ids, self.documents) if id in ids]
+        for document in documents:
+            document.metadata.update(metadata)
+        return len(documents)
+
+    def get_documents(self, uuids: Iterable[uuid.UUID]) -> List[Tuple[uuid.UUID, Document]]:
+        positions = {id: i for i, id in enumerate(self.ids)}
+        return [(id, Document(page_content=self.documents[positions[str(id)]].page_content,
+                              metadata=dict(self.documents[positions[str(id)]].metadata)))
+                for id in uuids if str(id) in positions]
+
+    def _candidates(self, where_filter: Optional[dict]) -> np.ndarray:
+        # Only the "Equal" filters of `core.llm.vectorstores.project_filter` are supported
+        if where_filter is None:
+            return np.arange(len(self.documents))
+        key, value = where_filter["path"][0], where_filter["valueText"]
+        return np.array([i for i, document in enumerate(self.documents) if document.metadata.get(key) == value],
+                        dtype=np.int64)
+
+    def _search(self, embedding: List[float], k: int, where_filter: Optional[dict] = None) -> np.ndarray:
+        candidates = self._candidates(where_filter)
+        if self.vectors is None or len(candidates) == 0:
+            return np.empty(0, dtype=np.int64)
+        scores = self.vectors[candidates] @ np.array(embedding, dtype=np.float32)
+        return candidates[np.argsort(-scores)[:k]]
+
+    def similarity_search_with_vectors(self, embedding: List[float], k: int = 4,
+                                       **kwargs: Any) -> Tuple[List[Document], np.ndarray]:
+        best = self._search(embedding, k, kwargs.get("where_filter"))
+        if len(best) == 0:
+            return [], np.empty((0, 0), dtype=np.float32)
+        return [self.documents[i] for i in best], self.vectors[best]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        best = self._search(embedding, k, kwargs.get("where_filter"))
+        scores = self.vectors[best] @ np.array(embedding, dtype=np.float32) if len(best) else []
+        return [(self.documents[i], float(score)) for i, score in zip(best, scores)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(await self.embedding.aembed_query(query), k, **kwargs)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   **kwargs: Any) -> "InMemoryVectorStore":
+        store = cls(embedding)
+        store.add_texts(texts, metadatas, **kwargs)
+        return store
+
+
+def add_benchmark_documents(vector_store: VectorStore, documents: int, words: int = 150,
+                            lexical_index: Optional[LexicalIndexDao] = None, project_id: Optional[str] = None):
+    """
+    Fill a vector store, and the lexical index if given, with generated pages of a `zio.dev` documentation site,
+    belonging to `project_id` if given.
+    """
+    texts = [generate_text(f"page-{i}", words) for i in range(documents)]
+    metadatas = [{"doc_source_id": "zio.dev", "doc_title": f"Page {i}", "doc_url": f"https://zio.dev/page-{i}"}
+                 for i in range(documents)]
+    if project_id is not None:
+        for metadata in metadatas:
+            metadata[PROJECT_ID] = project_id
+    uuids = [uuid.uuid5(uuid.NAMESPACE_URL, f"{project_id}:{metadata['doc_url']}") for metadata in metadatas]
+    vector_store.add_texts(texts, metadatas, uuids=uuids)
+    if lexical_index is not None:
+        lexical_index.add_docs(uuids, [Document(page_content=text, metadata=metadata)
+                                       for text, metadata in zip(texts, metadatas)])
@@ -0,0 +1,204 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import re
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from langchain.callbacks.base import Callbacks
+from langchain.schema import Document
+from structlog import getLogger
+
+from core.llm.callbacks import QuestionTimer
+from core.llm.chains import PackedConversationalRetrievalChain
+from core.utils.metrics import condense_path_counter, speculative_retrieval_counter
+
+log = getLogger()
+
+FIRST_TURN = "first_turn"
+STANDALONE = "standalone"
+CONDENSED = "condensed"
+# Answer path of the questions answered from the answer cache, whatever the way their standalone question was obtained
+CACHED = "cached"
+# Answer path of the questions that shared the answer of an identical question asked at the same time
+COALESCED = "coalesced"
+
+MIN_STANDALONE_WORDS = 4
+
+# Words that refer back to something said earlier in the conversation. "that" is often a relative pronoun in
+# standalone questions, but a false positive only costs a condense call, while a false negative answers the wrong
+# question.
+_REFERRING_WORDS = re.compile(
+    r"\b(it|its|it's|this|that|these|those|they|them|their|theirs|he|him|his|she|her|"
+    r"above|previous|previously|earlier|before|same|former|latter|mentioned|"
+    r"also|else|another|other|more|again|instead|one|ones|there|here|such)\b",
+    re.IGNORECASE)
+# Openings of elliptical follow-ups, e.g. "and in ZIO 1?" or "what about layers?".
+_FOLLOW_UP_OPENINGS = re.compile(
+    r"^\s*(and|but|or|so|then|also|why|what about|how about|what if|ok|okay|thanks|thank you|yes|no)\b",
+    re.IGNORECASE)
+
+
+def is_standalone_question(question: str) -> bool:
+    """
+    Cheaply decide whether a follow-up question can be understood without the chat history, so it doesn't need to
+    be rephrased by the LLM. The check is conservative: short questions and questions referring back to the
+    conversation are never considered standalone.
+
+    Example:
+        >>> is_standalone_question("How do I retry a ZIO effect with exponential backoff?")
+        True
+        >>> is_standalone_question("How do I retry it?")
+        False
+    """
+    if len(re.findall(r"\w+", question)) < MIN_STANDALONE_WORDS:
+        return False
+    return not _FOLLOW_UP_OPENINGS.search(question) and not _REFERRING_WORDS.search(question)
+
+
+def normalize_question(question: str) -> str:
+    """
+    Reduce a question to its lowercase words, so questions differing only in case, spacing or punctuation compare
+    equal.
+
+    Example:
+        >>> normalize_question("  What is a  Fiber? ")
+        'what is a fiber'
+    """
+    return " ".join(re.findall(r"\w+", question.lower()))
+
+
+def _stage(timer: Optional[QuestionTimer], name: str):
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+@dataclass
+class PreparedQuestion:
+    """
+    The standalone question of a chat turn, and how it was obtained: `FIRST_TURN` and `STANDALONE` questions were
+    used as asked, `CONDENSED` ones were rephrased by the LLM.
+    """
+    question: str
+    path: str
+    speculative_documents: Optional[asyncio.Task] = None
+
+    def discard(self):
+        """Cancel the speculative retrieval, e.g. when the question is answered from the answer cache."""
+        if self.speculative_documents is not None:
+            self.speculative_documents.cancel()
+            self.speculative_documents = None
+
+
+async def aretrieve_documents(qa: PackedConversationalRetrievalChain, question: str,
+                              callbacks: Callbacks = None) -> List[Document]:
+    """
+    Query the retriever of `qa` for the documents of a standalone question.
+    """
+    return await qa.retriever.aget_relevant_documents(question, callbacks=callbacks)
+
+
+async def aprepare_question(qa: PackedConversationalRetrievalChain, question: str, chat_history: List[str],
+                            standalone_heuristic: bool = True,
+                            speculative_retrieval: bool = False,
+                            timer: Optional[QuestionTimer] = None) -> PreparedQuestion:
+    """
+    Turn a chat turn into a standalone question. The condense LLM call is skipped on the first turn, and, if
+    `standalone_heuristic` is set, for questions `is_standalone_question` accepts.
+
+    When the question has to be condensed and `speculative_retrieval` is set, the documents of the raw question
+    are retrieved while the LLM rephrases it; they are used by `aget_documents` if the rephrased question turns out
+    to be the raw one.
+    """
+    if not qa.get_chat_history(chat_history):
+        path = FIRST_TURN
+    elif standalone_heuristic and is_standalone_question(question):
+        path = STANDALONE
+    else:
+        path = CONDENSED
+    condense_path_counter.labels(path=path).inc()
+    if timer is not None:
+        timer.path = path
+    if path != CONDENSED:
+        return PreparedQuestion(question=question, path=path)
+
+    speculative_documents = None
+    if speculative_retrieval:
+        speculative_documents = asyncio.create_task(aretrieve_documents(qa, question))
+    try:
+        with _stage(timer, "condense"):
+            condensed_question = await qa.question_generator.arun(question=question,
+                                                                  chat_history=qa.get_chat_history(chat_history))
+    except BaseException:
+        if speculative_documents is not None:
+            speculative_documents.cancel()
+        raise
+
+    prepared = PreparedQuestion(question=condensed_question, path=path, speculative_documents=speculative_documents)
+    if speculative_documents is not None and normalize_question(condensed_question) != normalize_question(question):
+        speculative_retrieval_counter.labels(outcome="discarded").inc()
+        prepared.discard()
+    return prepared
+
+
+async def aget_documents(qa: PackedConversationalRetrievalChain, prepared: PreparedQuestion,
+                         callbacks: Callbacks = None,
+                         timer: Optional[QuestionTimer] = None) -> List[Document]:
+    """
+    Return the documents `qa` stuffs into the prompt for a prepared question, packed into its context budget, reusing
+    its speculative retrieval if it still applies.
+    """
+    with _stage(timer, "retrieve"):
+        if prepared.speculative_documents is not None:
+            speculative_retrieval_counter.labels(outcome="used").inc()
+            documents = await prepared.speculative_documents
+            prepared.speculative_documents = None
+        else:
+            documents = await aretrieve_documents(qa, prepared.question, callbacks=callbacks)
+    with _stage(timer, "stuff"):
+        packed = qa.pack_context(documents)
+    if timer is not None:
+        timer.context_tokens = packed.tokens
+    log.info("Packed the context", tokens=packed.tokens, documents=len(packed.documents), dropped=packed.dropped,
+             trimmed=packed.trimmed)
+    return packed.documents
+
+
+async def agenerate_answer(qa: PackedConversationalRetrievalChain, question: str, documents: List[Document],
+                           callbacks: Callbacks = None) -> str:
+    """
+    Answer a standalone question from the given documents with the (streaming) answer LLM of `qa`.
+    """
+    return await qa.combine_docs_chain.arun(input_documents=documents, question=question, callbacks=callbacks)
+
+
+async def aanswer_question(qa: PackedConversationalRetrievalChain, question: str, chat_history: List[str],
+                           callbacks: Callbacks = None,
+                           standalone_heuristic: bool = True,
+                           speculative_retrieval: bool = False,
+                           timer: Optional[QuestionTimer] = None) -> Dict[str, Any]:
+    """
+    Answer a chat turn; like `qa.acall`, but going through `aprepare_question`. Returns the answer, the source
+    documents and the standalone question. The stages are recorded by `timer`, if given; the caller calls
+    `timer.observe()` once the answer was delivered.
+    """
+    prepared = await aprepare_question(qa, question, chat_history, standalone_heuristic, speculative_retrieval,
+                                       timer=timer)
+    documents = await aget_documents(qa, prepared, callbacks=callbacks, timer=timer)
+    if timer is not None:
+        callbacks = list(callbacks or []) + [timer]
+    with _stage(timer, "generate"):
+        answer = await agenerate_answer(qa, prepared.question, documents, callbacks=callbacks)
+    return {"answer": answer, "source_documents": documents, "generated_question": prepared.question}
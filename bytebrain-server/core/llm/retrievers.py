@@ -0,0 +1,155 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain.callbacks.manager import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain.schema import BaseRetriever, Document
+from langchain.vectorstores.base import VectorStore
+
+from core.dao.database import run_in_executor
+from core.dao.lexical_index_dao import LexicalIndexDao
+from core.llm.vectorstores import project_filter
+
+# Rank offset of reciprocal rank fusion, it dampens the advantage of the very first results of each ranking
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: Sequence[List[Document]], weights: Sequence[float],
+                           rrf_k: int = RRF_K) -> List[Document]:
+    """
+    Merge rankings of documents into one: a document scores `weight / (rrf_k + rank)` in each ranking it appears in,
+    and the scores of a document are summed. Documents are identified by their content, the metadata of a document
+    found by several rankings are merged.
+
+    Example:
+        >>> a, b, c = (Document(page_content=text) for text in "abc")
+        >>> [doc.page_content for doc in reciprocal_rank_fusion([[a, b], [c, b]], weights=[1.0, 1.0])]
+        ['b', 'a', 'c']
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, document in enumerate(ranking, start=1):
+            key = document.page_content
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+            if key in documents:
+                documents[key] = Document(page_content=key, metadata={**document.metadata, **documents[key].metadata})
+            else:
+                documents[key] = document
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def maximal_marginal_relevance(query_embedding: Sequence[float], embeddings: np.ndarray, k: int,
+                               lambda_mult: float) -> List[int]:
+    """
+    Select `k` of the candidate `embeddings` one at a time, each maximizing
+    `lambda_mult * similarity to the query - (1 - lambda_mult) * max similarity to the already selected ones`, and
+    return their indices in the order of selection. A `lambda_mult` of 1 ranks by relevance only.
+
+    Unlike `langchain.vectorstores.utils.maximal_marginal_relevance`, the similarities to the selected candidates are
+    updated with one matrix-vector product per selection instead of being recomputed in a Python loop.
+
+    Example:
+        >>> embeddings = np.array([[1.0, 0.0], [1.0, 0.01], [0.6, 0.8]])
+        >>> maximal_marginal_relevance([1.0, 0.0], embeddings, k=2, lambda_mult=0.5)
+        [0, 2]
+    """
+    n = min(k, len(embeddings))
+    if n <= 0:
+        return []
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1)
+    embeddings = embeddings / np.where(norms == 0, 1, norms)[:, None]
+    query = np.asarray(query_embedding, dtype=np.float32)
+    relevance = embeddings @ (query / (np.linalg.norm(query) or 1))
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = embeddings @ embeddings[selected[0]]
+    while len(selected) < n:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(redundancy, embeddings @ embeddings[best], out=redundancy)
+    return selected
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves the `candidates` best documents of a vector search and of a BM25 search of the lexical index, and
+    returns the `k` best of their reciprocal rank fusion. A search whose weight is 0, or the lexical search without a
+    lexical index, is skipped.
+
+    If `lambda_mult` is below 1, the vector search fetches `fetch_k` documents with their embeddings and keeps the
+    `candidates` chosen by `maximal_marginal_relevance`, so overlapping chunks of the same page don't crowd out the
+    others. The vector store must then implement `similarity_search_with_vectors`, see `WeaviateVectorStore`.
+
+    If `project_id` is set, both searches only consider the chunks of that project.
+    """
+    vector_store: VectorStore
+    lexical_index: Optional[LexicalIndexDao] = None
+    k: int = 4
+    candidates: int = 20
+    fetch_k: int = 30
+    lambda_mult: float = 1.0
+    vector_weight: float = 1.0
+    lexical_weight: float = 1.0
+    rrf_k: int = RRF_K
+    project_id: Optional[str] = None
+
+    @property
+    def _search_kwargs(self) -> dict:
+        return {"where_filter": project_filter(self.project_id)} if self.project_id is not None else {}
+
+    def _lexical_search(self, query: str) -> List[Document]:
+        if self.lexical_index is None or self.lexical_weight <= 0:
+            return []
+        return [document for document, _ in self.lexical_index.search(query, self.candidates, self.project_id)]
+
+    def _diverse_vector_search(self, query_embedding: List[float]) -> List[Document]:
+        documents, embeddings = self.vector_store.similarity_search_with_vectors(
+            query_embedding, k=max(self.fetch_k, self.candidates), **self._search_kwargs)
+        selected = maximal_marginal_relevance(query_embedding, embeddings, self.candidates, self.lambda_mult)
+        return [documents[i] for i in selected]
+
+    def _fuse(self, vector_documents: List[Document], lexical_documents: List[Document]) -> List[Document]:
+        return reciprocal_rank_fusion([vector_documents, lexical_documents],
+                                      [self.vector_weight, self.lexical_weight], self.rrf_k)[:self.k]
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        if self.vector_weight <= 0:
+            vector_documents = []
+        elif self.lambda_mult < 1:
+            vector_documents = self._diverse_vector_search(self.vector_store.embeddings.embed_query(query))
+        else:
+            vector_documents = self.vector_store.similarity_search(query, k=self.candidates, **self._search_kwargs)
+        return self._fuse(vector_documents, self._lexical_search(query))
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        async def vector_search() -> List[Document]:
+            if self.vector_weight <= 0:
+                return []
+            if self.lambda_mult < 1:
+                query_embedding = await self.vector_store.embeddings.aembed_query(query)
+                return await run_in_executor(self._diverse_vector_search, query_embedding)
+            return await self.vector_store.asimilarity_search(query, k=self.candidates, **self._search_kwargs)
+
+        vector_documents, lexical_documents = await asyncio.gather(
+            vector_search(), run_in_executor(self._lexical_search, query))
+        return self._fuse(vector_documents, lexical_documents)
@@ -0,0 +1,126 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Sequence, Tuple, TypeVar
+
+from langchain.callbacks.base import AsyncCallbackHandler
+
+from structlog import getLogger
+
+from core.llm.callbacks import StreamingLLMCallbackHandler
+from core.utils.metrics import single_flight_counter
+
+T = TypeVar('T')
+
+_END_OF_STREAM = object()
+
+log = getLogger()
+
+
+class FanOutCallbackHandler(StreamingLLMCallbackHandler):
+    """
+    Streaming handler of a shared answer: every token is delivered to all subscribers, and a subscriber joining
+    late first receives the tokens streamed before it joined.
+    """
+
+    def __init__(self):
+        super().__init__(websocket=None)
+        self.tokens: List[str] = []
+        self.subscribers: List[asyncio.Queue] = []
+        self.finished = False
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.tokens.append(token)
+        for subscriber in self.subscribers:
+            subscriber.put_nowait(token)
+
+    async def flush(self) -> None:
+        pass
+
+    def subscribe(self) -> asyncio.Queue:
+        subscriber: asyncio.Queue = asyncio.Queue()
+        for token in self.tokens:
+            subscriber.put_nowait(token)
+        if self.finished:
+            subscriber.put_nowait(_END_OF_STREAM)
+        else:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def finish(self):
+        self.finished = True
+        for subscriber in self.subscribers:
+            subscriber.put_nowait(_END_OF_STREAM)
+        self.subscribers = []
+
+
+class SingleFlight:
+    """
+    Coalesces identical questions asked at the same time: the first caller of `run` with a key starts the answer,
+    later callers with the same key wait for it instead of starting their own, and the streamed tokens of the answer
+    are delivered to every caller.
+
+    The answer runs in its own task, so it completes for the remaining callers when the one that started it
+    disconnects. Keys are forgotten as soon as their answer completes.
+
+    Example:
+        >>> references, shared = await single_flight.run(
+        ...     (project_id, normalize_question(question)), streaming_handler,
+        ...     lambda stream: answer_query(qa, project_id, query, stream, answer_cache_service, timer),
+        ...     callbacks=[timer])
+    """
+
+    def __init__(self):
+        self.flights: Dict[Hashable, Tuple[FanOutCallbackHandler, asyncio.Task]] = {}
+
+    def _start(self, key: Hashable, function: Callable[[StreamingLLMCallbackHandler], Awaitable[T]]):
+        fan_out = FanOutCallbackHandler()
+        task = asyncio.ensure_future(function(fan_out))
+
+        def finish(_):
+            fan_out.finish()
+            if self.flights.get(key, (None, None))[1] is task:
+                del self.flights[key]
+            if not task.cancelled() and task.exception() is not None:
+                log.error("Shared answer failed", key=key, cause=str(task.exception()))
+
+        task.add_done_callback(finish)
+        self.flights[key] = (fan_out, task)
+
+    async def run(self, key: Hashable, stream: StreamingLLMCallbackHandler,
+                  function: Callable[[StreamingLLMCallbackHandler], Awaitable[T]],
+                  callbacks: Sequence[AsyncCallbackHandler] = ()) -> Tuple[T, bool]:
+        """
+        Stream the answer of `key` to `stream` and return its result, and whether it was shared with an earlier call.
+        `function` produces the answer, streaming its tokens to the handler it is given; it is only called if no
+        answer of `key` is in flight.
+
+        A call sharing an earlier answer passes the tokens to `callbacks` as well when they reach it, e.g. to its own
+        `QuestionTimer`; the call that started the answer leaves them to `function`, which reports its own tokens.
+        """
+        shared = key in self.flights
+        single_flight_counter.labels(role="follower" if shared else "leader").inc()
+        if not shared:
+            self._start(key, function)
+        fan_out, task = self.flights[key]
+
+        tokens = fan_out.subscribe()
+        while (token := await tokens.get()) is not _END_OF_STREAM:
+            await stream.on_llm_new_token(token)
+            if shared:
+                for callback in callbacks:
+                    await callback.on_llm_new_token(token)
+        await stream.flush()
+        return await asyncio.shield(task), shared
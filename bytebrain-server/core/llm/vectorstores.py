@@ -0,0 +1,87 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any, Dict, Iterable, List, Tuple
+from uuid import UUID
+
+import numpy as np
+from langchain.schema import Document
+from langchain.vectorstores import Weaviate
+from weaviate.exceptions import UnexpectedStatusCodeException
+
+# Metadata key, and Weaviate property, of the project a chunk belongs to
+PROJECT_ID = "project_id"
+
+
+def project_filter(project_id: str) -> Dict[str, Any]:
+    """
+    The where filter of a search scoped to the chunks of a project.
+    """
+    return {"path": [PROJECT_ID], "operator": "Equal", "valueText": project_id}
+
+
+class WeaviateVectorStore(Weaviate):
+    """
+    The langchain `Weaviate` vector store, which can also return the stored embeddings of the documents it finds, so
+    they can be re-ranked (see `HybridRetriever`) without embedding them again.
+    """
+
+    def similarity_search_with_vectors(self, embedding: List[float], k: int = 4,
+                                       **kwargs: Any) -> Tuple[List[Document], np.ndarray]:
+        """
+        Look up the `k` documents most similar to an embedding, and return them with a matrix of their embeddings.
+        """
+        query_obj = self._client.query.get(self._index_name, self._query_attrs)
+        if kwargs.get("where_filter"):
+            query_obj = query_obj.with_where(kwargs.get("where_filter"))
+        result = query_obj.with_additional("vector").with_near_vector({"vector": embedding}).with_limit(k).do()
+        if "errors" in result:
+            raise ValueError(f"Error during query: {result['errors']}")
+
+        documents = []
+        vectors = []
+        for res in result["data"]["Get"][self._index_name]:
+            vectors.append(res.pop("_additional")["vector"])
+            text = res.pop(self._text_key)
+            documents.append(Document(page_content=text, metadata=res))
+        return documents, np.array(vectors, dtype=np.float32).reshape(len(vectors), -1)
+
+    def update_metadata(self, uuids: Iterable[UUID], metadata: Dict[str, Any]) -> int:
+        """
+        Merge `metadata` into the properties of the documents with the given ids, keeping their vectors. Returns the
+        number of updated documents; missing documents are skipped.
+        """
+        updated = 0
+        for uuid in uuids:
+            try:
+                self._client.data_object.update(data_object=metadata, class_name=self._index_name, uuid=str(uuid))
+                updated += 1
+            except UnexpectedStatusCodeException as e:
+                if e.status_code != 404:
+                    raise
+        return updated
+
+    def get_documents(self, uuids: Iterable[UUID]) -> List[Tuple[UUID, Document]]:
+        """
+        Fetch the stored documents with the given ids, with all their properties as metadata. Missing documents are
+        skipped.
+        """
+        documents = []
+        for uuid in uuids:
+            result = self._client.data_object.get_by_id(uuid=str(uuid), class_name=self._index_name)
+            if result is not None:
+                properties = dict(result["properties"])
+                text = properties.pop(self._text_key, "")
+                documents.append((uuid, Document(page_content=text, metadata=properties)))
+        return documents
@@ -0,0 +1,105 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from structlog import getLogger
+
+from config import AdmissionConfig
+from core.utils.metrics import admission_queue_depth_gauge, admission_running_gauge, admission_wait_histogram, \
+    admission_rejected_counter
+
+
+class ServerBusy(Exception):
+    def __init__(self, reason: str):
+        super().__init__(f"Server is busy: {reason}")
+        self.reason = reason
+
+
+class AdmissionService:
+    """
+    Bounds the number of questions answered at the same time, so a burst of traffic queues up in front of the LLM
+    provider instead of running into its rate limits.
+
+    At most `AdmissionConfig.max_running` questions are answered at once, and at most
+    `AdmissionConfig.max_running_per_project` of them belong to the same project. Other questions wait, up to
+    `AdmissionConfig.max_waiting` of them and for at most `AdmissionConfig.wait_timeout` seconds; beyond that
+    `ServerBusy` is raised, so the client can be told to retry later.
+
+    Example:
+        >>> async with admission_service.admit(project_id):
+        ...     await aanswer_question(qa, question, chat_history)
+    """
+
+    def __init__(self, config: AdmissionConfig):
+        self.config = config
+        self.running = 0
+        self.running_per_project: Dict[str, int] = defaultdict(int)
+        self.waiting = 0
+        self.condition = asyncio.Condition()
+        self.log = getLogger(name=self.__class__.__name__)
+
+    def _can_run(self, project_id: str) -> bool:
+        return self.running < self.config.max_running \
+            and self.running_per_project[project_id] < self.config.max_running_per_project
+
+    async def _acquire(self, project_id: str):
+        start_time = time.perf_counter()
+        async with self.condition:
+            if not self._can_run(project_id):
+                if self.waiting >= self.config.max_waiting:
+                    admission_rejected_counter.labels(reason="queue_full").inc()
+                    self.log.warning("Rejected a question, the wait queue is full", project_id=project_id)
+                    raise ServerBusy(f"{self.waiting} questions are waiting")
+                self.waiting += 1
+                admission_queue_depth_gauge.set(self.waiting)
+                try:
+                    await asyncio.wait_for(self.condition.wait_for(lambda: self._can_run(project_id)),
+                                           self.config.wait_timeout)
+                except asyncio.TimeoutError:
+                    admission_rejected_counter.labels(reason="timeout").inc()
+                    self.log.warning("Rejected a question, it waited too long", project_id=project_id)
+                    raise ServerBusy(f"waited {self.config.wait_timeout} seconds")
+                finally:
+                    self.waiting -= 1
+                    admission_queue_depth_gauge.set(self.waiting)
+            self.running += 1
+            self.running_per_project[project_id] += 1
+            admission_running_gauge.set(self.running)
+        admission_wait_histogram.observe(time.perf_counter() - start_time)
+
+    async def _release(self, project_id: str):
+        async with self.condition:
+            self.running -= 1
+            self.running_per_project[project_id] -= 1
+            if not self.running_per_project[project_id]:
+                del self.running_per_project[project_id]
+            admission_running_gauge.set(self.running)
+            self.condition.notify_all()
+
+    @asynccontextmanager
+    async def admit(self, project_id: str) -> AsyncIterator[None]:
+        """
+        Wait until a question of the project may be answered, and keep its slot until the block exits.
+        Raises `ServerBusy` if the question can't be admitted.
+        """
+        await self._acquire(project_id)
+        try:
+            yield
+        finally:
+            await self._release(project_id)
@@ -0,0 +1,117 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from pydantic import BaseModel
+from structlog import getLogger
+
+from config import AnswerCacheConfig
+
+
+class CachedAnswer(BaseModel):
+    question: str
+    answer: str
+    references: List[Dict[str, Any]]
+
+
+class ProjectAnswers:
+    """
+    The cached answers of a project, with the embeddings of their questions in the rows of a matrix preallocated for
+    `capacity` answers, so a lookup is a single product without copying the embeddings.
+    """
+
+    def __init__(self, capacity: int, dimension: int):
+        self.embeddings = np.zeros((capacity, dimension), dtype=np.float32)
+        self.answers: List[CachedAnswer] = []
+        # The rows in least to most recently used order
+        self.usage: OrderedDict[int, None] = OrderedDict()
+
+    def lookup(self, question_embedding: np.ndarray, similarity_threshold: float) -> Optional[CachedAnswer]:
+        if not self.answers:
+            return None
+        similarities = self.embeddings[:len(self.answers)] @ question_embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < similarity_threshold:
+            return None
+        self.usage.move_to_end(best)
+        return self.answers[best]
+
+    def store(self, question_embedding: np.ndarray, answer: CachedAnswer):
+        if len(self.answers) < len(self.embeddings):
+            row = len(self.answers)
+            self.answers.append(answer)
+        else:
+            row, _ = self.usage.popitem(last=False)
+            self.answers[row] = answer
+        self.embeddings[row] = question_embedding
+        self.usage[row] = None
+
+
+class AnswerCacheService:
+    """
+    Caches the answers of a project by the embedding of their standalone question.
+
+    A new question is answered from the cache if its embedding has a cosine similarity of at least
+    `similarity_threshold` with the question of a cached answer, so rephrasings of a frequently asked question share
+    one answer. Each project keeps its `max_entries_per_project` most recently used answers; all answers of a project
+    are dropped when one of its resources is re-indexed or deleted.
+
+    Dropping the answers of a project starts a new generation of it. An answer generated from the documents of an
+    earlier generation, i.e. whose generation was taken before the invalidation, is not stored.
+    """
+
+    def __init__(self, embedder: Embeddings, answer_cache_config: AnswerCacheConfig):
+        self.embedder = embedder
+        self.config = answer_cache_config
+        self.entries: Dict[str, ProjectAnswers] = {}
+        self.generations: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.log = getLogger(name=self.__class__.__name__)
+
+    async def aembed_question(self, question: str) -> np.ndarray:
+        embedding = np.asarray(await self.embedder.aembed_query(question), dtype=np.float32)
+        return embedding / (np.linalg.norm(embedding) or 1)
+
+    def generation(self, project_id: str) -> int:
+        with self.lock:
+            return self.generations.get(project_id, 0)
+
+    def lookup(self, project_id: str, question_embedding: np.ndarray) -> Optional[CachedAnswer]:
+        with self.lock:
+            project_answers = self.entries.get(project_id)
+            if project_answers is None:
+                return None
+            return project_answers.lookup(question_embedding, self.config.similarity_threshold)
+
+    def store(self, project_id: str, question_embedding: np.ndarray, answer: CachedAnswer, generation: int):
+        with self.lock:
+            if generation != self.generations.get(project_id, 0):
+                self.log.info("Not caching an answer of an invalidated generation", project_id=project_id)
+                return
+            project_answers = self.entries.get(project_id)
+            if project_answers is None:
+                project_answers = ProjectAnswers(self.config.max_entries_per_project, len(question_embedding))
+                self.entries[project_id] = project_answers
+            project_answers.store(question_embedding, answer)
+
+    def invalidate_project(self, project_id: str):
+        with self.lock:
+            self.generations[project_id] = self.generations.get(project_id, 0) + 1
+            if self.entries.pop(project_id, None):
+                self.log.info("Invalidated cached answers", project_id=project_id)
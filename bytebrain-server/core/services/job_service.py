@@ -0,0 +1,117 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from structlog import getLogger
+
+from config import JobsConfig
+from core.dao.job_dao import JobDao, JobStatus, Job, JobQueueFull
+
+
+class JobService:
+    """
+    Runs persistent background jobs on a fixed-size pool of worker threads.
+
+    Jobs are stored in the jobs database, so pending jobs and the jobs that were running when the process stopped are
+    picked up again after a restart. Each job belongs to a group (e.g. the resource type); the number of running jobs
+    of a group is capped by `JobsConfig.concurrency`, and groups with a lower `JobsConfig.priority` are served first.
+    Jobs submitted with the same `serial_key` run one at a time, in submission order. Submissions are rejected with
+    `JobQueueFull` once `JobsConfig.max_pending` jobs are pending, except the `uncapped` ones, e.g. the clean-up jobs
+    that must not be lost.
+    """
+
+    def __init__(self, job_dao: JobDao, jobs_config: JobsConfig):
+        self.job_dao = job_dao
+        self.config = jobs_config
+        self.handlers: Dict[str, Callable[[dict], None]] = {}
+        self.running_jobs: Dict[str, int] = defaultdict(int)
+        self.condition = threading.Condition()
+        self.workers: List[threading.Thread] = []
+        self.stopped = False
+        self.log = getLogger(name=self.__class__.__name__)
+
+    def register_handler(self, job_type: str, handler: Callable[[dict], None]):
+        self.handlers[job_type] = handler
+
+    def submit(self, job_type: str, job_group: str, payload: dict, dedup_key: Optional[str] = None,
+               serial_key: Optional[str] = None, uncapped: bool = False) -> Optional[str]:
+        job_id = self.job_dao.add_job(
+            job_type=job_type,
+            job_group=job_group,
+            priority=self.config.priority.get(job_group, max(self.config.priority.values(), default=0) + 1),
+            payload=payload,
+            dedup_key=dedup_key,
+            serial_key=serial_key,
+            max_pending=None if uncapped else self.config.max_pending
+        )
+        if job_id is None:
+            self.log.info(f"Skipped {job_type} job, an active job with the same key exists", dedup_key=dedup_key)
+            return None
+
+        with self.condition:
+            self.condition.notify()
+        return job_id
+
+    def cancel(self, dedup_key: str) -> int:
+        """Cancel the pending jobs with the given dedup key; running jobs are left to finish."""
+        return self.job_dao.cancel_pending_jobs(dedup_key)
+
+    def start(self):
+        requeued_jobs = self.job_dao.requeue_running_jobs()
+        if requeued_jobs:
+            self.log.info(f"Requeued {requeued_jobs} interrupted jobs")
+
+        self.stopped = False
+        for i in range(self.config.workers):
+            worker = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self, timeout: Optional[float] = None):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        for worker in self.workers:
+            worker.join(timeout)
+        self.workers = []
+
+    def _saturated_groups(self) -> List[str]:
+        return [group for group, running in self.running_jobs.items()
+                if running >= self.config.concurrency.get(group, self.config.workers)]
+
+    def _claim_job(self) -> Optional[Job]:
+        with self.condition:
+            while not self.stopped:
+                job = self.job_dao.claim_next_job(self._saturated_groups())
+                if job is not None:
+                    self.running_jobs[job.job_group] += 1
+                    return job
+                self.condition.wait(self.config.poll_interval)
+        return None
+
+    def _work(self):
+        while (job := self._claim_job()) is not None:
+            try:
+                self.handlers[job.job_type](job.payload)
+                self.job_dao.set_status(job.id, JobStatus.Finished)
+            except Exception as e:
+                self.log.error(f"Job {job.id} of type {job.job_type} failed: {type(e).__name__}: {e}")
+                self.job_dao.set_status(job.id, JobStatus.Failed, error=f"{type(e).__name__}: {e}")
+            finally:
+                with self.condition:
+                    self.running_jobs[job.job_group] -= 1
+                    self.condition.notify_all()
@@ -13,7 +13,7 @@
 # limitations under the License.
 
 import uuid
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 from fastapi import HTTPException
 from fastapi import status
@@ -22,6 +22,7 @@ from core.dao.apikey_dao import ApiKeyDao, ApiKey
 from core.dao.project_dao import ProjectDao, Project
 from core.dao.resource_dao import Resource
 from core.services.resource_service import ResourceService
+from core.utils.cache import TTLCache
 
 
 class ProjectNotFound(Exception):
@@ -31,10 +32,14 @@ class ProjectNotFound(Exception):
 
 
 class ProjectService:
-    def __init__(self, project_dao: ProjectDao, resource_service: ResourceService, apikey_dao: ApiKeyDao):
+    def __init__(self, project_dao: ProjectDao, resource_service: ResourceService, apikey_dao: ApiKeyDao,
+                 apikey_cache_ttl: float = 60, apikey_cache_size: int = 1024):
         self.project_dao = project_dao
         self.resource_service = resource_service
         self.apikey_dao = apikey_dao
+        # apikey -> (apikey, project without resources), or None if the apikey or its project doesn't exist
+        self.apikey_cache: TTLCache[str, Optional[Tuple[ApiKey, Project]]] = TTLCache(ttl=apikey_cache_ttl,
+                                                                                      max_size=apikey_cache_size)
 
     def delete_projects_owned_by(self, user_id: str):
         projects_to_delete = self.project_dao.get_all_projects(user_id)
@@ -47,6 +52,8 @@ class ProjectService:
             if project_to_delete.user_id == user_id:
                 self.resource_service.delete_resources_by_project_id(project_id)
                 self.project_dao.delete_project(project_id)
+                self.apikey_cache.invalidate_where(
+                    lambda _, resolved: resolved is not None and resolved[1].id == project_id)
             else:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
@@ -86,15 +93,47 @@ class ProjectService:
 
         return project
 
-    def get_project_by_apikey(self, apikey) -> Optional[Project]:
+    def _load_apikey(self, apikey: str) -> Optional[Tuple[ApiKey, Project]]:
         apikey: Optional[ApiKey] = self.apikey_dao.get_apikey(apikey)
         if apikey is None:
             return None
         project: Optional[Project] = self.project_dao.get_project_by_id(apikey.project_id)
         if project is None:
             return None
-        resources: List[Resource] = self.resource_service.get_resources_by_project_id(project.id)
-        project.resources = resources
+        return apikey, project
+
+    def resolve_apikey(self, apikey: str) -> Optional[Tuple[ApiKey, Project]]:
+        """
+        Return the apikey and its project, or None if either doesn't exist. Results are cached for
+        `apikey_cache_ttl` seconds, the returned objects must not be modified.
+        """
+        return self.apikey_cache.get_or_load(apikey, self._load_apikey)
+
+    def get_cached_apikey(self, apikey: str, default=None):
+        """
+        Return the cached result of `resolve_apikey`, or `default` if it isn't cached. It never touches the database,
+        so it can be called from the event loop.
+        """
+        return self.apikey_cache.get(apikey, default)
+
+    @staticmethod
+    def allows_domain(resolved: Optional[Tuple[ApiKey, Project]], domain) -> bool:
+        if resolved is None:
+            return False
+        allowed_domains = resolved[0].allowed_domains
+        if not allowed_domains:
+            return True
+        else:
+            return domain in allowed_domains
+
+    def get_project_by_apikey(self, apikey, with_resources: bool = True) -> Optional[Project]:
+        resolved = self.resolve_apikey(apikey)
+        if resolved is None:
+            return None
+        project = resolved[1].copy()
+        if with_resources:
+            resources: List[Resource] = self.resource_service.get_resources_by_project_id(project.id)
+            project.resources = resources
 
         return project
 
@@ -110,12 +149,15 @@ class ProjectService:
             project_id=project_id
         )
 
-        return self.apikey_dao.add_apikey(apikey)
+        added_apikey = self.apikey_dao.add_apikey(apikey)
+        self.apikey_cache.invalidate(apikey.apikey)
+        return added_apikey
 
     def delete_apikey(self, apikey: str, project_id: str, user_id: str):
         project = self.project_dao.get_project_by_id(project_id)
         if project.user_id == user_id:
             self.apikey_dao.delete_apikey(apikey)
+            self.apikey_cache.invalidate(apikey)
         else:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -123,8 +165,4 @@ class ProjectService:
             )
 
     def is_allowed(self, domain, apikey) -> bool:
-        allowed_domains = self.apikey_dao.get_apikey(apikey).allowed_domains
-        if not allowed_domains:
-            return True
-        else:
-            return domain in allowed_domains
+        return self.allows_domain(self.resolve_apikey(apikey), domain)
@@ -13,18 +13,122 @@
 # limitations under the License.
 
 import json
-import threading
+import os
+import time
 import uuid
+from collections import defaultdict
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Iterable, Optional, List, Set
+from uuid import UUID
 
+from langchain.schema import Document
 from structlog import getLogger
 
+from config import IngestionConfig
+from core.dao.http_cache_dao import HttpCacheDao
 from core.dao.metadata_dao import MetadataDao
 from core.dao.resource_dao import ResourceType, ResourceState, ResourceDao, Resource
-from core.docs.document_loader import load_docs_from_site, load_docs_from_webpage, load_youtube_docs, \
-    load_sourcecode_from_git_repo
+from core.docs.document_loader import lazy_load_docs_from_site, load_docs_from_webpage, load_youtube_docs, \
+    load_sourcecode_from_git_repo, load_sourcecode_files
+from core.docs.git_mirror import GitMirror
+from core.docs.http_cache import PAGE_HASH, is_unchanged_page
+from core.docs.pipeline import buffered, batched
+from core.llm.vectorstores import PROJECT_ID
+from core.services.answer_cache_service import AnswerCacheService
+from core.services.job_service import JobService, JobQueueFull
 from core.services.vectorstore_service import VectorStoreService
+from core.utils.metrics import indexed_chunks_counter, git_update_stage_histogram
+
+
+@dataclass
+class IndexingStats:
+    """Chunks of a resource (re-)indexed, skipped because they didn't change since the last indexing, and deleted."""
+    indexed: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+
+
+class IncrementalIndexer:
+    """
+    Indexes the chunks of one indexing run of a resource, skipping those that are already indexed.
+
+    Chunk ids are derived from the content hash of the chunk, so a chunk of the previous run with the same id is
+    unchanged and isn't embedded nor written again, unless it was indexed for another project. Once all chunks were
+    passed to `index`, `finish` deletes the chunks of the previous run that weren't seen again.
+
+    Web pages that didn't change since they were indexed aren't split again: the loaders pass an `unchanged_page`
+    placeholder instead, which keeps all the chunks of the page. `indexed_pages` are the pages eligible for it, those
+    whose chunks were all split from the same version of the page and indexed for this project.
+    """
+
+    def __init__(self, vectorstore_service: VectorStoreService, metadata_service: MetadataDao,
+                 resource_id: str, resource_type: ResourceType, project_id: str):
+        self.vectorstore_service = vectorstore_service
+        self.metadata_service = metadata_service
+        self.resource_type = resource_type
+        self.project_id = project_id
+        self.stored: Dict[str, dict] = {metadata['doc_uuid']: metadata for metadata in
+                                        metadata_service.get_metadata_list(resource_type.value, resource_id)}
+        self.seen: Set[str] = set()
+        self.stats = IndexingStats()
+        self.page_chunks: Dict[str, List[str]] = defaultdict(list)
+        page_hashes: Dict[str, Set[Optional[str]]] = defaultdict(set)
+        for doc_uuid, metadata in self.stored.items():
+            if (url := metadata.get('doc_url')) is not None:
+                self.page_chunks[url].append(doc_uuid)
+                page_hashes[url].add(metadata.get(PAGE_HASH) if metadata.get(PROJECT_ID) == project_id else None)
+        self.indexed_pages: Dict[str, str] = {url: next(iter(hashes)) for url, hashes in page_hashes.items()
+                                              if len(hashes) == 1 and None not in hashes}
+
+    def _is_indexed(self, doc: Document) -> bool:
+        metadata = self.stored.get(doc.metadata['doc_uuid'])
+        return metadata is not None and metadata.get(PROJECT_ID) == self.project_id
+
+    def keep_unchanged_files(self, changed_paths: Set[str]) -> Set[str]:
+        """
+        Keep the chunks of the source files that are not in `changed_paths` without loading them. Returns the files
+        whose chunks can't be kept because they were indexed for another project, they must be loaded too.
+        """
+        reloaded_paths = {metadata.get('doc_path') for metadata in self.stored.values()
+                          if metadata.get(PROJECT_ID) != self.project_id} - changed_paths
+        for doc_uuid, metadata in self.stored.items():
+            if metadata.get('doc_path') not in changed_paths | reloaded_paths:
+                self.seen.add(doc_uuid)
+                self.stats.unchanged += 1
+        return reloaded_paths
+
+    def index(self, docs: Iterable[Document]):
+        changed_docs = []
+        for doc in docs:
+            if is_unchanged_page(doc):
+                page_chunks = self.page_chunks[doc.metadata['doc_url']]
+                self.seen.update(page_chunks)
+                self.stats.unchanged += len(page_chunks)
+                continue
+            self.seen.add(doc.metadata['doc_uuid'])
+            if self._is_indexed(doc):
+                self.stats.unchanged += 1
+            else:
+                changed_docs.append(doc)
+                # Identical chunks share an id, a repeated one is only indexed once
+                self.stored[doc.metadata['doc_uuid']] = {PROJECT_ID: self.project_id}
+        if changed_docs:
+            self.vectorstore_service.index_docs([UUID(doc.metadata['doc_uuid']) for doc in changed_docs],
+                                                changed_docs, self.project_id)
+            self.metadata_service.save_docs_metadata(changed_docs)
+            self.stats.indexed += len(changed_docs)
+
+    def finish(self) -> IndexingStats:
+        vanished_ids = [UUID(doc_uuid) for doc_uuid in self.stored if doc_uuid not in self.seen]
+        if vanished_ids:
+            self.vectorstore_service.delete_docs(vanished_ids)
+            self.metadata_service.delete_docs(vanished_ids)
+        self.stats.deleted = len(vanished_ids)
+        for outcome in ["indexed", "unchanged", "deleted"]:
+            indexed_chunks_counter.labels(resource_type=self.resource_type.value, outcome=outcome) \
+                .inc(getattr(self.stats, outcome))
+        return self.stats
 
 
 class ResourceService:
@@ -33,18 +137,131 @@ class ResourceService:
     YOUTUBE_ID_NAMESPACE = uuid.UUID('05980ffd-3506-4b2d-af0c-7c0afdbfe57e')
     GITHUB_ID_NAMESPACE = uuid.UUID('b734ee40-169b-4c9e-9dd0-6bede6e6dfa3')
 
+    INDEX_RESOURCE_JOB = "index_resource"
+    DELETE_RESOURCE_JOB = "delete_resource"
+    SCOPE_RESOURCE_JOB = "scope_resource"
+    LEXICAL_INDEX_RESOURCE_JOB = "lexical_index_resource"
+
     def __init__(self, resource_dao, vectorstore_service: VectorStoreService,
-                 metadata_service: MetadataDao):
+                 metadata_service: MetadataDao, job_service: JobService, ingestion_config: IngestionConfig,
+                 answer_cache_service: Optional[AnswerCacheService] = None,
+                 http_cache: Optional[HttpCacheDao] = None,
+                 git_mirrors_dir: Optional[str] = None):
         self.vectorstore_service = vectorstore_service
         self.metadata_service = metadata_service
         self.resource_dao: ResourceDao = resource_dao
-        self._create_daemon(self.resource_dao.get_unfinished_resources())
+        self.job_service = job_service
+        self.ingestion_config = ingestion_config
+        self.answer_cache_service = answer_cache_service
+        self.http_cache = http_cache
+        self.git_mirrors_dir = git_mirrors_dir
+        self.job_service.register_handler(self.INDEX_RESOURCE_JOB, self._run_index_job)
+        self.job_service.register_handler(self.DELETE_RESOURCE_JOB, self._run_delete_job)
+        self.job_service.register_handler(self.SCOPE_RESOURCE_JOB, self._run_scope_job)
+        self.job_service.register_handler(self.LEXICAL_INDEX_RESOURCE_JOB, self._run_lexical_index_job)
         self.log = getLogger(name=self.__class__.__name__)
 
-    def _create_daemon(self, pending_resources):
-        background_thread = threading.Thread(target=self._index_resources,
-                                             kwargs={"pending_resources": pending_resources}, daemon=True)
-        background_thread.start()
+    def resume_unfinished_resources(self):
+        # Resources that have an active job are skipped by the job deduplication, so this only enqueues the
+        # unfinished resources whose job was lost, e.g. those submitted before jobs were persisted.
+        for resource_id, _, resource_type, _, _, _ in self.resource_dao.get_unfinished_resources():
+            try:
+                self._submit_index_job(resource_id, resource_type)
+            except JobQueueFull as e:
+                self.log.warning(f"Couldn't resume resource {resource_id}: {e}")
+        self.scope_unscoped_resources()
+        self.index_lexically_unindexed_resources()
+
+    def scope_unscoped_resources(self):
+        # Chats only retrieve the chunks of their project, so the chunks indexed before chunks were scoped to their
+        # project would be found by no chat until their resource is indexed again.
+        for resource_id in self.metadata_service.get_unscoped_source_ids():
+            if self.resource_dao.get_by_id(resource_id) is None:
+                continue
+            try:
+                self.job_service.submit(
+                    job_type=self.SCOPE_RESOURCE_JOB,
+                    job_group="scope",
+                    payload={"resource_id": resource_id},
+                    dedup_key=f"{self.SCOPE_RESOURCE_JOB}:{resource_id}",
+                    serial_key=self._serial_key(resource_id)
+                )
+            except JobQueueFull as e:
+                self.log.warning(f"Couldn't scope the chunks of resource {resource_id} to its project: {e}")
+
+    def _run_scope_job(self, payload: dict):
+        resource = self.resource_dao.get_by_id(payload["resource_id"])
+        if resource is None:
+            return
+        uuids = [UUID(metadata['doc_uuid']) for metadata in
+                 self.metadata_service.get_metadata_list(resource.resource_type.value, resource.resource_id)
+                 if metadata.get(PROJECT_ID) is None]
+        updated = self.vectorstore_service.set_project_id(uuids, resource.resource_id, resource.project_id)
+        # The metadata is updated last, so the job is submitted again at the next start if it is interrupted
+        self.metadata_service.set_project_id(resource.resource_id, resource.project_id)
+        self.log.info(f"Scoped {updated} chunks of resource {resource.resource_id} to project {resource.project_id}")
+
+    @staticmethod
+    def _serial_key(resource_id: str) -> str:
+        # A resource submitted again right after its deletion has the same id, and the delete job removes its chunks
+        # by resource id, so the jobs of a resource run one after the other, in the order they were submitted.
+        return f"resource:{resource_id}"
+
+    def index_lexically_unindexed_resources(self):
+        # Only the chunks indexed since the lexical index exists are in it, and the incremental indexing skips the
+        # others as unchanged, so their resources would be searched by embeddings only.
+        lexical_counts = self.vectorstore_service.lexical_index_counts()
+        for resource_id, count in self.metadata_service.count_docs_by_source_id().items():
+            if lexical_counts.get(resource_id, 0) >= count or self.resource_dao.get_by_id(resource_id) is None:
+                continue
+            try:
+                self.job_service.submit(
+                    job_type=self.LEXICAL_INDEX_RESOURCE_JOB,
+                    job_group="lexical_index",
+                    payload={"resource_id": resource_id},
+                    dedup_key=f"{self.LEXICAL_INDEX_RESOURCE_JOB}:{resource_id}",
+                    serial_key=self._serial_key(resource_id)
+                )
+            except JobQueueFull as e:
+                self.log.warning(f"Couldn't add the chunks of resource {resource_id} to the lexical index: {e}")
+
+    def _run_lexical_index_job(self, payload: dict):
+        resource = self.resource_dao.get_by_id(payload["resource_id"])
+        if resource is None:
+            return
+        indexed = self.vectorstore_service.index_missing_lexical_docs(
+            self.metadata_service.get_docs_ids_by_source_id(resource.resource_id), resource.resource_id,
+            resource.project_id)
+        self.log.info(f"Added {indexed} chunks of resource {resource.resource_id} to the lexical index")
+
+    def _submit_index_job(self, resource_id: str, resource_type: str) -> Optional[str]:
+        return self.job_service.submit(
+            job_type=self.INDEX_RESOURCE_JOB,
+            job_group=resource_type,
+            payload={"resource_id": resource_id},
+            dedup_key=f"{self.INDEX_RESOURCE_JOB}:{resource_id}",
+            serial_key=self._serial_key(resource_id)
+        )
+
+    def _enqueue_new_resource(self, resource_id: str, resource_type: ResourceType) -> str:
+        try:
+            self._submit_index_job(resource_id, resource_type.value)
+        except JobQueueFull:
+            # Don't keep a resource that will never be indexed, so it can be submitted again later.
+            self.resource_dao.delete_resource(resource_id)
+            raise
+        return resource_id
+
+    def _run_index_job(self, payload: dict):
+        resource_id = payload["resource_id"]
+        pending_resources = self.resource_dao.get_pending_resources_by_id(resource_id)
+        self._index_resources(pending_resources)
+        for _, _, _, project_id, _, _ in pending_resources:
+            self._invalidate_answers(project_id)
+        if self.resource_dao.get_by_id(resource_id) is None:
+            # The resource was deleted while it was being indexed, clean up what was indexed in the meantime
+            self.metadata_service.delete_docs_by_resource_id(resource_id)
+            self._submit_delete_job(resource_id)
 
     def submit_website_resource(self, name: str, url: str, project_id: str) -> Optional[str]:
         resource_id = str(uuid.uuid5(self.WEBSITE_ID_NAMESPACE, name=url + project_id))
@@ -58,9 +275,7 @@ class ResourceService:
         if result is None:
             return None
         else:
-            pending_resources = self.resource_dao.get_pending_resources_by_id(resource_id)
-            self._create_daemon(pending_resources)
-            return resource_id
+            return self._enqueue_new_resource(resource_id, ResourceType.Website)
 
     def submit_webpage_resource(self, name: str, url: str, project_id: str) -> Optional[str]:
         resource_id = str(uuid.uuid5(self.WEBPAGE_ID_NAMESPACE, name=url + project_id))
@@ -74,9 +289,7 @@ class ResourceService:
         if result is None:
             return None
         else:
-            pending_resources = self.resource_dao.get_pending_resources_by_id(resource_id)
-            self._create_daemon(pending_resources)
-            return resource_id
+            return self._enqueue_new_resource(resource_id, ResourceType.Webpage)
 
     def submit_youtube_resource(self, name: str, url: str, project_id: str) -> Optional[str]:
         resource_id = str(uuid.uuid5(self.YOUTUBE_ID_NAMESPACE, name=url + project_id))
@@ -90,9 +303,7 @@ class ResourceService:
         if result is None:
             return None
         else:
-            pending_resources = self.resource_dao.get_pending_resources_by_id(resource_id)
-            self._create_daemon(pending_resources)
-            return resource_id
+            return self._enqueue_new_resource(resource_id, ResourceType.Youtube)
 
     def submit_github_resource(self,
                                name: str,
@@ -115,9 +326,7 @@ class ResourceService:
         if result is None:
             return None
         else:
-            pending_resources = self.resource_dao.get_pending_resources_by_id(resource_id)
-            self._create_daemon(pending_resources)
-            return resource_id
+            return self._enqueue_new_resource(resource_id, ResourceType.GitHub)
 
     def _is_update_allowed(self, resource_id: str) -> bool:
         last_updated_at = self.resource_dao.get_last_updated_at(resource_id)
@@ -137,31 +346,68 @@ class ResourceService:
                 f"Update request for resource {resource_id} rejected. Last update was less than 24 hours ago.")
             return False
 
+        resource = self.resource_dao.get_by_id(resource_id)
+        if resource is None:
+            return False
+        last_updated_at = self.resource_dao.get_last_updated_at(resource_id)
+        # Set before submitting, so it doesn't overwrite the state set by a job picking the resource up right away
         self.resource_dao.set_state(resource_id, ResourceState.Pending)
-        pending_resource = self.resource_dao.get_pending_resources_by_id(resource_id)
-        self._create_daemon(pending_resource)
+        try:
+            self._submit_index_job(resource_id, resource.resource_type.value)
+        except JobQueueFull:
+            # Nothing will index the resource, and a rejected update doesn't count against the update rate limit
+            self.resource_dao.restore_state(resource_id, resource.status, last_updated_at)
+            raise
         return True
 
+    def _incremental_indexer(self, resource_id: str, resource_type: ResourceType,
+                             project_id: str) -> IncrementalIndexer:
+        return IncrementalIndexer(self.vectorstore_service, self.metadata_service, resource_id, resource_type,
+                                  project_id)
+
+    def _finish_indexing(self, indexer: IncrementalIndexer, resource_id: str, name: str):
+        stats = indexer.finish()
+        self.log.info(f"Indexed {name}: {stats.indexed} chunks indexed, {stats.unchanged} unchanged chunks skipped, "
+                      f"{stats.deleted} vanished chunks deleted", resource_id=resource_id)
+        self.resource_dao.set_state(resource_id, ResourceState.Finished)
+
     def index_website_resource(self, resource_id, url: str, project_id: str):
+        # Pages are crawled, split and indexed concurrently, so chunks become searchable while the crawl is running
         self.resource_dao.set_state(resource_id, ResourceState.Loading)
-        ids, docs = load_docs_from_site(doc_source_id=resource_id,
+        indexer = self._incremental_indexer(resource_id, ResourceType.Website, project_id)
+        docs = lazy_load_docs_from_site(doc_source_id=resource_id,
                                         doc_source_type=ResourceType.Website.value,
+                                        max_buffered_pages=self.ingestion_config.max_buffered_pages,
+                                        http_cache=self.http_cache,
+                                        indexed_pages=indexer.indexed_pages,
+                                        transform_workers=self.ingestion_config.transform_workers,
+                                        transform_chunk_size=self.ingestion_config.transform_chunk_size,
                                         url=url)
-        self.resource_dao.set_state(resource_id, ResourceState.Indexing)
-        self.vectorstore_service.index_docs(ids, docs)
-        self.metadata_service.save_docs_metadata(docs)
-        self.resource_dao.set_state(resource_id, ResourceState.Finished)
+        loaded_docs = 0
+        for batch in batched(buffered(docs, max_size=self.ingestion_config.max_buffered_chunks),
+                             batch_size=self.ingestion_config.index_batch_size):
+            if loaded_docs == 0:
+                self.resource_dao.set_state(resource_id, ResourceState.Indexing)
+            indexer.index(batch)
+            loaded_docs += len(batch)
+            self.log.info(f"Processed {loaded_docs} chunks of website {url}, {indexer.stats.indexed} indexed")
+            if self.resource_dao.get_by_id(resource_id) is None:
+                self.log.info(f"Stopped indexing website {url}, the resource was deleted")
+                return
+        self._finish_indexing(indexer, resource_id, f"website {url}")
 
     def index_webpage_resource(self, resource_id, url: str, project_id):
         # TODO: when it can't download the resource why it proceeds?
         self.resource_dao.set_state(resource_id, ResourceState.Loading)
+        indexer = self._incremental_indexer(resource_id, ResourceType.Webpage, project_id)
         ids, docs = load_docs_from_webpage(url=url,
                                            doc_source_id=resource_id,
-                                           doc_source_type=ResourceType.Webpage.value)
+                                           doc_source_type=ResourceType.Webpage.value,
+                                           http_cache=self.http_cache,
+                                           indexed_pages=indexer.indexed_pages)
         self.resource_dao.set_state(resource_id, ResourceState.Indexing)
-        self.vectorstore_service.index_docs(ids, docs)
-        self.metadata_service.save_docs_metadata(docs)
-        self.resource_dao.set_state(resource_id, ResourceState.Finished)
+        indexer.index(docs)
+        self._finish_indexing(indexer, resource_id, f"webpage {url}")
 
     def index_youtube_resource(self, resource_id, url: str, project_id: str):
         self.resource_dao.set_state(resource_id, ResourceState.Loading)
@@ -169,23 +415,75 @@ class ResourceService:
                                       doc_source_id=resource_id,
                                       doc_source_type=ResourceType.Youtube.value)
         self.resource_dao.set_state(resource_id, ResourceState.Indexing)
-        self.vectorstore_service.index_docs(ids, docs)
-        self.metadata_service.save_docs_metadata(docs)
-        self.resource_dao.set_state(resource_id, ResourceState.Finished)
+        indexer = self._incremental_indexer(resource_id, ResourceType.Youtube, project_id)
+        indexer.index(docs)
+        self._finish_indexing(indexer, resource_id, f"youtube video {url}")
+
+    def _git_mirror(self, resource_id: str, clone_url: str, branch: Optional[str],
+                    paths: Optional[str] = None) -> GitMirror:
+        return GitMirror(os.path.join(self.git_mirrors_dir, resource_id), clone_url, branch, paths)
 
     def index_github_resource(self, resource_id, clone_url: str, language: str, paths: str,
                               branch: Optional[str], project_id: str):
         self.resource_dao.set_state(resource_id, ResourceState.Loading)
-        ids, docs = load_sourcecode_from_git_repo(clone_url=clone_url,
-                                                  doc_source_id=resource_id,
-                                                  doc_source_type=ResourceType.GitHub.value,
-                                                  language=language,
-                                                  branch=branch,
-                                                  paths=paths)
+        indexer = self._incremental_indexer(resource_id, ResourceType.GitHub, project_id)
+        if self.git_mirrors_dir is None:
+            ids, docs = load_sourcecode_from_git_repo(clone_url=clone_url,
+                                                      doc_source_id=resource_id,
+                                                      doc_source_type=ResourceType.GitHub.value,
+                                                      language=language,
+                                                      branch=branch,
+                                                      paths=paths,
+                                                      transform_workers=self.ingestion_config.transform_workers)
+            self.resource_dao.set_state(resource_id, ResourceState.Indexing)
+            indexer.index(docs)
+            self._finish_indexing(indexer, resource_id, f"repository {clone_url}")
+            return
+
+        # The repository is mirrored on disk, an update fetches the new commits and only the files they touched are
+        # split and embedded again; the chunks of the other files are kept as they are
+        durations = {}
+        start_time = time.perf_counter()
+        mirror = self._git_mirror(resource_id, clone_url, branch, paths)
+        commit = mirror.sync()
+        durations["sync"] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        resource = self.resource_dao.get_by_id(resource_id)
+        indexed_commit = resource.metadata.get("indexed_commit") if resource is not None else None
+        changed_files = mirror.changed_files(indexed_commit) if indexed_commit else None
+        if changed_files is None:
+            files = mirror.tracked_files()
+        else:
+            files = changed_files + sorted(indexer.keep_unchanged_files(set(changed_files)))
+        durations["diff"] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        ids, docs = load_sourcecode_files(repo_path=mirror.path,
+                                          files=files,
+                                          doc_source_id=resource_id,
+                                          doc_source_type=ResourceType.GitHub.value,
+                                          language=language,
+                                          paths=paths,
+                                          transform_workers=self.ingestion_config.transform_workers,
+                                          transform_chunk_size=self.ingestion_config.transform_chunk_size)
+        durations["load"] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
         self.resource_dao.set_state(resource_id, ResourceState.Indexing)
-        self.vectorstore_service.index_docs(ids, docs)
-        self.metadata_service.save_docs_metadata(docs)
-        self.resource_dao.set_state(resource_id, ResourceState.Finished)
+        indexer.index(docs)
+        self._finish_indexing(indexer, resource_id, f"repository {clone_url}")
+        durations["index"] = time.perf_counter() - start_time
+
+        if resource is not None:
+            self.resource_dao.update_metadata(resource_id, {**resource.metadata, "indexed_commit": commit})
+        for stage, duration in durations.items():
+            git_update_stage_histogram.labels(stage=stage).observe(duration)
+        changes = f"{len(changed_files)} files changed since {indexed_commit[:12]}" if changed_files is not None \
+            else f"{len(files)} files loaded"
+        self.log.info(f"Updated repository {clone_url} to {commit[:12]}, {changes}: " +
+                      ", ".join(f"{stage} {duration:.2f}s" for stage, duration in durations.items()),
+                      resource_id=resource_id)
 
     def _index_resources(self, pending_resources):
         for resource_id, resource_name, resource_type, project_id, metadata, status in pending_resources:
@@ -211,11 +509,43 @@ class ResourceService:
                                                project_id=project_id)
                     self.log.info(f"New GitHub repo indexed: {resource_name, json.loads(metadata)['language']}")
 
+    def _submit_delete_job(self, resource_id: str) -> Optional[str]:
+        return self.job_service.submit(
+            job_type=self.DELETE_RESOURCE_JOB,
+            job_group="delete",
+            payload={"resource_id": resource_id},
+            dedup_key=f"{self.DELETE_RESOURCE_JOB}:{resource_id}",
+            serial_key=self._serial_key(resource_id),
+            # The resource and its metadata are gone, its vectors would never be deleted if the job was rejected
+            uncapped=True
+        )
+
+    def _run_delete_job(self, payload: dict):
+        # The index job that was running when the resource was deleted may have saved metadata since then
+        self.metadata_service.delete_docs_by_resource_id(payload["resource_id"])
+        self.vectorstore_service.delete_docs_by_source_id(payload["resource_id"])
+        if self.git_mirrors_dir is not None:
+            # Only GitHub resources have a mirror, deleting a missing one is a no-op
+            self._git_mirror(payload["resource_id"], clone_url="", branch=None).delete()
+
+    def _invalidate_answers(self, project_id: str):
+        if self.answer_cache_service is not None:
+            self.answer_cache_service.invalidate_project(project_id)
+
     def delete_resource(self, resource_id: str):
+        """
+        Remove the resource and its metadata right away and delete its vectors in a background job, which runs after
+        the index job of the resource, if one is running.
+        """
         resource = self.resource_dao.get_by_id(resource_id)
-        ids = self.metadata_service.get_docs_ids_by_source_id(resource_id)
         if resource:
-            self.vectorstore_service.delete_docs(ids)
+            # A pending index job would run before the delete job, and index the resource again if it is submitted
+            # again in the meantime
+            self.job_service.cancel(f"{self.INDEX_RESOURCE_JOB}:{resource_id}")
+            self.job_service.cancel(f"{self.SCOPE_RESOURCE_JOB}:{resource_id}")
+            self.job_service.cancel(f"{self.LEXICAL_INDEX_RESOURCE_JOB}:{resource_id}")
+            self._submit_delete_job(resource_id)
+            self._invalidate_answers(resource.project_id)
         self.metadata_service.delete_docs_by_resource_id(resource_id)
         self.resource_dao.delete_resource(resource_id)
 
@@ -17,36 +17,131 @@ from uuid import UUID
 
 from langchain.schema import Document
 from langchain.vectorstores import VectorStore
+from structlog import getLogger
 
-from core.docs.document_loader import generate_uuid
+from core.dao.lexical_index_dao import LexicalIndexDao
+from core.llm.vectorstores import PROJECT_ID
 from core.utils.utils import create_dict_from_keys_and_values
 from core.utils.utils import identify_changed_files
 
 
 class VectorStoreService:
-    def __init__(self, weaviate: VectorStore, weaviate_client, embedder, index_name, text_key):
+    # Number of ids sent in a single batch delete request
+    DELETE_BATCH_SIZE = 500
+
+    def __init__(self, weaviate: VectorStore, weaviate_client, embedder, index_name, text_key,
+                 lexical_index: Optional[LexicalIndexDao] = None):
         self.weaviate = weaviate
+        self.lexical_index = lexical_index
         self.embedder = embedder
         self.weaviate_client = weaviate_client
         self.index_name = index_name
         self.text_key = text_key
-
-    def delete_docs(self, ids: List[UUID]):
-        # TODO: use batch operations like delete_objects if possible!
-        # self.weaviate_client.batch.delete_objects('Zio', where=???)
-        for id in ids:
-            if self.weaviate_client.data_object.exists(id, class_name=self.index_name):
-                self.weaviate_client.data_object.delete(id, class_name=self.index_name)
-
-    def index_docs(self, uuids: List[UUID], docs: List[Document]):
-        # self.weaviate_client.schema.add_class_tenants(class_name=self.index_name, tenants=[Tenant(tenant)])
-        self.weaviate.from_documents(
-            documents=docs,
-            embedding=self.embedder,
-            index_name=self.index_name,
-            text_key=self.text_key,
+        self.class_exists = False
+        self.log = getLogger(name=self.__class__.__name__)
+
+    def _delete_objects(self, where: dict) -> int:
+        """
+        Delete all objects matching the where filter and return the number of deleted objects.
+
+        A single batch delete request removes at most QUERY_MAXIMUM_RESULTS objects, so it is repeated until nothing
+        matches the filter anymore.
+        """
+        if self.weaviate_client is None:
+            # The in-memory vector store of the benchmark mode
+            return self.weaviate.delete_where(where)
+        if not self.weaviate_client.schema.exists(self.index_name):
+            return 0
+        deleted = 0
+        while True:
+            results = self.weaviate_client.batch.delete_objects(class_name=self.index_name, where=where)['results']
+            deleted += results['successful']
+            self.log.info(f"Deleted {deleted} objects, {results['matches'] - results['successful']} remaining")
+            if results['failed'] > 0:
+                self.log.warning(f"Failed to delete {results['failed']} objects", where=where)
+            if results['successful'] == 0 or results['matches'] <= results['limit']:
+                return deleted
+
+    def delete_docs(self, ids: List[UUID]) -> int:
+        if self.lexical_index is not None:
+            self.lexical_index.delete_docs(ids)
+        deleted = 0
+        for start in range(0, len(ids), self.DELETE_BATCH_SIZE):
+            chunk = [str(id) for id in ids[start:start + self.DELETE_BATCH_SIZE]]
+            deleted += self._delete_objects({"path": ["id"], "operator": "ContainsAny", "valueTextArray": chunk})
+        return deleted
+
+    def delete_docs_by_source_id(self, doc_source_id: str) -> int:
+        if self.lexical_index is not None:
+            self.lexical_index.delete_docs_by_source_id(doc_source_id)
+        deleted = self._delete_objects({"path": ["doc_source_id"], "operator": "Equal", "valueText": doc_source_id})
+        self.log.info(f"Deleted {deleted} docs of source {doc_source_id}")
+        return deleted
+
+    # Project ids are compared as a whole, and are filtered on by every chat query
+    PROJECT_ID_PROPERTY = {"name": PROJECT_ID, "dataType": ["text"], "tokenization": "field", "indexFilterable": True}
+
+    def _create_class_if_not_exists(self):
+        if self.class_exists or self.weaviate_client is None:
+            return
+        if not self.weaviate_client.schema.exists(self.index_name):
+            self.weaviate_client.schema.create_class({
+                "class": self.index_name,
+                "properties": [{"name": self.text_key, "dataType": ["text"]}, self.PROJECT_ID_PROPERTY],
+            })
+        else:
+            properties = self.weaviate_client.schema.get(self.index_name).get("properties") or []
+            if all(p["name"] != PROJECT_ID for p in properties):
+                self.weaviate_client.schema.property.create(self.index_name, self.PROJECT_ID_PROPERTY)
+        self.class_exists = True
+
+    def index_docs(self, uuids: List[UUID], docs: List[Document], project_id: Optional[str] = None):
+        """
+        Index chunks in the vector store and in the lexical index. Chunks indexed with a `project_id` are only
+        retrieved by the chats of that project.
+        """
+        if len(docs) == 0:
+            return
+        if project_id is not None:
+            for doc in docs:
+                doc.metadata[PROJECT_ID] = project_id
+        self._create_class_if_not_exists()
+        self.weaviate.add_texts(
+            texts=[doc.page_content for doc in docs],
+            metadatas=[doc.metadata for doc in docs],
             uuids=uuids,
         )
+        if self.lexical_index is not None:
+            self.lexical_index.add_docs(uuids, docs)
+
+    def set_project_id(self, uuids: List[UUID], doc_source_id: str, project_id: str) -> int:
+        """
+        Scope chunks indexed before chunks were scoped to their project, without embedding them again.
+        """
+        self._create_class_if_not_exists()
+        updated = self.weaviate.update_metadata(uuids, {PROJECT_ID: project_id})
+        if self.lexical_index is not None:
+            self.lexical_index.set_project_id(doc_source_id, project_id)
+        return updated
+
+    def lexical_index_counts(self) -> Dict[str, int]:
+        """The number of chunks of each source in the lexical index, empty without a lexical index."""
+        return self.lexical_index.count_docs_by_source_id() if self.lexical_index is not None else {}
+
+    def index_missing_lexical_docs(self, uuids: List[UUID], doc_source_id: str, project_id: str) -> int:
+        """
+        Add the chunks indexed before the lexical index existed to it, reading their text back from the vector store
+        instead of loading their source again.
+        """
+        if self.lexical_index is None:
+            return 0
+        indexed = self.lexical_index.get_docs_ids_by_source_id(doc_source_id)
+        missing = [uuid for uuid in uuids if uuid not in indexed]
+        documents = self.weaviate.get_documents(missing)
+        for _, document in documents:
+            document.metadata[PROJECT_ID] = project_id
+        self.lexical_index.add_docs([uuid for uuid, _ in documents], [document for _, document in documents])
+        return len(documents)
 
     @staticmethod
     def map_metadata_to_paths(metadata: List[Dict[any, any]]) -> List[str]:
@@ -59,9 +154,6 @@ class VectorStoreService:
     def upsert_docs(self, ids: List[UUID], docs: List[Document], old_metadata_list: List[Dict[any, any]]):
         assert (len(ids) == len(docs))
 
-        doc_source_type = docs[0].metadata['doc_source_type']
-        doc_source_id = docs[0].metadata['doc_source_id']
-
         metadata_list: list[dict] = [d.metadata for d in docs]
         new_paths: List[str] = self.map_metadata_to_paths(metadata_list)
         new_hashes: List[str] = self.map_metadata_to_hashes(metadata_list)
@@ -72,6 +164,8 @@ class VectorStoreService:
         old_paths: List[str] = self.map_metadata_to_paths(old_metadata_list)
         old_hashes: List[str] = self.map_metadata_to_hashes(old_metadata_list)
         old_file_path_to_hash: Dict[str, List[str]] = create_dict_from_keys_and_values(old_paths, old_hashes)
+        old_file_path_to_ids: Dict[str, List[str]] = create_dict_from_keys_and_values(
+            old_paths, [m['doc_uuid'] for m in old_metadata_list])
 
         changed_files_paths: List[str] = identify_changed_files(
             old_file_path_to_hash,
@@ -95,11 +189,10 @@ class VectorStoreService:
         )
         removed_docs_ids: List[UUID] = []
         for file_path in removed_files:
-            if file_path in old_file_path_to_hash:
-                for h in old_file_path_to_hash[file_path]:
-                    removed_docs_ids.append(
-                        generate_uuid(doc_source_type, doc_source_type, doc_source_id, file_path, h)
-                    )
+            # The stored ids are removed as they are, they were generated in the namespace of the loader
+            if file_path in old_file_path_to_ids:
+                for doc_uuid in old_file_path_to_ids[file_path]:
+                    removed_docs_ids.append(UUID(doc_uuid))
 
         if len(removed_docs_ids) != 0:
             self.delete_docs(removed_docs_ids)
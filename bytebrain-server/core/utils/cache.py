@@ -0,0 +1,84 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Tuple, TypeVar
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+_MISSING = object()
+
+
+class TTLCache(Generic[K, V]):
+    """
+    A thread-safe in-process cache whose entries expire `ttl` seconds after they were stored.
+
+    When `max_size` entries are stored, the least recently used one is evicted. `None` is a valid value, so a lookup
+    that found nothing can be cached as well.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries: OrderedDict[K, Tuple[float, V]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: K, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: K, value: V):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def get_or_load(self, key: K, load: Callable[[K], V]) -> V:
+        """
+        Return the cached value of the key, or load, store and return it. Concurrent misses of the same key may
+        load it more than once.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = load(key)
+            self.put(key, value)
+        return value
+
+    def invalidate(self, key: K):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[K, V], bool]):
+        with self.lock:
+            for key in [key for key, (_, value) in self.entries.items() if predicate(key, value)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,86 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+# Registry exported by the `/metrics` endpoint of the web service. Modules outside the web routers (e.g. the chains
+# shared with the Discord bot) register their metrics here as well.
+registry = CollectorRegistry()
+
+condense_path_counter = Counter("condense_path_total",
+                                "Questions by the way their standalone question was obtained",
+                                labelnames=["path"], registry=registry)
+speculative_retrieval_counter = Counter("speculative_retrieval_total",
+                                        "Speculative retrievals on the raw question by whether their result was used",
+                                        labelnames=["outcome"], registry=registry)
+
+chat_stage_latency_histogram = Histogram("chat_stage_latency_seconds",
+                                         "Latency of the stages of answering a chat question (seconds)",
+                                         labelnames=["project", "path", "stage"], registry=registry)
+chat_question_latency_histogram = Histogram("chat_question_latency_seconds",
+                                            "Latency of answering a chat question, from receiving it until the last "
+                                            "token was sent (seconds)",
+                                            labelnames=["project", "path"], registry=registry)
+chat_time_to_first_token_histogram = Histogram("chat_time_to_first_token_seconds",
+                                               "Time from receiving a chat question until the first answer token "
+                                               "(seconds)",
+                                               labelnames=["project", "path"], registry=registry)
+chat_tokens_per_second_histogram = Histogram("chat_tokens_per_second",
+                                             "Rate at which the answer tokens of a chat question were streamed",
+                                             labelnames=["project", "path"], registry=registry,
+                                             buckets=(1, 2.5, 5, 10, 20, 30, 50, 75, 100, 150, 200, float("inf")))
+apikey_check_latency_histogram = Histogram("apikey_check_latency_seconds",
+                                           "Latency of checking the apikey and domain of a chat connection (seconds)",
+                                           labelnames=["project"], registry=registry)
+
+admission_queue_depth_gauge = Gauge("admission_queue_depth", "Questions waiting to be admitted for answering",
+                                    registry=registry)
+admission_running_gauge = Gauge("admission_running", "Questions being answered", registry=registry)
+admission_wait_histogram = Histogram("admission_wait_seconds",
+                                     "Time questions waited before they were admitted for answering (seconds)",
+                                     registry=registry)
+admission_rejected_counter = Counter("admission_rejected_total",
+                                     "Questions rejected because the server was busy, by the cause of the rejection",
+                                     labelnames=["reason"], registry=registry)
+
+single_flight_counter = Counter("single_flight_total",
+                                "Coalescable questions by whether they started an answer (leader) or shared the "
+                                "answer of an identical question in flight (follower)",
+                                labelnames=["role"], registry=registry)
+chat_context_tokens_histogram = Histogram("chat_context_tokens",
+                                          "Tokens of retrieved documents stuffed into the prompt of a chat question",
+                                          labelnames=["project", "path"], registry=registry,
+                                          buckets=(0, 250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, float("inf")))
+query_embedding_cache_counter = Counter("query_embedding_cache_total",
+                                        "Query embeddings by whether they were found in memory, on disk, or requested "
+                                        "from the embedding API (miss)",
+                                        labelnames=["result"], registry=registry)
+query_embedding_saved_seconds_counter = Counter("query_embedding_saved_seconds",
+                                                "Estimated embedding API latency saved by query embedding cache hits, "
+                                                "at the moving average latency of the misses",
+                                                registry=registry)
+indexed_chunks_counter = Counter("indexed_chunks_total",
+                                 "Chunks of indexed resources by whether they were (re-)indexed, skipped as unchanged "
+                                 "since the last indexing of their resource, or deleted as vanished",
+                                 labelnames=["resource_type", "outcome"], registry=registry)
+crawled_pages_counter = Counter("crawled_pages_total",
+                                "Pages requested by the crawler, by whether they were downloaded or not modified since "
+                                "their cached response",
+                                labelnames=["result"], registry=registry)
+git_update_stage_histogram = Histogram("git_update_stage_seconds",
+                                       "Duration of the stages of indexing a GitHub resource from its mirror: fetching "
+                                       "the new commits, diffing them, loading the changed files and indexing them "
+                                       "(seconds)",
+                                       labelnames=["stage"], registry=registry,
+                                       buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, float("inf")))
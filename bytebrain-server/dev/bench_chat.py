@@ -0,0 +1,110 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import dataclasses
+import json
+import os
+import socket
+import threading
+import time
+from typing import List, Tuple
+
+# The webservice reads these when it is imported
+os.environ["APP_ENV"] = "benchmark"
+os.environ.setdefault("AUTH_SECRET_KEY", "benchmark")
+
+import numpy as np
+import uvicorn
+import websockets
+
+from core.bots.web.dependencies import container
+from core.bots.web.webservice import app
+from core.utils.metrics import registry
+
+SESSIONS = 32  # concurrent websocket connections
+QUESTIONS = 3  # questions asked one after another on each connection
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int) -> Tuple[uvicorn.Server, threading.Thread]:
+    # All the sessions ask questions of the benchmark project, admit them all at once so the measured time to first
+    # token is the one of the pipeline rather than the wait for a slot of the project
+    admission = dataclasses.replace(container.config.admission, max_running=max(container.config.admission.max_running,
+                                                                                SESSIONS),
+                                    max_running_per_project=SESSIONS)
+    container.config = dataclasses.replace(container.config, admission=admission)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+async def session(url: str, session_id: int, time_to_first_token: List[float], tokens: List[int]):
+    async with websockets.connect(url) as websocket:
+        history = []
+        for i in range(QUESTIONS):
+            question = f"How do I retry effect {session_id} with schedule {i}?"
+            start_time = time.perf_counter()
+            await websocket.send(json.dumps({"question": question, "history": history}))
+            first_token = True
+            answer = ""
+            while True:
+                frame = json.loads(await websocket.recv())
+                if frame.get("token") and first_token:
+                    time_to_first_token.append(time.perf_counter() - start_time)
+                    first_token = False
+                answer += frame.get("token", "")
+                if frame.get("completed") or "error" in frame:
+                    break
+            tokens.append(len(answer.split()))
+            history += [question, answer]
+
+
+async def load(url: str):
+    time_to_first_token: List[float] = []
+    tokens: List[int] = []
+    start_time = time.perf_counter()
+    await asyncio.gather(*[session(url, i, time_to_first_token, tokens) for i in range(SESSIONS)])
+    duration = time.perf_counter() - start_time
+
+    p50, p95, p99 = np.percentile(time_to_first_token, [50, 95, 99])
+    admitted = registry.get_sample_value("admission_wait_seconds_count") or 0
+    admission_wait = (registry.get_sample_value("admission_wait_seconds_sum") or 0) / max(admitted, 1)
+    print(f"{SESSIONS} sessions x {QUESTIONS} questions in {duration:.1f}s")
+    print(f"time to first token: p50 {p50 * 1e3:.0f} ms, p95 {p95 * 1e3:.0f} ms, p99 {p99 * 1e3:.0f} ms, "
+          f"of which {admission_wait * 1e3:.0f} ms waiting for admission on average")
+    print(f"throughput: {len(tokens) / duration:.1f} answers/s, {sum(tokens) / duration:,.0f} tokens/s")
+
+
+def run():
+    port = free_port()
+    server, thread = start_server(port)
+    try:
+        asyncio.run(load(f"ws://127.0.0.1:{port}/chat/{container.benchmark_apikey}"))
+    finally:
+        # The shutdown stops the container, which removes the databases of the benchmark mode
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,89 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from core.dao.resource_dao import ResourceDao, ResourceState, ResourceType
+
+DURATION = 2  # seconds per scenario
+
+
+def connect_per_call_get_by_id(db_path: str, resource_id: str):
+    # The access pattern every DAO method used before the connection pool
+    with sqlite3.connect(db_path) as connection:
+        cursor = connection.cursor()
+        cursor.execute('SELECT * FROM resources WHERE id = ?', (resource_id,))
+        return cursor.fetchone()
+
+
+def connect_per_call_set_state(db_path: str, resource_id: str):
+    with sqlite3.connect(db_path) as connection:
+        cursor = connection.cursor()
+        cursor.execute('''
+            UPDATE resources
+            SET status = ?,
+                last_updated_at = (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'))
+            WHERE id = ?
+        ''', (ResourceState.Indexing.value, resource_id))
+        connection.commit()
+
+
+def bench(name: str, operation, background_writer=None):
+    stop = threading.Event()
+    writer = None
+    if background_writer is not None:
+        def write():
+            while not stop.is_set():
+                background_writer()
+
+        writer = threading.Thread(target=write, daemon=True)
+        writer.start()
+
+    operations = 0
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < DURATION:
+        operation()
+        operations += 1
+    duration = time.perf_counter() - start_time
+
+    stop.set()
+    if writer is not None:
+        writer.join()
+    print(f"{name}: {operations / duration:,.0f} ops/s")
+
+
+def run():
+    with tempfile.TemporaryDirectory() as db_dir:
+        db_path = os.path.join(db_dir, "resources.db")
+        resource_dao = ResourceDao(db_path)
+        resource_dao.add_resource("resource", "docs", ResourceType.Website, "project", {"url": "https://zio.dev"})
+
+        bench("connect per call, get_by_id", lambda: connect_per_call_get_by_id(db_path, "resource"))
+        bench("pooled, get_by_id", lambda: resource_dao.get_by_id("resource"))
+        bench("connect per call, set_state", lambda: connect_per_call_set_state(db_path, "resource"))
+        bench("pooled, set_state", lambda: resource_dao.set_state("resource", ResourceState.Indexing))
+        bench("connect per call, get_by_id during writes",
+              lambda: connect_per_call_get_by_id(db_path, "resource"),
+              background_writer=lambda: connect_per_call_set_state(db_path, "resource"))
+        bench("pooled, get_by_id during writes",
+              lambda: resource_dao.get_by_id("resource"),
+              background_writer=lambda: resource_dao.set_state("resource", ResourceState.Indexing))
+
+
+if __name__ == "__main__":
+    run()
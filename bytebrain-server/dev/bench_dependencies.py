@@ -0,0 +1,80 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import threading
+import time
+from typing import Annotated, Callable
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from config import load_config, ByteBrainConfig
+from core.dao.apikey_dao import ApiKeyDao
+from core.dao.job_dao import JobDao
+from core.dao.metadata_dao import MetadataDao
+from core.dao.project_dao import ProjectDao
+from core.dao.resource_dao import ResourceDao
+from core.services.job_service import JobService
+from core.services.project_service import ProjectService
+from core.services.resource_service import ResourceService
+
+REQUESTS = 500
+
+
+def per_request_services(db_dir: str, job_service: JobService, config: ByteBrainConfig) -> ProjectService:
+    # This is what every request depending on `project_service` used to build, including the recovery thread
+    # that ResourceService used to start in its constructor.
+    resource_dao = ResourceDao(os.path.join(db_dir, "resources.db"))
+    metadata_dao = MetadataDao(os.path.join(db_dir, "metadata_docs.db"))
+    resource_service = ResourceService(resource_dao, None, metadata_dao, job_service, config.ingestion)
+    threading.Thread(target=resource_service._index_resources,
+                     kwargs={"pending_resources": resource_dao.get_unfinished_resources()}, daemon=True).start()
+    project_dao = ProjectDao(os.path.join(db_dir, "projects.db"))
+    apikey_dao = ApiKeyDao(os.path.join(db_dir, "projects.db"))
+    return ProjectService(project_dao, resource_service, apikey_dao)
+
+
+def bench(name: str, project_service: Callable[[], ProjectService]):
+    # Resolve the dependency the way FastAPI does for the routers, through a request to an endpoint depending on it
+    app = FastAPI()
+
+    @app.get("/projects/count")
+    def count_projects(service: Annotated[ProjectService, Depends(project_service)]):
+        return {"count": service.project_dao.get_all_projects_count()}
+
+    client = TestClient(app)
+    client.get("/projects/count")
+    threads_before = threading.active_count()
+    start_time = time.perf_counter()
+    for _ in range(REQUESTS):
+        client.get("/projects/count").raise_for_status()
+    duration = time.perf_counter() - start_time
+    print(f"{name}: {duration / REQUESTS * 1e6:.1f} us/request, "
+          f"{threading.active_count() - threads_before} extra threads alive")
+
+
+def run():
+    with tempfile.TemporaryDirectory() as db_dir:
+        config = load_config()
+        job_service = JobService(JobDao(os.path.join(db_dir, "background_jobs.db")), config.jobs)
+        bench("per-request construction", lambda: per_request_services(db_dir, job_service, config))
+
+        singleton = per_request_services(db_dir, job_service, config)
+        bench("application-lifespan container", lambda: singleton)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,93 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import functools
+import os
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from core.dao.http_cache_dao import HttpCacheDao
+from core.docs.document_loader import lazy_load_docs_from_site
+from core.docs.http_cache import PAGE_HASH, is_unchanged_page
+from core.llm.fakes import generate_text
+
+PAGES = 300
+PAGE_WORDS = 1500
+CHANGED_PAGES = 15
+
+
+class CountingHandler(SimpleHTTPRequestHandler):
+    sent_bytes = 0
+
+    def send_header(self, keyword, value):
+        if keyword == "Content-Length":
+            CountingHandler.sent_bytes += int(value)
+        super().send_header(keyword, value)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write_page(site_dir: str, i: int, version: int = 0):
+    # The first page is the index of the site, linking to all the others
+    links = "".join(f'<a href="page-{j}.html">Page {j}</a>' for j in range(1, PAGES)) if i == 0 else ""
+    path = os.path.join(site_dir, "index.html" if i == 0 else f"page-{i}.html")
+    with open(path, "w") as file:
+        file.write(f"<html><head><title>Page {i}</title></head><body><h1>Page {i}</h1>"
+                   f"<p>{generate_text(f'{i}-{version}', PAGE_WORDS)}</p>{links}</body></html>")
+    if version:
+        # Last-Modified has a resolution of a second
+        mtime = os.stat(path).st_mtime + 10
+        os.utime(path, (mtime, mtime))
+
+
+def crawl(name: str, url: str, http_cache: HttpCacheDao, indexed_pages: dict) -> dict:
+    CountingHandler.sent_bytes = 0
+    start_time = time.perf_counter()
+    docs = list(lazy_load_docs_from_site(doc_source_id="bench", doc_source_type="website", http_cache=http_cache,
+                                         indexed_pages=indexed_pages, url=url))
+    duration = time.perf_counter() - start_time
+    chunks = [doc for doc in docs if not is_unchanged_page(doc)]
+    print(f"{name}: {duration:.2f} s, {CountingHandler.sent_bytes / 2 ** 20:.1f} MB downloaded, "
+          f"{len(docs) - len(chunks)} unchanged pages, {len(chunks)} chunks to embed")
+    return {**indexed_pages, **{doc.metadata["doc_url"]: doc.metadata[PAGE_HASH] for doc in chunks}}
+
+
+def run():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        site_dir = os.path.join(temp_dir, "site")
+        os.mkdir(site_dir)
+        for i in range(PAGES):
+            write_page(site_dir, i)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(CountingHandler, directory=site_dir))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        http_cache = HttpCacheDao(os.path.join(temp_dir, "http_cache.db"), max_size=256 * 2 ** 20)
+
+        print(f"Crawl of a {PAGES} pages site")
+        indexed_pages = crawl("first crawl", url, http_cache, {})
+        crawl("unconditional re-crawl", url, None, {})
+        crawl("conditional re-crawl", url, http_cache, indexed_pages)
+        for i in range(1, PAGES, PAGES // CHANGED_PAGES):
+            write_page(site_dir, i, version=1)
+        crawl(f"conditional re-crawl, {CHANGED_PAGES} changed pages", url, http_cache, indexed_pages)
+        print(f"HTTP cache size: {http_cache.size() / 2 ** 20:.1f} MB")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    run()
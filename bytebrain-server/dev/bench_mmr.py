@@ -0,0 +1,63 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+import numpy as np
+from langchain.vectorstores.utils import maximal_marginal_relevance as langchain_maximal_marginal_relevance
+
+from core.llm.chains import ChainSettings
+from core.llm.retrievers import maximal_marginal_relevance
+
+DIMENSIONS = 1536  # text-embedding-ada-002
+FETCH_KS = [30, 100, 300]
+PAGES = 10  # candidates are overlapping chunks of a few pages
+LAMBDA_MULT = 0.7
+REPETITIONS = 20
+
+
+def candidates(fetch_k: int, rng: np.random.Generator):
+    # All chunks share the topic of the project, chunks of a page share its topic, and the question is about one page
+    # but related to the others
+    topic = rng.normal(size=DIMENSIONS)
+    pages = topic + rng.normal(size=(PAGES, DIMENSIONS))
+    chunk_pages = np.sort(rng.integers(PAGES, size=fetch_k))
+    embeddings = pages[chunk_pages] + 0.5 * rng.normal(size=(fetch_k, DIMENSIONS))
+    query = pages[0] + rng.normal(size=(PAGES, DIMENSIONS)).mean(axis=0) + pages.mean(axis=0)
+    return query.astype(np.float32), embeddings.astype(np.float32), chunk_pages
+
+
+def bench(name: str, rerank, query: np.ndarray, embeddings: np.ndarray, chunk_pages: np.ndarray, k: int):
+    start_time = time.perf_counter()
+    for _ in range(REPETITIONS):
+        selected = rerank(query, embeddings, k)
+    duration = (time.perf_counter() - start_time) / REPETITIONS
+    print(f"  {name}: {duration * 1e3:.2f} ms, selected chunks of {len(set(chunk_pages[selected]))} pages")
+
+
+def run():
+    rng = np.random.default_rng(0)
+    k = 2 * ChainSettings().k
+    for fetch_k in FETCH_KS:
+        query, embeddings, chunk_pages = candidates(fetch_k, rng)
+        print(f"fetch_k={fetch_k}, selecting {k} candidates of {DIMENSIONS} dimensions")
+        bench("top k by similarity", lambda q, e, k: list(np.argsort(-(e @ q))[:k]), query, embeddings, chunk_pages, k)
+        bench("langchain MMR", lambda q, e, k: langchain_maximal_marginal_relevance(q, list(e), LAMBDA_MULT, k),
+              query, embeddings, chunk_pages, k)
+        bench("vectorized MMR", lambda q, e, k: maximal_marginal_relevance(q, e, k, LAMBDA_MULT),
+              query, embeddings, chunk_pages, k)
+
+
+if __name__ == "__main__":
+    run()
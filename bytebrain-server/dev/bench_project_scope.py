@@ -0,0 +1,111 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import time
+import uuid
+
+import numpy as np
+from langchain.schema import Document
+
+from config import load_config
+from core.dao.lexical_index_dao import LexicalIndexDao
+from core.llm.fakes import generate_text
+from core.llm.vectorstores import project_filter
+from core.services.vectorstore_service import VectorStoreService
+
+PROJECTS = [1, 10, 100]
+CHUNKS_PER_PROJECT = 200
+QUERIES = 200
+QUERY = "How do I retry a fiber with a schedule and a timeout?"
+K = 10
+DIMENSIONS = 1536
+WEAVIATE_CLASS = "BenchProjectScope"
+
+
+def lexical_index_latency(lexical_index: LexicalIndexDao, project_id) -> float:
+    start_time = time.perf_counter()
+    for _ in range(QUERIES):
+        lexical_index.search(QUERY, K, project_id)
+    return (time.perf_counter() - start_time) / QUERIES
+
+
+def bench_lexical_index():
+    print(f"Lexical index, {CHUNKS_PER_PROJECT} chunks per project")
+    with tempfile.TemporaryDirectory() as db_dir:
+        lexical_index = LexicalIndexDao(os.path.join(db_dir, "lexical_index.db"))
+        projects = 0
+        for total_projects in PROJECTS:
+            while projects < total_projects:
+                docs = [Document(page_content=generate_text(f"{projects}-{i}", 150),
+                                 metadata={"project_id": f"project-{projects}"}) for i in range(CHUNKS_PER_PROJECT)]
+                lexical_index.add_docs([uuid.uuid4() for _ in docs], docs)
+                projects += 1
+            print(f"  {total_projects} projects: {lexical_index_latency(lexical_index, 'project-0') * 1e3:.2f} ms "
+                  f"per search")
+
+
+def weaviate_latency(client, where_filter, rng: np.random.Generator) -> float:
+    start_time = time.perf_counter()
+    for _ in range(QUERIES):
+        query = client.query.get(WEAVIATE_CLASS, ["text"]).with_near_vector({"vector": rng.normal(size=DIMENSIONS)})
+        if where_filter is not None:
+            query = query.with_where(where_filter)
+        query.with_limit(K).do()
+    return (time.perf_counter() - start_time) / QUERIES
+
+
+def bench_weaviate():
+    from weaviate import Client
+    url = load_config().weaviate_url
+    try:
+        client = Client(url=url, startup_period=None)
+        if not client.is_ready():
+            raise ConnectionError(url)
+    except Exception:
+        print(f"Weaviate: skipped, no server at {url}")
+        return
+
+    print(f"Weaviate, {CHUNKS_PER_PROJECT} chunks per project")
+    rng = np.random.default_rng(0)
+    if client.schema.exists(WEAVIATE_CLASS):
+        client.schema.delete_class(WEAVIATE_CLASS)
+    client.schema.create_class({"class": WEAVIATE_CLASS, "vectorizer": "none",
+                                "properties": [{"name": "text", "dataType": ["text"]},
+                                               VectorStoreService.PROJECT_ID_PROPERTY]})
+    try:
+        projects = 0
+        for total_projects in PROJECTS:
+            with client.batch as batch:
+                while projects < total_projects:
+                    for i in range(CHUNKS_PER_PROJECT):
+                        batch.add_data_object({"text": f"{projects}-{i}", "project_id": f"project-{projects}"},
+                                              WEAVIATE_CLASS, vector=rng.normal(size=DIMENSIONS))
+                    projects += 1
+            scoped = weaviate_latency(client, project_filter("project-0"), rng)
+            unscoped = weaviate_latency(client, None, rng)
+            print(f"  {total_projects} projects: {scoped * 1e3:.2f} ms scoped to a project, "
+                  f"{unscoped * 1e3:.2f} ms unscoped")
+    finally:
+        client.schema.delete_class(WEAVIATE_CLASS)
+
+
+def run():
+    bench_lexical_index()
+    bench_weaviate()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,102 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+import time
+
+from git import Actor, Repo
+from langchain.document_loaders import GitLoader
+from wcmatch import glob
+
+from core.docs.document_loader import load_sourcecode_files
+from core.docs.git_mirror import GitMirror
+from core.llm.fakes import generate_text
+
+PATHS = "docs/**/*.md"
+DOCS = 100
+SOURCE_FILES = 1000
+ASSETS = 60
+ASSET_SIZE = 512 * 1024
+COMMITS = 3
+
+AUTHOR = Actor("Bench", "bench@example.com")
+
+
+def write(path: str, content: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(content)
+
+
+def create_monorepo(temp_dir: str) -> str:
+    # A repository whose indexed docs are a small part of its content and history, next to code and binary assets
+    # which are rewritten by every commit
+    work = Repo.init(os.path.join(temp_dir, "work"), initial_branch="main")
+    for i in range(DOCS):
+        write(os.path.join(work.working_dir, f"docs/section-{i % 10}/page-{i}.md"),
+              f"# Page {i}\n\n{generate_text(str(i), 300)}".encode())
+    for i in range(SOURCE_FILES):
+        write(os.path.join(work.working_dir, f"modules/module-{i % 20}/File{i}.scala"),
+              f"object File{i} {{ /* {generate_text(str(i), 200)} */ }}".encode())
+    for commit in range(COMMITS):
+        for i in range(ASSETS):
+            write(os.path.join(work.working_dir, f"assets/asset-{i}.bin"), os.urandom(ASSET_SIZE))
+        work.git.add("--all")
+        work.index.commit(f"Commit {commit}", author=AUTHOR, committer=AUTHOR)
+
+    bare_path = os.path.join(temp_dir, "origin.git")
+    Repo.clone_from(work.working_dir, bare_path, bare=True).git.config("uploadpack.allowFilter", "true")
+    return "file://" + bare_path
+
+
+def disk_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def full_clone(clone_url: str, repo_path: str) -> int:
+    loader = GitLoader(repo_path=repo_path, clone_url=clone_url, branch="main",
+                       file_filter=lambda file_path: glob.globmatch(file_path, os.path.join(repo_path, PATHS),
+                                                                    flags=glob.GLOBSTAR))
+    return len(loader.load())
+
+
+def partial_sparse_clone(clone_url: str, repo_path: str) -> int:
+    mirror = GitMirror(repo_path, clone_url, branch="main", paths=PATHS)
+    mirror.sync()
+    ids, docs = load_sourcecode_files(repo_path=repo_path, files=mirror.tracked_files(), doc_source_id="bench",
+                                      doc_source_type="github", language="markdown", paths=PATHS)
+    return len({doc.metadata["doc_path"] for doc in docs})
+
+
+def bench(name: str, load, clone_url: str, temp_dir: str):
+    repo_path = os.path.join(temp_dir, name.replace(" ", "-"))
+    start_time = time.perf_counter()
+    files = load(clone_url, repo_path)
+    duration = time.perf_counter() - start_time
+    print(f"{name}: {duration:.2f} s, {disk_size(repo_path) / 2 ** 20:.1f} MB on disk, {files} files loaded")
+
+
+def run():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        clone_url = create_monorepo(temp_dir)
+        print(f"Loading {PATHS} of a repository of {DOCS} docs, {SOURCE_FILES} source files and {ASSETS} assets "
+              f"rewritten by {COMMITS} commits")
+        bench("full clone", full_clone, clone_url, temp_dir)
+        bench("partial sparse clone", partial_sparse_clone, clone_url, temp_dir)
+
+
+if __name__ == "__main__":
+    run()
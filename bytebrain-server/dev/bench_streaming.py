@@ -0,0 +1,79 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+
+from starlette.websockets import WebSocket
+
+from core.llm.callbacks import StreamingLLMCallbackHandler
+
+SESSIONS = 200
+TOKENS = 400  # tokens per answer
+TOKEN_INTERVAL = 0.002  # seconds between two tokens of a session, i.e. a fast LLM
+TOKEN = " fiber"
+
+
+async def connected_websocket() -> WebSocket:
+    # A real starlette WebSocket, so every frame pays for the same JSON encoding and ASGI message as in the server
+    async def receive():
+        return {"type": "websocket.connect"}
+
+    async def send(message):
+        pass
+
+    websocket = WebSocket({"type": "websocket", "path": "/chat", "headers": []}, receive, send)
+    await websocket.accept()
+    return websocket
+
+
+class CountingWebSocket:
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.frames = 0
+
+    async def send_json(self, data):
+        self.frames += 1
+        await self.websocket.send_json(data)
+
+
+async def session(flush_interval: float, flush_chars: int) -> int:
+    websocket = CountingWebSocket(await connected_websocket())
+    handler = StreamingLLMCallbackHandler(websocket, flush_interval=flush_interval, flush_chars=flush_chars)
+    for _ in range(TOKENS):
+        await handler.on_llm_new_token(TOKEN)
+        await asyncio.sleep(TOKEN_INTERVAL)
+    await handler.flush()
+    return websocket.frames
+
+
+async def bench(name: str, flush_interval: float = 0.0, flush_chars: int = 0):
+    start_time = time.perf_counter()
+    start_cpu_time = time.process_time()
+    frames = sum(await asyncio.gather(*[session(flush_interval, flush_chars) for _ in range(SESSIONS)]))
+    cpu_time = time.process_time() - start_cpu_time
+    duration = time.perf_counter() - start_time
+    print(f"{name}: {frames / duration:,.0f} frames/s, {frames / SESSIONS:.0f} frames/session, "
+          f"{cpu_time / SESSIONS * 1e3:.2f} ms CPU/session")
+
+
+def run():
+    print(f"{SESSIONS} concurrent sessions streaming {TOKENS} tokens each")
+    asyncio.run(bench("frame per token"))
+    asyncio.run(bench("coalesced, 50 ms or 256 chars", flush_interval=0.05, flush_chars=256))
+    asyncio.run(bench("coalesced, 20 ms or 64 chars", flush_interval=0.02, flush_chars=64))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,69 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import time
+from typing import List
+
+from langchain.schema import Document
+
+from core.docs.document_loader import _add_website_metadata, _transform_website_pages
+from core.docs.pipeline import batched, get_process_pool, ordered_map
+from core.llm.fakes import generate_text
+
+PAGES = 400
+PARAGRAPHS = 40
+CHUNK_SIZE = 8
+
+
+def generate_pages() -> List[Document]:
+    # Html2TextTransformer converts the pages in place, so each run gets its own
+    return [Document(page_content=f"<html><head><title>Page {i}</title></head><body><h1>Page {i}</h1>" +
+                                  "".join(f"<h2>Section {j}</h2><p>{generate_text(f'{i}-{j}', 80)}</p>"
+                                          f"<ul><li><a href='/page-{j}'>{generate_text(str(j), 5)}</a></li></ul>"
+                                          for j in range(PARAGRAPHS)) + "</body></html>",
+                     metadata={"source": f"https://zio.dev/page-{i}"}) for i in range(PAGES)]
+
+
+def transform(pages: List[Document], workers: int) -> List[str]:
+    chunk_size = CHUNK_SIZE if workers > 0 else 1
+    docs = ordered_map(_transform_website_pages, batched(pages, chunk_size), get_process_pool(workers),
+                       max_pending=2 * workers)
+    return [_add_website_metadata(doc, "bench", "website").metadata["doc_uuid"] for chunks in docs for doc in chunks]
+
+
+def run():
+    cpus = os.cpu_count() or 1
+    print(f"Converting and splitting {PAGES} pages, {cpus} CPUs")
+    baseline_ids = None
+    baseline_duration = None
+    for workers in [0] + [workers for workers in [1, 2, 4, 8, 16] if workers <= max(cpus, 2)]:
+        if workers > 0:
+            # Start the workers and import the transformers before timing
+            list(ordered_map(_transform_website_pages, [generate_pages()[:1]] * workers, get_process_pool(workers),
+                             max_pending=workers))
+        pages = generate_pages()
+        start_time = time.perf_counter()
+        ids = transform(pages, workers)
+        duration = time.perf_counter() - start_time
+        if baseline_ids is None:
+            baseline_ids, baseline_duration = ids, duration
+        print(f"{'in the job thread' if workers == 0 else f'{workers} workers'}: {duration:.2f} s, "
+              f"{baseline_duration / duration:.2f}x, {len(ids)} chunks, "
+              f"{'same' if ids == baseline_ids else 'DIFFERENT'} ids")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,73 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import unittest
+
+from config import AdmissionConfig
+from core.services.admission_service import AdmissionService, ServerBusy
+
+
+class TestAdmissionService(unittest.TestCase):
+    def make_service(self, max_running=2, max_running_per_project=1, max_waiting=10, wait_timeout=5.0):
+        return AdmissionService(AdmissionConfig(max_running=max_running,
+                                                max_running_per_project=max_running_per_project,
+                                                max_waiting=max_waiting,
+                                                wait_timeout=wait_timeout))
+
+    def run_questions(self, admission_service: AdmissionService, project_ids, duration=0.02):
+        running = []
+        max_running = []
+
+        async def answer(project_id):
+            async with admission_service.admit(project_id):
+                running.append(project_id)
+                max_running.append(list(running))
+                await asyncio.sleep(duration)
+                running.remove(project_id)
+
+        async def run():
+            return await asyncio.gather(*[answer(project_id) for project_id in project_ids], return_exceptions=True)
+
+        return asyncio.run(run()), max_running
+
+    def test_running_questions_are_limited_per_project_and_overall(self):
+        admission_service = self.make_service()
+        results, max_running = self.run_questions(admission_service, ["a", "a", "b", "b", "c"])
+
+        self.assertEqual(results, [None] * 5)
+        self.assertLessEqual(max(len(running) for running in max_running), 2)
+        for running in max_running:
+            self.assertEqual(len(running), len(set(running)))
+        self.assertEqual(admission_service.running, 0)
+        self.assertEqual(admission_service.waiting, 0)
+
+    def test_questions_are_rejected_when_the_queue_is_full(self):
+        admission_service = self.make_service(max_running=1, max_waiting=1)
+        results, _ = self.run_questions(admission_service, ["a", "b", "c"])
+
+        self.assertEqual(results[:2], [None, None])
+        self.assertIsInstance(results[2], ServerBusy)
+
+    def test_questions_are_rejected_after_waiting_too_long(self):
+        admission_service = self.make_service(max_running=1, wait_timeout=0.01)
+        results, _ = self.run_questions(admission_service, ["a", "b"], duration=0.1)
+
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], ServerBusy)
+        self.assertEqual(admission_service.waiting, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
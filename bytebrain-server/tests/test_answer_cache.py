@@ -0,0 +1,115 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import unittest
+from typing import List
+
+from langchain.embeddings.base import Embeddings
+
+from config import AnswerCacheConfig
+from core.llm.callbacks import StreamingLLMCallbackHandler
+from core.services.answer_cache_service import AnswerCacheService, CachedAnswer
+
+
+class KeywordEmbeddings(Embeddings):
+    """Embeds a text as the counts of a few keywords, so similar questions get similar vectors."""
+    keywords = ["ref", "fiber", "stm", "layer"]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        words = text.lower().replace("?", "").split()
+        return [float(words.count(keyword)) for keyword in self.keywords] + [0.1]
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_json(self, data):
+        self.frames.append(data)
+
+
+class TestAnswerCacheService(unittest.TestCase):
+    def setUp(self):
+        self.answer_cache_service = AnswerCacheService(
+            KeywordEmbeddings(),
+            AnswerCacheConfig(enabled=True, similarity_threshold=0.95, max_entries_per_project=2)
+        )
+
+    def embed(self, question: str):
+        return asyncio.run(self.answer_cache_service.aembed_question(question))
+
+    def store(self, project_id: str, question: str, generation=None):
+        if generation is None:
+            generation = self.answer_cache_service.generation(project_id)
+        self.answer_cache_service.store(project_id, self.embed(question),
+                                        CachedAnswer(question=question, answer=f"answer to {question}", references=[]),
+                                        generation)
+
+    def test_similar_question_of_the_same_project_hits(self):
+        self.store("zio", "how do I use ref?")
+
+        self.assertEqual(self.answer_cache_service.lookup("zio", self.embed("how to use Ref")).answer,
+                         "answer to how do I use ref?")
+        self.assertIsNone(self.answer_cache_service.lookup("zio", self.embed("how do I fork a fiber?")))
+        self.assertIsNone(self.answer_cache_service.lookup("other", self.embed("how do I use ref?")))
+
+    def test_least_recently_used_answer_is_evicted(self):
+        self.store("zio", "ref")
+        self.store("zio", "fiber")
+        self.answer_cache_service.lookup("zio", self.embed("ref"))
+        self.store("zio", "stm")
+
+        self.assertIsNotNone(self.answer_cache_service.lookup("zio", self.embed("ref")))
+        self.assertIsNone(self.answer_cache_service.lookup("zio", self.embed("fiber")))
+
+    def test_invalidate_project(self):
+        self.store("zio", "ref")
+        self.answer_cache_service.invalidate_project("zio")
+
+        self.assertIsNone(self.answer_cache_service.lookup("zio", self.embed("ref")))
+
+    def test_answer_of_an_invalidated_generation_is_not_stored(self):
+        generation = self.answer_cache_service.generation("zio")
+        self.answer_cache_service.invalidate_project("zio")
+        self.store("zio", "ref", generation)
+
+        self.assertIsNone(self.answer_cache_service.lookup("zio", self.embed("ref")))
+
+    def test_evicted_row_is_reused(self):
+        for question in ["ref", "fiber", "stm", "layer"]:
+            self.store("zio", question)
+
+        self.assertIsNone(self.answer_cache_service.lookup("zio", self.embed("fiber")))
+        self.assertEqual(self.answer_cache_service.lookup("zio", self.embed("layer")).answer, "answer to layer")
+        self.assertEqual(self.answer_cache_service.entries["zio"].embeddings.shape, (2, 5))
+
+
+class TestReplay(unittest.TestCase):
+    def test_replayed_tokens_reassemble_the_answer(self):
+        websocket = RecordingWebSocket()
+        answer = "Use `Ref.make`:\n\n```scala\nRef.make(0)\n```  done"
+
+        asyncio.run(StreamingLLMCallbackHandler(websocket).replay(answer))
+
+        self.assertGreater(len(websocket.frames), 1)
+        self.assertEqual("".join(frame["token"] for frame in websocket.frames), answer)
+        self.assertTrue(all(frame["completed"] is False for frame in websocket.frames))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import time
+import unittest
+
+from core.dao.apikey_dao import ApiKeyDao
+from core.dao.project_dao import ProjectDao, Project
+from core.services.project_service import ProjectService
+from core.utils.cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_entries_expire(self):
+        cache = TTLCache(ttl=0.05, max_size=10)
+        cache.put("key", "value")
+        self.assertEqual(cache.get("key"), "value")
+        time.sleep(0.06)
+        self.assertIsNone(cache.get("key"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(ttl=60, max_size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_get_or_load_caches_none(self):
+        cache = TTLCache(ttl=60, max_size=10)
+        loads = []
+
+        def load(key):
+            loads.append(key)
+            return None
+
+        self.assertIsNone(cache.get_or_load("missing", load))
+        self.assertIsNone(cache.get_or_load("missing", load))
+        self.assertEqual(loads, ["missing"])
+
+
+class CountingApiKeyDao(ApiKeyDao):
+    def __init__(self, project_db):
+        super().__init__(project_db)
+        self.lookups = 0
+
+    def get_apikey(self, apikey):
+        self.lookups += 1
+        return super().get_apikey(apikey)
+
+
+class TestApiKeyCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(self.temp_dir.name, "projects.db")
+        self.project_dao = ProjectDao(db_path)
+        self.apikey_dao = CountingApiKeyDao(db_path)
+        self.project_service = ProjectService(self.project_dao, None, self.apikey_dao)
+        self.project = Project.create("zio", "user", "ZIO docs")
+        self.project_dao.create_project(self.project)
+        self.apikey = self.project_service.generate_apikey(self.project.id, "widget", ["zio.dev"]).apikey
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_warm_apikey_is_resolved_from_memory(self):
+        self.assertTrue(self.project_service.is_allowed("zio.dev", self.apikey))
+        self.assertFalse(self.project_service.is_allowed("example.com", self.apikey))
+        project = self.project_service.get_project_by_apikey(self.apikey, with_resources=False)
+
+        self.assertEqual(project.id, self.project.id)
+        self.assertEqual(self.apikey_dao.lookups, 1)
+
+    def test_cached_apikey_is_read_without_loading(self):
+        self.assertIsNone(self.project_service.get_cached_apikey(self.apikey))
+        self.project_service.resolve_apikey(self.apikey)
+        resolved = self.project_service.get_cached_apikey(self.apikey)
+
+        self.assertTrue(ProjectService.allows_domain(resolved, "zio.dev"))
+        self.assertFalse(ProjectService.allows_domain(resolved, "example.com"))
+        self.assertFalse(ProjectService.allows_domain(None, "zio.dev"))
+        self.assertEqual(self.apikey_dao.lookups, 1)
+
+    def test_deleted_apikey_is_invalidated(self):
+        self.assertTrue(self.project_service.is_allowed("zio.dev", self.apikey))
+        self.project_service.delete_apikey(self.apikey, self.project.id, "user")
+
+        self.assertFalse(self.project_service.is_allowed("zio.dev", self.apikey))
+        self.assertIsNone(self.project_service.get_project_by_apikey(self.apikey, with_resources=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
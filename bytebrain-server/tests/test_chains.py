@@ -0,0 +1,61 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import unittest
+from typing import List, Iterable, Optional
+
+from langchain.schema import Document
+from langchain.vectorstores import VectorStore
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from core.llm.chains import get_question_answering_chain, ChainSettings
+
+
+class EmptyVectorStore(VectorStore):
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs) -> List[str]:
+        return []
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return []
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        return cls()
+
+
+class TestQuestionAnsweringChainCache(unittest.TestCase):
+    def test_chain_is_built_once_per_project_prompt_and_settings(self):
+        vector_store = EmptyVectorStore()
+        chain = get_question_answering_chain("project", vector_store, "{context} {question}")
+
+        self.assertIs(get_question_answering_chain("project", vector_store, "{context} {question}"), chain)
+        self.assertIsNot(get_question_answering_chain("other", vector_store, "{context} {question}"), chain)
+        self.assertIsNot(get_question_answering_chain("project", vector_store, "{question} {context}"), chain)
+        self.assertIsNot(get_question_answering_chain("project", vector_store, "{context} {question}",
+                                                      ChainSettings(temperature=0.5)), chain)
+
+    def test_chains_share_llms(self):
+        vector_store = EmptyVectorStore()
+        first = get_question_answering_chain("first", vector_store, "{context} {question}")
+        second = get_question_answering_chain("second", vector_store, "{context} {question}")
+
+        self.assertIs(first.combine_docs_chain.llm_chain.llm, second.combine_docs_chain.llm_chain.llm)
+        self.assertTrue(first.combine_docs_chain.llm_chain.llm.streaming)
+        self.assertFalse(first.question_generator.llm.streaming)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from langchain.schema import Document
+
+from core.llm.context import ContextPacker
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def page(text: str, url: str = "https://zio.dev/reference/fiber") -> Document:
+    return Document(page_content=text, metadata={"doc_url": url})
+
+
+class TestContextPacker(unittest.TestCase):
+    def test_documents_are_packed_in_order_within_the_budget(self):
+        packer = ContextPacker(count_words, token_budget=10, min_document_tokens=2)
+        packed = packer.pack([page("one two three four", "a"), page("five six seven eight", "b"),
+                              page("nine ten eleven twelve", "c"), page("thirteen", "d")])
+
+        self.assertEqual([document.page_content for document in packed.documents],
+                         ["one two three four", "five six seven eight", "nine ten"])
+        self.assertEqual(packed.tokens, 10)
+        self.assertEqual((packed.dropped, packed.trimmed), (1, 1))
+
+    def test_remaining_budget_below_the_minimum_is_left_empty(self):
+        packer = ContextPacker(count_words, token_budget=5, min_document_tokens=2)
+        packed = packer.pack([page("one two three four", "a"), page("five six", "b")])
+
+        self.assertEqual([document.page_content for document in packed.documents], ["one two three four"])
+        self.assertEqual(packed.dropped, 1)
+
+    def test_duplicates_and_contained_documents_are_dropped(self):
+        packer = ContextPacker(count_words, token_budget=100, min_document_tokens=1)
+        text = "A fiber is a lightweight thread of execution managed by the ZIO runtime, not by the OS."
+        packed = packer.pack([page(text, "a"), page(text, "b"), page("managed by the ZIO runtime", "c")])
+
+        self.assertEqual(len(packed.documents), 1)
+        self.assertEqual(packed.dropped, 2)
+
+    def test_overlap_of_neighbouring_chunks_is_trimmed(self):
+        overlap = "Fibers are interrupted with `fiber.interrupt`, which waits for their finalizers. "
+        first = "Forking an effect returns a fiber. " + overlap
+        second = overlap + "Use `interruptFork` to avoid waiting."
+        packer = ContextPacker(count_words, token_budget=100, min_document_tokens=1)
+        packed = packer.pack([page(first), page(second)])
+
+        self.assertEqual(packed.documents[0].page_content, first)
+        self.assertEqual(packed.documents[1].page_content, "Use `interruptFork` to avoid waiting.")
+        self.assertEqual(packed.documents[1].metadata, {"doc_url": "https://zio.dev/reference/fiber"})
+        self.assertEqual(packed.trimmed, 1)
+
+    def test_overlap_is_only_trimmed_within_a_source(self):
+        overlap = "Fibers are interrupted with `fiber.interrupt`, which waits for their finalizers. "
+        packer = ContextPacker(count_words, token_budget=100, min_document_tokens=1)
+        packed = packer.pack([page("First. " + overlap, "a"), page(overlap + "Second.", "b")])
+
+        self.assertEqual(packed.documents[1].page_content, overlap + "Second.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from core.dao.database import get_pool, run_in_executor
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "test.db")
+        self.db = get_pool(self.db_path)
+        self.db.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+
+    def tearDown(self):
+        self.db.close()
+        self.temp_dir.cleanup()
+
+    def test_pool_is_shared_per_database_file(self):
+        self.assertIs(get_pool(self.db_path), self.db)
+        self.assertEqual(self.db.fetchone('PRAGMA journal_mode'), ('wal',))
+
+    def test_transaction_is_rolled_back_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.db.transaction() as cursor:
+                cursor.execute('INSERT INTO items (name) VALUES (?)', ("first",))
+                raise ValueError()
+        self.assertEqual(self.db.fetchall('SELECT name FROM items'), [])
+
+        with self.db.transaction() as cursor:
+            cursor.execute('INSERT INTO items (name) VALUES (?)', ("second",))
+        self.assertEqual(self.db.fetchall('SELECT name FROM items'), [("second",)])
+
+    def test_readers_are_not_blocked_by_writers(self):
+        self.db.execute('INSERT INTO items (name) VALUES (?)', ("committed",))
+        writing = threading.Event()
+        done = threading.Event()
+
+        def write():
+            with self.db.transaction() as cursor:
+                cursor.execute('INSERT INTO items (name) VALUES (?)', ("uncommitted",))
+                writing.set()
+                done.wait(5)
+            self.db.close()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            self.assertTrue(writing.wait(5))
+            start_time = time.perf_counter()
+            self.assertEqual(self.db.fetchall('SELECT name FROM items'), [("committed",)])
+            self.assertLess(time.perf_counter() - start_time, 1)
+        finally:
+            done.set()
+            writer.join()
+        self.assertEqual(len(self.db.fetchall('SELECT name FROM items')), 2)
+
+    def test_run_in_executor_does_not_block_the_event_loop(self):
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold_write_lock():
+            with get_pool(self.db_path).transaction():
+                locked.set()
+                release.wait(5)
+
+        async def main():
+            writer = threading.Thread(target=hold_write_lock)
+            writer.start()
+            locked.wait(5)
+            # The write waits for the lock on the executor while the event loop keeps serving other tasks
+            write = asyncio.ensure_future(run_in_executor(self.db.execute, 'INSERT INTO items (name) VALUES (?)',
+                                                          ("blocked",)))
+            await asyncio.sleep(0.05)
+            self.assertFalse(write.done())
+            release.set()
+            self.assertEqual(await write, 1)
+            writer.join()
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import os
+import tempfile
+import unittest
+from typing import List
+
+from langchain.embeddings.base import Embeddings
+from core.dao.query_embedding_dao import QueryEmbeddingDao
+from core.llm.embeddings import QueryEmbeddingCache
+from core.utils.metrics import query_embedding_cache_counter
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.queries = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.queries.append(text)
+        return [float(len(text)), 0.0]
+
+
+def hits(result: str) -> float:
+    return query_embedding_cache_counter.labels(result=result)._value.get()
+
+
+class TestQueryEmbeddingCache(unittest.TestCase):
+    def test_repeated_queries_are_embedded_once(self):
+        underlying = CountingEmbeddings()
+        embeddings = QueryEmbeddingCache(underlying, namespace="model", max_size=10)
+        memory_hits = hits("memory")
+
+        self.assertEqual(embeddings.embed_query("What is a fiber?"), [16.0, 0.0])
+        self.assertEqual(embeddings.embed_query("  What is a   fiber? "), [16.0, 0.0])
+        self.assertEqual(asyncio.run(embeddings.aembed_query("What is a fiber?")), [16.0, 0.0])
+
+        self.assertEqual(underlying.queries, ["What is a fiber?"])
+        self.assertEqual(hits("memory") - memory_hits, 2)
+
+    def test_least_recently_used_queries_are_evicted(self):
+        underlying = CountingEmbeddings()
+        embeddings = QueryEmbeddingCache(underlying, namespace="model", max_size=2)
+
+        for query in ["a", "b", "a", "c", "a", "b"]:
+            embeddings.embed_query(query)
+
+        self.assertEqual(underlying.queries, ["a", "b", "c", "b"])
+
+    def test_documents_are_not_cached(self):
+        underlying = CountingEmbeddings()
+        embeddings = QueryEmbeddingCache(underlying, namespace="model", max_size=10)
+
+        self.assertEqual(embeddings.embed_documents(["fiber"]), [[5.0, 1.0]])
+        self.assertEqual(len(embeddings.entries), 0)
+
+    def test_embeddings_are_persisted_per_model(self):
+        with tempfile.TemporaryDirectory() as store_dir:
+            store = QueryEmbeddingDao(os.path.join(store_dir, "query_embeddings.db"), max_size=10 ** 6)
+            QueryEmbeddingCache(CountingEmbeddings(), "model", 10, store).embed_query("fiber")
+
+            underlying = CountingEmbeddings()
+            embeddings = QueryEmbeddingCache(underlying, "model", 10, store)
+            disk_hits = hits("disk")
+            self.assertEqual(asyncio.run(embeddings.aembed_query("fiber")), [5.0, 0.0])
+            self.assertEqual(underlying.queries, [])
+            self.assertEqual(hits("disk") - disk_hits, 1)
+
+            other_model = CountingEmbeddings()
+            QueryEmbeddingCache(other_model, "other-model", 10, store).embed_query("fiber")
+            self.assertEqual(other_model.queries, ["fiber"])
+
+    def test_persisted_embeddings_are_bounded(self):
+        with tempfile.TemporaryDirectory() as store_dir:
+            store = QueryEmbeddingDao(os.path.join(store_dir, "query_embeddings.db"), max_size=3000)
+            # Random values barely compress, so each entry takes more than a third of the store
+            values = {key: os.urandom(1000) for key in ["a", "b", "c"]}
+            store.mset([("a", values["a"]), ("b", values["b"])])
+            store.mget(["a"])
+            store.mset([("c", values["c"])])
+
+            self.assertEqual(store.mget(["a", "b", "c"]), [values["a"], None, values["c"]])
+            self.assertLessEqual(store.size(), 3000)
+            self.assertEqual(store.size(), store.db.fetchone("SELECT SUM(size) FROM query_embeddings")[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+import unittest
+
+from langchain.schema import HumanMessage
+
+from core.llm.callbacks import StreamingLLMCallbackHandler
+from core.llm.chains import make_question_answering_chain, set_llm_factory, make_chat_openai, ChainSettings
+from core.llm.fakes import FakeChatModel, FakeEmbeddings, InMemoryVectorStore, add_benchmark_documents, \
+    sample_latency
+from core.llm.question_answering import aanswer_question
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_json(self, data):
+        self.frames.append(data)
+
+
+class TestFakes(unittest.TestCase):
+    def test_sample_latency(self):
+        self.assertEqual(sample_latency(0.5, 0.0), 0.5)
+        self.assertEqual(sample_latency(0.0, 1.0), 0.0)
+        self.assertGreater(sample_latency(0.5, 1.0), 0.0)
+
+    def test_fake_chat_model_streams_after_its_latency(self):
+        tokens = []
+
+        class TokenRecorder(StreamingLLMCallbackHandler):
+            async def on_llm_new_token(self, token: str, **kwargs):
+                tokens.append(token)
+
+        model = FakeChatModel(streaming=True, answer_tokens=5, first_token_latency=0.05, token_latency=0.01)
+        start_time = time.perf_counter()
+        result = asyncio.run(model.agenerate([[HumanMessage(content="What is ZIO?")]],
+                                             callbacks=[TokenRecorder(None)]))
+
+        self.assertGreaterEqual(time.perf_counter() - start_time, 0.09)
+        self.assertEqual(len(tokens), 5)
+        self.assertEqual("".join(tokens), result.generations[0][0].text)
+
+    def test_in_memory_vector_store_finds_the_most_similar_documents(self):
+        vector_store = InMemoryVectorStore(FakeEmbeddings())
+        vector_store.add_texts(["fiber interrupt join", "layer provide environment", "stm ref transaction"],
+                               [{"i": 0}, {"i": 1}, {"i": 2}])
+
+        documents = vector_store.similarity_search("how do I provide a layer", k=2)
+
+        self.assertEqual(documents[0].metadata, {"i": 1})
+        self.assertEqual(len(documents), 2)
+
+    def test_in_memory_vector_store_replaces_and_deletes_documents_by_id(self):
+        vector_store = InMemoryVectorStore(FakeEmbeddings())
+        vector_store.add_texts(["fiber", "layer", "stm"], [{"i": 0}, {"i": 1}, {"i": 2}], uuids=["a", "b", "c"])
+        vector_store.add_texts(["fiber interrupt"], [{"i": 3}], uuids=["a"])
+
+        self.assertEqual([document.page_content for document in vector_store.documents],
+                         ["fiber interrupt", "layer", "stm"])
+        self.assertEqual(vector_store.vectors.shape[0], 3)
+        self.assertTrue(vector_store.delete(["b"]))
+        self.assertEqual(vector_store.delete_where({"path": ["i"], "operator": "Equal", "valueText": 2}), 1)
+        self.assertEqual(vector_store.ids, ["a"])
+        self.assertEqual(vector_store.similarity_search("stm", k=3)[0].page_content, "fiber interrupt")
+
+
+class TestBenchmarkPipeline(unittest.TestCase):
+    def test_question_answering_chain_runs_offline(self):
+        vector_store = InMemoryVectorStore(FakeEmbeddings())
+        add_benchmark_documents(vector_store, documents=20)
+        websocket = RecordingWebSocket()
+        set_llm_factory(lambda model_name, temperature, streaming: FakeChatModel(
+            streaming=streaming, answer_tokens=20, first_token_latency=0, token_latency=0))
+        try:
+            qa = make_question_answering_chain(vector_store, "{context}\n{question}")
+            result = asyncio.run(aanswer_question(qa, "How do I retry an effect?", ["What is ZIO?", "An effect."],
+                                                  callbacks=[StreamingLLMCallbackHandler(websocket)],
+                                                  standalone_heuristic=False))
+        finally:
+            set_llm_factory(make_chat_openai)
+
+        self.assertEqual(len(websocket.frames), 20)
+        self.assertEqual("".join(frame["token"] for frame in websocket.frames), result["answer"])
+        self.assertEqual(len(result["source_documents"]), ChainSettings().k)
+        self.assertEqual(result["source_documents"][0].metadata["doc_source_id"], "zio.dev")
+
+
+if __name__ == '__main__':
+    unittest.main()
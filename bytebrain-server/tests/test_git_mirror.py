@@ -0,0 +1,88 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+import unittest
+
+from git import Actor, Repo
+
+from core.docs.document_loader import load_sourcecode_files, MAX_SOURCE_FILE_SIZE
+from core.docs.git_mirror import GitMirror
+
+AUTHOR = Actor("ZIO", "zio@example.com")
+
+
+class TestGitMirror(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        work_path = os.path.join(self.temp_dir.name, "work")
+        self.work = Repo.init(work_path, initial_branch="main")
+        self.files = {"docs/overview/index.md": "# ZIO", "docs/fibers.md": "# Fibers",
+                      "core/ZIO.scala": "object ZIO", "assets/logo.png": "\0PNG" + "x" * 1000}
+        for name, content in self.files.items():
+            os.makedirs(os.path.dirname(os.path.join(work_path, name)), exist_ok=True)
+            with open(os.path.join(work_path, name), "w") as file:
+                file.write(content)
+        self.work.index.add(list(self.files))
+        self.work.index.commit("Initial commit", author=AUTHOR, committer=AUTHOR)
+        # Partial clones are only served over a transport and when the server allows filters
+        bare_path = os.path.join(self.temp_dir.name, "origin.git")
+        Repo.clone_from(work_path, bare_path, bare=True).git.config("uploadpack.allowFilter", "true")
+        self.clone_url = "file://" + bare_path
+        self.mirror_path = os.path.join(self.temp_dir.name, "mirror")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_partial_clone_only_fetches_and_checks_out_the_files_of_the_glob(self):
+        mirror = GitMirror(self.mirror_path, self.clone_url, branch=None, paths="docs/**/*.md")
+        commit = mirror.sync()
+
+        self.assertEqual(commit, self.work.head.commit.hexsha)
+        self.assertTrue(os.path.isfile(os.path.join(self.mirror_path, "docs/overview/index.md")))
+        self.assertFalse(os.path.exists(os.path.join(self.mirror_path, "core/ZIO.scala")))
+        blobs = [line for line in Repo(self.mirror_path).git.cat_file("--batch-all-objects", "--batch-check").split(
+            "\n") if " blob " in line]
+        self.assertEqual(len(blobs), 2)
+
+    def test_sync_fetches_new_commits_of_the_sparse_checkout(self):
+        mirror = GitMirror(self.mirror_path, self.clone_url, branch="main", paths="docs/**/*.md")
+        first_commit = mirror.sync()
+        with open(os.path.join(self.work.working_dir, "docs/fibers.md"), "w") as file:
+            file.write("# Fibers are interruptible")
+        self.work.index.add(["docs/fibers.md"])
+        self.work.index.commit("Update", author=AUTHOR, committer=AUTHOR)
+        self.work.create_remote("origin", os.path.join(self.temp_dir.name, "origin.git")).push("main")
+
+        mirror.sync()
+        self.assertEqual(mirror.changed_files(first_commit), ["docs/fibers.md"])
+        with open(os.path.join(self.mirror_path, "docs/fibers.md")) as file:
+            self.assertEqual(file.read(), "# Fibers are interruptible")
+
+    def test_binary_and_oversized_files_are_skipped(self):
+        with open(os.path.join(self.work.working_dir, "core/Generated.scala"), "w") as file:
+            file.write("val x = 1\n" * (MAX_SOURCE_FILE_SIZE // 10 + 1))
+
+        ids, docs = load_sourcecode_files(repo_path=self.work.working_dir,
+                                          files=["core/ZIO.scala", "core/Generated.scala", "assets/logo.png"],
+                                          doc_source_id="resource",
+                                          doc_source_type="github",
+                                          language="scala")
+        self.assertEqual([doc.metadata["doc_path"] for doc in docs], ["core/ZIO.scala"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import functools
+import importlib.util
+import os
+import tempfile
+import threading
+import unittest
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from core.dao.http_cache_dao import HttpCacheDao
+from core.docs.document_loader import lazy_load_docs_from_site, load_docs_from_webpage
+from core.docs.http_cache import PAGE_HASH, is_unchanged_page
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    requested_paths = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.requested_paths.append(self.path)
+        super().do_GET()
+
+
+class TestHttpCacheDao(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_least_recently_fetched_entries_are_evicted(self):
+        http_cache = HttpCacheDao(os.path.join(self.temp_dir.name, "http_cache.db"), max_size=3000)
+        # Random bodies barely compress, so each entry takes more than a third of the cache
+        bodies = {url: os.urandom(1000).hex() for url in ["a", "b", "c"]}
+        for url in ["a", "b"]:
+            http_cache.put(url, etag=f'"{url}"', last_modified=None, body_hash=url, body=bodies[url])
+        http_cache.touch("a")
+        http_cache.put("c", etag='"c"', last_modified=None, body_hash="c", body=bodies["c"])
+
+        self.assertIsNone(http_cache.get("b"))
+        self.assertEqual(http_cache.get("a").body, bodies["a"])
+        self.assertEqual(http_cache.get("c").etag, '"c"')
+        self.assertLessEqual(http_cache.size(), 3000)
+
+    def test_size_accounts_for_replaced_and_deleted_entries(self):
+        http_cache = HttpCacheDao(os.path.join(self.temp_dir.name, "http_cache.db"), max_size=10 ** 6)
+        http_cache.put("a", etag=None, last_modified="yesterday", body_hash="1", body="a" * 1000)
+        http_cache.put("a", etag=None, last_modified="today", body_hash="2", body=os.urandom(100).hex())
+        http_cache.put("b", etag=None, last_modified="today", body_hash="3", body="b")
+        sizes = http_cache.size()
+        http_cache.delete("b")
+
+        self.assertLess(http_cache.size(), sizes)
+        self.assertEqual(http_cache.size(), http_cache.db.fetchone("SELECT SUM(size) FROM http_cache")[0])
+
+
+class TestConditionalCrawl(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.site_dir = os.path.join(self.temp_dir.name, "site")
+        os.mkdir(self.site_dir)
+        self.write_page("index.html", '<html><body><h1>ZIO</h1><a href="fibers.html">Fibers</a></body></html>')
+        self.write_page("fibers.html", "<html><body><h1>Fibers</h1><p>Fibers are lightweight threads.</p></body></html>")
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0),
+                                          functools.partial(QuietHandler, directory=self.site_dir))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.http_cache = HttpCacheDao(os.path.join(self.temp_dir.name, "http_cache.db"), max_size=10 ** 6)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def write_page(self, name: str, html: str, modified_later: bool = False):
+        path = os.path.join(self.site_dir, name)
+        with open(path, "w") as file:
+            file.write(html)
+        if modified_later:
+            # Last-Modified has a resolution of a second
+            mtime = os.stat(path).st_mtime + 10
+            os.utime(path, (mtime, mtime))
+
+    def crawl(self, indexed_pages):
+        return list(lazy_load_docs_from_site(doc_source_id="resource", doc_source_type="website",
+                                             http_cache=self.http_cache, indexed_pages=indexed_pages, url=self.url))
+
+    def test_recrawl_skips_the_pages_that_were_not_modified(self):
+        docs = self.crawl(indexed_pages={})
+        indexed_pages = {doc.metadata["doc_url"]: doc.metadata[PAGE_HASH] for doc in docs}
+        self.assertEqual(len(indexed_pages), 2)
+
+        docs = self.crawl(indexed_pages)
+        self.assertEqual(len(docs), 2)
+        self.assertTrue(all(is_unchanged_page(doc) for doc in docs))
+
+        self.write_page("fibers.html", "<html><body><p>Fibers can be interrupted.</p></body></html>",
+                        modified_later=True)
+        docs = self.crawl(indexed_pages)
+        changed_docs = [doc for doc in docs if not is_unchanged_page(doc)]
+        self.assertEqual([doc.metadata["doc_url"] for doc in changed_docs], [self.url + "fibers.html"])
+        self.assertIn("interrupted", changed_docs[0].page_content)
+
+    def test_not_modified_page_is_loaded_from_the_cache_when_it_was_not_indexed(self):
+        self.crawl(indexed_pages={})
+
+        docs = self.crawl(indexed_pages={})
+        self.assertEqual(len(docs), 2)
+        self.assertFalse(any(is_unchanged_page(doc) for doc in docs))
+
+    @unittest.skipUnless(importlib.util.find_spec("unstructured"), "webpages are partitioned by unstructured")
+    def test_webpage_is_downloaded_once(self):
+        QuietHandler.requested_paths.clear()
+        ids, docs = load_docs_from_webpage(self.url + "fibers.html", doc_source_id="resource",
+                                           doc_source_type="webpage", http_cache=self.http_cache, indexed_pages={})
+
+        self.assertEqual(QuietHandler.requested_paths, ["/fibers.html"])
+        self.assertIn("lightweight threads", docs[0].page_content)
+        self.assertEqual(docs[0].metadata[PAGE_HASH], self.http_cache.get(self.url + "fibers.html").body_hash)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from config import JobsConfig
+from core.dao.job_dao import JobDao, JobStatus
+from core.services.job_service import JobService, JobQueueFull
+
+
+class TestJobDao(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.job_dao = JobDao(os.path.join(self.temp_dir.name, "jobs.db"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_claim_next_job_by_priority(self):
+        self.job_dao.add_job("index", "website", 3, {"resource_id": "site"})
+        self.job_dao.add_job("index", "webpage", 0, {"resource_id": "page"})
+
+        job = self.job_dao.claim_next_job([])
+        self.assertEqual(job.payload, {"resource_id": "page"})
+        self.assertEqual(job.status, JobStatus.Running)
+        self.assertEqual(self.job_dao.claim_next_job([]).payload, {"resource_id": "site"})
+        self.assertIsNone(self.job_dao.claim_next_job([]))
+
+    def test_claim_next_job_skips_excluded_groups(self):
+        self.job_dao.add_job("index", "webpage", 0, {"resource_id": "page"})
+        self.job_dao.add_job("index", "website", 3, {"resource_id": "site"})
+
+        job = self.job_dao.claim_next_job(["webpage"])
+        self.assertEqual(job.payload, {"resource_id": "site"})
+
+    def test_add_job_deduplicates_active_jobs(self):
+        job_id = self.job_dao.add_job("index", "webpage", 0, {}, dedup_key="index:1")
+        self.assertIsNone(self.job_dao.add_job("index", "webpage", 0, {}, dedup_key="index:1"))
+
+        self.job_dao.set_status(job_id, JobStatus.Finished)
+        self.assertIsNotNone(self.job_dao.add_job("index", "webpage", 0, {}, dedup_key="index:1"))
+
+    def test_claim_next_job_runs_serialized_jobs_in_order(self):
+        index_id = self.job_dao.add_job("index", "webpage", 0, {}, dedup_key="index:1", serial_key="1")
+        self.assertEqual(self.job_dao.claim_next_job([]).id, index_id)
+        delete_id = self.job_dao.add_job("delete", "delete", 0, {}, dedup_key="delete:1", serial_key="1")
+        # Queued behind the running job with the same dedup key
+        next_index_id = self.job_dao.add_job("index", "webpage", 0, {}, dedup_key="index:1", serial_key="1")
+        self.assertIsNotNone(next_index_id)
+        self.assertIsNone(self.job_dao.add_job("index", "webpage", 0, {}, dedup_key="index:1", serial_key="1"))
+        other_id = self.job_dao.add_job("index", "webpage", 0, {}, dedup_key="index:2", serial_key="2")
+
+        self.assertEqual(self.job_dao.claim_next_job([]).id, other_id)
+        self.assertIsNone(self.job_dao.claim_next_job([]))
+        self.job_dao.set_status(index_id, JobStatus.Finished)
+        self.assertEqual(self.job_dao.claim_next_job([]).id, delete_id)
+        self.assertIsNone(self.job_dao.claim_next_job([]))
+        self.job_dao.set_status(delete_id, JobStatus.Finished)
+        self.assertEqual(self.job_dao.claim_next_job([]).id, next_index_id)
+
+    def test_cancel_pending_jobs(self):
+        running_id = self.job_dao.add_job("index", "webpage", 0, {}, dedup_key="index:1", serial_key="1")
+        self.job_dao.claim_next_job([])
+        pending_id = self.job_dao.add_job("index", "webpage", 0, {}, dedup_key="index:1", serial_key="1")
+
+        self.assertEqual(self.job_dao.cancel_pending_jobs("index:1"), 1)
+        self.assertEqual(self.job_dao.get_by_id(pending_id).status, JobStatus.Cancelled)
+        self.assertEqual(self.job_dao.get_by_id(running_id).status, JobStatus.Running)
+
+    def test_requeue_running_jobs(self):
+        job_id = self.job_dao.add_job("index", "webpage", 0, {})
+        self.job_dao.claim_next_job([])
+
+        self.assertEqual(self.job_dao.requeue_running_jobs(), 1)
+        self.assertEqual(self.job_dao.get_by_id(job_id).status, JobStatus.Pending)
+
+
+class TestJobService(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.job_dao = JobDao(os.path.join(self.temp_dir.name, "jobs.db"))
+        self.config = JobsConfig(workers=4, max_pending=10, poll_interval=0.05,
+                                 concurrency={"website": 1}, priority={"webpage": 0, "website": 1})
+        self.job_service = JobService(self.job_dao, self.config)
+
+    def tearDown(self):
+        self.job_service.stop(timeout=5)
+        self.temp_dir.cleanup()
+
+    def test_group_concurrency_is_limited(self):
+        lock = threading.Lock()
+        running = []
+        max_running = []
+        finished = threading.Event()
+
+        def handler(payload):
+            with lock:
+                running.append(payload["i"])
+                max_running.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(payload["i"])
+                if payload["i"] == 2:
+                    finished.set()
+
+        self.job_service.register_handler("index", handler)
+        for i in range(3):
+            self.job_service.submit("index", "website", {"i": i})
+        self.job_service.start()
+
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(max(max_running), 1)
+
+    def test_failed_job_is_recorded(self):
+        def handler(payload):
+            raise ValueError("boom")
+
+        self.job_service.register_handler("index", handler)
+        job_id = self.job_service.submit("index", "webpage", {})
+        self.job_service.start()
+
+        deadline = time.time() + 5
+        while self.job_dao.get_by_id(job_id).status != JobStatus.Failed and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.job_dao.get_by_id(job_id).error, "ValueError: boom")
+
+    def test_submit_rejects_when_queue_is_full(self):
+        for i in range(self.config.max_pending):
+            self.job_service.submit("index", "website", {"i": i})
+
+        with self.assertRaises(JobQueueFull):
+            self.job_service.submit("index", "website", {})
+
+    def test_full_queue_still_deduplicates_and_takes_uncapped_jobs(self):
+        for i in range(self.config.max_pending):
+            self.job_service.submit("index", "website", {"i": i}, dedup_key=f"index:{i}")
+
+        self.assertIsNone(self.job_service.submit("index", "website", {"i": 0}, dedup_key="index:0"))
+        self.assertIsNotNone(self.job_service.submit("delete", "delete", {}, uncapped=True))
+
+    def test_concurrent_submits_do_not_exceed_the_queue_size(self):
+        def submit(i):
+            try:
+                self.job_service.submit("index", "website", {"i": i})
+            except JobQueueFull:
+                pass
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(4 * self.config.max_pending)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.job_dao.get_pending_jobs_count(), self.config.max_pending)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import os
+import tempfile
+import unittest
+import uuid
+
+import numpy as np
+from langchain.schema import Document
+from langchain.vectorstores.utils import maximal_marginal_relevance as langchain_maximal_marginal_relevance
+
+from core.dao.lexical_index_dao import LexicalIndexDao
+from core.llm.fakes import FakeEmbeddings, InMemoryVectorStore
+from core.llm.retrievers import HybridRetriever, reciprocal_rank_fusion, maximal_marginal_relevance
+
+DOCS = [
+    Document(page_content="Use ZLayer.fromFunction to build a layer from a function of its dependencies.",
+             metadata={"doc_source_id": "zio.dev", "doc_url": "https://zio.dev/layers"}),
+    Document(page_content="A fiber can be interrupted, joined or awaited.",
+             metadata={"doc_source_id": "zio.dev", "doc_url": "https://zio.dev/fibers"}),
+    Document(page_content="ZIO.attempt turns side effects throwing exceptions into effects.",
+             metadata={"doc_source_id": "zio-github", "doc_url": "https://github.com/zio/zio"}),
+]
+
+
+class TestLexicalIndexDao(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.lexical_index = LexicalIndexDao(os.path.join(self.temp_dir.name, "lexical_index.db"))
+        self.uuids = [uuid.uuid4() for _ in DOCS]
+        self.lexical_index.add_docs(self.uuids, DOCS)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_search_ranks_exact_identifiers_first(self):
+        results = self.lexical_index.search("How do I use ZLayer.fromFunction?", k=2)
+
+        self.assertEqual(results[0][0], DOCS[0])
+        self.assertTrue(all(score > 0 for _, score in results))
+
+    def test_search_matches_parts_of_identifiers(self):
+        results = self.lexical_index.search("fromFunction", k=3)
+
+        self.assertEqual([document for document, _ in results], [DOCS[0]])
+
+    def test_add_docs_replaces_docs_with_the_same_ids(self):
+        updated = Document(page_content="A fiber can be raced.", metadata=DOCS[1].metadata)
+        self.lexical_index.add_docs([self.uuids[1]], [updated])
+
+        self.assertEqual(self.lexical_index.search("interrupted", k=3), [])
+        self.assertEqual(self.lexical_index.search("raced", k=3)[0][0], updated)
+
+    def test_delete_docs(self):
+        self.assertEqual(self.lexical_index.delete_docs([self.uuids[0]]), 1)
+        self.assertEqual(self.lexical_index.search("ZLayer", k=3), [])
+
+        self.assertEqual(self.lexical_index.delete_docs_by_source_id("zio.dev"), 1)
+        self.assertEqual(self.lexical_index.search("fiber", k=3), [])
+        self.assertEqual(len(self.lexical_index.search("ZIO.attempt", k=3)), 1)
+
+    def test_search_is_scoped_to_a_project(self):
+        docs = [Document(page_content="Use ZLayer.fromFunction", metadata={"project_id": project_id})
+                for project_id in ["5f0c-project-1", "5f0c-project-2"]]
+        uuids = [uuid.uuid4(), uuid.uuid4()]
+        self.lexical_index.add_docs(uuids, docs)
+
+        self.assertEqual([document for document, _ in self.lexical_index.search("ZLayer", 5, "5f0c-project-2")],
+                         [docs[1]])
+        self.assertEqual(self.lexical_index.search("ZLayer", 5, "5f0c"), [])
+        self.assertEqual([document for document, _ in self.lexical_index.search("ZLayer", 5)], [DOCS[0]])
+
+        self.assertEqual(self.lexical_index.delete_docs(uuids), 2)
+        self.assertEqual(self.lexical_index.search("ZLayer", 5, "5f0c-project-2"), [])
+
+    def test_search_without_terms(self):
+        self.assertEqual(self.lexical_index.search("?!", k=3), [])
+
+
+class TestHybridRetriever(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.lexical_index = LexicalIndexDao(os.path.join(self.temp_dir.name, "lexical_index.db"))
+        self.vector_store = InMemoryVectorStore(FakeEmbeddings())
+        uuids = [uuid.uuid4() for _ in DOCS]
+        self.vector_store.add_texts([doc.page_content for doc in DOCS], [{} for _ in DOCS], uuids=uuids)
+        self.lexical_index.add_docs(uuids, DOCS)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_reciprocal_rank_fusion_weights_rankings(self):
+        a, b, c = DOCS
+        self.assertEqual(reciprocal_rank_fusion([[a, b], [c, b]], weights=[1.0, 0.0]), [a, b, c])
+        self.assertEqual(reciprocal_rank_fusion([[a, b], [c, b]], weights=[0.0, 1.0])[0], c)
+
+    def test_lexical_match_is_retrieved_with_its_metadata(self):
+        retriever = HybridRetriever(vector_store=self.vector_store, lexical_index=self.lexical_index, k=1,
+                                    vector_weight=0.5, lexical_weight=1.0)
+
+        documents = asyncio.run(retriever.aget_relevant_documents("ZLayer.fromFunction"))
+
+        self.assertEqual(documents, [DOCS[0]])
+
+    def test_disabled_lexical_search_is_pure_vector_search(self):
+        retriever = HybridRetriever(vector_store=self.vector_store, lexical_index=self.lexical_index, k=3,
+                                    lexical_weight=0.0)
+
+        documents = retriever.get_relevant_documents("fiber interrupted")
+
+        self.assertEqual(documents, self.vector_store.similarity_search("fiber interrupted", k=3))
+
+    def test_retrieval_is_scoped_to_a_project(self):
+        other_project = Document(page_content="ZLayer.fromFunction in another project",
+                                 metadata={"project_id": "project-2"})
+        self.vector_store.add_texts([other_project.page_content], [other_project.metadata])
+        self.lexical_index.add_docs([uuid.uuid4()], [other_project])
+
+        for lambda_mult in [1.0, 0.5]:
+            scoped = HybridRetriever(vector_store=self.vector_store, lexical_index=self.lexical_index, k=5,
+                                     lambda_mult=lambda_mult, project_id="project-2")
+            self.assertEqual(asyncio.run(scoped.aget_relevant_documents("ZLayer.fromFunction")), [other_project])
+            self.assertEqual(scoped.get_relevant_documents("ZLayer.fromFunction"), [other_project])
+
+    def test_mmr_drops_duplicated_chunks(self):
+        self.vector_store.add_texts([DOCS[1].page_content], [{}])
+        retriever = HybridRetriever(vector_store=self.vector_store, k=2, candidates=2, fetch_k=4,
+                                    lambda_mult=0.5)
+
+        documents = asyncio.run(retriever.aget_relevant_documents("fiber interrupted"))
+
+        self.assertEqual(documents[0].page_content, DOCS[1].page_content)
+        self.assertNotEqual(documents[1].page_content, DOCS[1].page_content)
+
+
+class TestMaximalMarginalRelevance(unittest.TestCase):
+    def test_same_selection_as_langchain(self):
+        rng = np.random.default_rng(0)
+        embeddings = rng.normal(size=(50, 16))
+        query = rng.normal(size=16)
+
+        for lambda_mult in [0.0, 0.5, 1.0]:
+            self.assertEqual(maximal_marginal_relevance(query, embeddings, 8, lambda_mult),
+                             langchain_maximal_marginal_relevance(query, list(embeddings), lambda_mult, 8))
+
+    def test_selects_at_most_the_candidates(self):
+        self.assertEqual(maximal_marginal_relevance([1.0, 0.0], np.eye(2), k=5, lambda_mult=0.5), [0, 1])
+        self.assertEqual(maximal_marginal_relevance([1.0, 0.0], np.empty((0, 2)), k=5, lambda_mult=0.5), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.schema import Document
+
+from core.docs.document_loader import _transform_website_pages
+from core.docs.http_cache import unchanged_page
+from core.docs.pipeline import buffered, batched, ordered_map, get_process_pool
+
+
+def slow_square(i: int) -> int:
+    # Later items finish first, the results must still be in the order of the items
+    time.sleep(0.01 * (5 - i % 5))
+    return i * i
+
+
+class TestPipeline(unittest.TestCase):
+    def test_buffered_preserves_order(self):
+        self.assertEqual(list(buffered(range(100), max_size=3)), list(range(100)))
+
+    def test_buffered_limits_items_in_flight(self):
+        produced = []
+        consumed = []
+
+        def produce():
+            for i in range(20):
+                produced.append(i)
+                yield i
+
+        for item in buffered(produce(), max_size=2):
+            consumed.append(item)
+            # The producer can't be more than max_size items ahead, plus the item it is trying to put
+            self.assertLessEqual(len(produced) - len(consumed), 3)
+        self.assertEqual(consumed, list(range(20)))
+
+    def test_buffered_propagates_producer_errors(self):
+        def produce():
+            yield 1
+            raise ValueError("boom")
+
+        items = buffered(produce(), max_size=2)
+        self.assertEqual(next(items), 1)
+        with self.assertRaises(ValueError):
+            next(items)
+
+    def test_buffered_stops_producer_when_consumer_exits(self):
+        finished = threading.Event()
+
+        def produce():
+            try:
+                i = 0
+                while True:
+                    yield i
+                    i += 1
+            finally:
+                finished.set()
+
+        items = buffered(produce(), max_size=1)
+        self.assertEqual(next(items), 0)
+        items.close()
+        self.assertTrue(finished.wait(5))
+
+    def test_batched(self):
+        self.assertEqual(list(batched(range(7), batch_size=3)), [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(list(batched([], batch_size=3)), [])
+
+    def test_ordered_map_preserves_order(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.assertEqual(list(ordered_map(slow_square, range(20), executor, max_pending=8)),
+                             [i * i for i in range(20)])
+
+    def test_ordered_map_limits_items_in_flight(self):
+        submitted = []
+
+        def items():
+            for i in range(20):
+                submitted.append(i)
+                yield i
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for consumed, _ in enumerate(ordered_map(slow_square, items(), executor, max_pending=3), start=1):
+                self.assertLessEqual(len(submitted) - consumed, 3)
+
+    def test_website_pages_are_transformed_the_same_on_a_process_pool(self):
+        def chunks():
+            # Html2TextTransformer converts the pages in place, each run gets its own
+            pages = [Document(page_content=f"<h1>Page {i}</h1>" + "<p>Fibers are lightweight threads.</p>" * 200,
+                              metadata={"source": f"https://zio.dev/{i}"}) for i in range(12)]
+            pages[3] = unchanged_page("https://zio.dev/3")
+            return batched(pages, batch_size=5)
+
+        expected = [doc for docs in ordered_map(_transform_website_pages, chunks(), None, max_pending=1)
+                    for doc in docs]
+        actual = [doc for docs in ordered_map(_transform_website_pages, chunks(), get_process_pool(2), max_pending=4)
+                  for doc in docs]
+        self.assertEqual(actual, expected)
+        self.assertGreater(len(expected), 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import unittest
+from typing import Iterable, List, Optional
+
+from langchain.llms.fake import FakeListLLM
+from langchain.schema import Document
+from langchain.vectorstores import VectorStore
+
+from core.llm.callbacks import QuestionTimer
+from core.llm.chains import qa_with_stuffed_docs_chain, condense_question_chain, get_chat_history, \
+    PackedConversationalRetrievalChain
+from core.llm.context import ContextPacker
+from core.llm.question_answering import is_standalone_question, aprepare_question, aget_documents, \
+    aanswer_question, FIRST_TURN, STANDALONE, CONDENSED
+from core.utils.metrics import registry
+
+
+class RecordingVectorStore(VectorStore):
+    def __init__(self):
+        self.queries = []
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs) -> List[str]:
+        return []
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        self.queries.append(query)
+        return [Document(page_content=f"about {query}")]
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        return cls()
+
+
+def make_chain(vector_store: VectorStore, condensed_question: str) -> PackedConversationalRetrievalChain:
+    return PackedConversationalRetrievalChain(
+        retriever=vector_store.as_retriever(),
+        combine_docs_chain=qa_with_stuffed_docs_chain(FakeListLLM(responses=["the answer"]), "{context} {question}"),
+        question_generator=condense_question_chain(FakeListLLM(responses=[condensed_question])),
+        get_chat_history=get_chat_history,
+        return_source_documents=True,
+        context_packer=ContextPacker(lambda text: len(text.split()), token_budget=1000),
+    )
+
+
+def sample(name: str, **labels) -> float:
+    return registry.get_sample_value(name, labels) or 0.0
+
+
+class TestStandaloneHeuristic(unittest.TestCase):
+    def test_self_contained_questions_are_standalone(self):
+        self.assertTrue(is_standalone_question("How do I retry a ZIO effect with exponential backoff?"))
+        self.assertTrue(is_standalone_question("What is the difference between ZLayer and ZEnvironment?"))
+
+    def test_follow_ups_are_not_standalone(self):
+        self.assertFalse(is_standalone_question("How do I retry it?"))
+        self.assertFalse(is_standalone_question("Can you show an example of that?"))
+        self.assertFalse(is_standalone_question("What about ZIO 1?"))
+        self.assertFalse(is_standalone_question("and with STM"))
+        self.assertFalse(is_standalone_question("Why?"))
+
+
+class TestPrepareQuestion(unittest.TestCase):
+    def setUp(self):
+        self.vector_store = RecordingVectorStore()
+
+    def test_first_turn_is_not_condensed(self):
+        qa = make_chain(self.vector_store, "condensed")
+        prepared = asyncio.run(aprepare_question(qa, "What is a fiber?", []))
+
+        self.assertEqual((prepared.question, prepared.path), ("What is a fiber?", FIRST_TURN))
+
+    def test_standalone_follow_up_is_not_condensed(self):
+        qa = make_chain(self.vector_store, "condensed")
+        before = sample("condense_path_total", path=STANDALONE)
+        question = "How do I interrupt a running fiber in ZIO 2?"
+        prepared = asyncio.run(aprepare_question(qa, question, ["What is a fiber?", "A lightweight thread."]))
+
+        self.assertEqual((prepared.question, prepared.path), (question, STANDALONE))
+        self.assertEqual(sample("condense_path_total", path=STANDALONE), before + 1)
+
+    def test_referring_follow_up_is_condensed(self):
+        qa = make_chain(self.vector_store, "How do I interrupt a fiber?")
+        prepared = asyncio.run(aprepare_question(qa, "How do I interrupt it?", ["What is a fiber?"]))
+
+        self.assertEqual((prepared.question, prepared.path), ("How do I interrupt a fiber?", CONDENSED))
+
+    def test_heuristic_can_be_disabled(self):
+        qa = make_chain(self.vector_store, "condensed")
+        prepared = asyncio.run(aprepare_question(qa, "How do I interrupt a running fiber in ZIO 2?",
+                                                 ["What is a fiber?"], standalone_heuristic=False))
+
+        self.assertEqual(prepared.path, CONDENSED)
+
+
+class TestSpeculativeRetrieval(unittest.TestCase):
+    def setUp(self):
+        self.vector_store = RecordingVectorStore()
+
+    def get_documents(self, qa, question: str) -> List[Document]:
+        async def prepare_and_retrieve():
+            prepared = await aprepare_question(qa, question, ["What is a fiber?"], speculative_retrieval=True)
+            return await aget_documents(qa, prepared)
+
+        return asyncio.run(prepare_and_retrieve())
+
+    def test_speculative_result_is_used_when_question_is_unchanged(self):
+        qa = make_chain(self.vector_store, "Why is it slow")
+        before = sample("speculative_retrieval_total", outcome="used")
+        documents = self.get_documents(qa, "Why is it slow?")
+
+        self.assertEqual(self.vector_store.queries, ["Why is it slow?"])
+        self.assertEqual(documents[0].page_content, "about Why is it slow?")
+        self.assertEqual(sample("speculative_retrieval_total", outcome="used"), before + 1)
+
+    def test_speculative_result_is_discarded_when_question_is_rephrased(self):
+        qa = make_chain(self.vector_store, "Why is a fiber slow?")
+        before = sample("speculative_retrieval_total", outcome="discarded")
+        documents = self.get_documents(qa, "Why is it slow?")
+
+        self.assertEqual(documents[0].page_content, "about Why is a fiber slow?")
+        self.assertEqual(sample("speculative_retrieval_total", outcome="discarded"), before + 1)
+
+
+class TestAnswerQuestion(unittest.TestCase):
+    def test_answer_with_source_documents(self):
+        vector_store = RecordingVectorStore()
+        qa = make_chain(vector_store, "How do I interrupt a fiber?")
+        result = asyncio.run(aanswer_question(qa, "How do I interrupt it?", ["What is a fiber?"]))
+
+        self.assertEqual(result["answer"], "the answer")
+        self.assertEqual(result["generated_question"], "How do I interrupt a fiber?")
+        self.assertEqual(vector_store.queries, ["How do I interrupt a fiber?"])
+        self.assertEqual(len(result["source_documents"]), 1)
+
+
+class TestQuestionTimer(unittest.TestCase):
+    def test_stages_are_recorded_by_project_and_path(self):
+        qa = make_chain(RecordingVectorStore(), "How do I interrupt a fiber?")
+        timer = QuestionTimer("timed-project")
+        asyncio.run(aanswer_question(qa, "How do I interrupt it?", ["What is a fiber?"], timer=timer))
+        timer.observe()
+
+        self.assertEqual(set(timer.stages), {"condense", "retrieve", "stuff", "generate"})
+        for stage in timer.stages:
+            self.assertEqual(sample("chat_stage_latency_seconds_count",
+                                    project="timed-project", path=CONDENSED, stage=stage), 1)
+        self.assertEqual(sample("chat_question_latency_seconds_count", project="timed-project", path=CONDENSED), 1)
+
+    def test_streamed_tokens_are_timed(self):
+        timer = QuestionTimer("streaming-project")
+        timer.path = FIRST_TURN
+
+        async def stream():
+            for token in ["a", "b", "c"]:
+                await asyncio.sleep(0.01)
+                await timer.on_llm_new_token(token)
+
+        asyncio.run(stream())
+        timer.observe()
+
+        self.assertEqual(timer.tokens, 3)
+        self.assertGreater(timer.first_token_time, timer.start_time)
+        self.assertEqual(sample("chat_time_to_first_token_seconds_count",
+                                project="streaming-project", path=FIRST_TURN), 1)
+        self.assertEqual(sample("chat_tokens_per_second_count", project="streaming-project", path=FIRST_TURN), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
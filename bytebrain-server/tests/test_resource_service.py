@@ -0,0 +1,494 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+import uuid
+from datetime import datetime, timedelta
+from unittest import mock
+
+from git import Actor, Repo
+from langchain.schema import Document
+
+from config import JobsConfig, IngestionConfig
+from core.dao.job_dao import JobDao, JobStatus
+from core.dao.lexical_index_dao import LexicalIndexDao
+from core.dao.metadata_dao import MetadataDao
+from core.dao.resource_dao import ResourceDao, ResourceType, ResourceState
+from core.docs.http_cache import PAGE_HASH, unchanged_page
+from core.services.job_service import JobService, JobQueueFull
+from core.services.resource_service import ResourceService, IncrementalIndexer, IndexingStats
+from core.llm.fakes import FakeEmbeddings, InMemoryVectorStore
+from core.llm.vectorstores import project_filter
+from core.services.vectorstore_service import VectorStoreService
+
+
+class FakeSchema:
+    def __init__(self):
+        self.properties = [{"name": "text"}]
+        self.property = self
+
+    def exists(self, class_name):
+        return True
+
+    def get(self, class_name):
+        return {"class": class_name, "properties": self.properties}
+
+    def create(self, class_name, schema_property):
+        self.properties.append(schema_property)
+
+
+class FakeBatch:
+    """Mimics Weaviate's batch delete, which removes at most `limit` matching objects per request."""
+
+    def __init__(self, objects: int, limit: int):
+        self.objects = objects
+        self.limit = limit
+        self.requests = []
+
+    def delete_objects(self, class_name, where):
+        self.requests.append(where)
+        matches = self.objects
+        successful = min(matches, self.limit)
+        self.objects -= successful
+        return {"results": {"matches": matches, "limit": self.limit, "successful": successful, "failed": 0}}
+
+
+class FakeClient:
+    def __init__(self, objects: int, limit: int):
+        self.schema = FakeSchema()
+        self.batch = FakeBatch(objects, limit)
+
+
+class TestVectorStoreDeletion(unittest.TestCase):
+    def test_delete_docs_by_source_id_repeats_until_nothing_matches(self):
+        client = FakeClient(objects=25, limit=10)
+        vectorstore_service = VectorStoreService(None, client, None, "Bytebrain", "text")
+
+        self.assertEqual(vectorstore_service.delete_docs_by_source_id("resource"), 25)
+        self.assertEqual(len(client.batch.requests), 3)
+        self.assertEqual(client.batch.requests[0]["path"], ["doc_source_id"])
+
+    def test_delete_docs_sends_ids_in_chunks(self):
+        client = FakeClient(objects=0, limit=10)
+        vectorstore_service = VectorStoreService(None, client, None, "Bytebrain", "text")
+        vectorstore_service.DELETE_BATCH_SIZE = 2
+
+        vectorstore_service.delete_docs(["a", "b", "c"])
+        self.assertEqual([request["valueTextArray"] for request in client.batch.requests], [["a", "b"], ["c"]])
+
+
+class TestVectorStoreIndexing(unittest.TestCase):
+    def test_index_docs_scopes_chunks_to_their_project(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            client = FakeClient(objects=0, limit=10)
+            vector_store = InMemoryVectorStore(FakeEmbeddings())
+            lexical_index = LexicalIndexDao(os.path.join(temp_dir, "lexical_index.db"))
+            vectorstore_service = VectorStoreService(vector_store, client, None, "Bytebrain", "text", lexical_index)
+
+            vectorstore_service.index_docs([uuid.uuid4()], [Document(page_content="fiber", metadata={})], "project-1")
+            vectorstore_service.index_docs([uuid.uuid4()], [Document(page_content="fiber", metadata={})], "project-2")
+
+            self.assertEqual(client.schema.properties[-1]["name"], "project_id")
+            documents = vector_store.similarity_search("fiber", k=5, where_filter=project_filter("project-1"))
+            self.assertEqual([document.metadata for document in documents], [{"project_id": "project-1"}])
+            self.assertEqual(len(lexical_index.search("fiber", k=5, project_id="project-2")), 1)
+
+
+class TestInMemoryVectorStoreService(unittest.TestCase):
+    def test_benchmark_mode_indexes_and_deletes_without_weaviate(self):
+        vector_store = InMemoryVectorStore(FakeEmbeddings())
+        vectorstore_service = VectorStoreService(vector_store, None, None, "Bytebrain", "text")
+        chunks = [webpage_chunk("fiber"), webpage_chunk("layer"), webpage_chunk("stm")]
+        ids = [uuid.UUID(chunk.metadata["doc_uuid"]) for chunk in chunks]
+
+        vectorstore_service.index_docs(ids, chunks, "project")
+        vectorstore_service.index_docs(ids[:1], chunks[:1], "project")
+        self.assertEqual(len(vector_store.ids), 3)
+        self.assertEqual(vectorstore_service.delete_docs(ids[:1]), 1)
+        self.assertEqual(vectorstore_service.delete_docs_by_source_id("resource"), 2)
+        self.assertEqual(vector_store.ids, [])
+
+
+class RecordingVectorStoreService:
+    def __init__(self):
+        self.deleted_sources = []
+
+    def delete_docs_by_source_id(self, doc_source_id: str) -> int:
+        self.deleted_sources.append(doc_source_id)
+        return 0
+
+
+class RecordingAnswerCacheService:
+    def __init__(self):
+        self.invalidated_projects = []
+
+    def invalidate_project(self, project_id: str):
+        self.invalidated_projects.append(project_id)
+
+
+class TestResourceDeletion(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.resource_dao = ResourceDao(os.path.join(self.temp_dir.name, "resources.db"))
+        self.job_dao = JobDao(os.path.join(self.temp_dir.name, "jobs.db"))
+        self.vectorstore_service = RecordingVectorStoreService()
+        self.answer_cache_service = RecordingAnswerCacheService()
+        self.metadata_dao = MetadataDao(os.path.join(self.temp_dir.name, "metadata.db"))
+        jobs_config = JobsConfig(workers=1, max_pending=10, poll_interval=0.05, concurrency={}, priority={})
+        self.resource_service = ResourceService(self.resource_dao,
+                                                self.vectorstore_service,
+                                                self.metadata_dao,
+                                                JobService(self.job_dao, jobs_config),
+                                                IngestionConfig(16, 512, 128, 16, 0, 8),
+                                                self.answer_cache_service)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_delete_resource_defers_vector_deletion_to_a_job(self):
+        self.resource_dao.add_resource("resource", "docs", ResourceType.Website, "project", {"url": "https://zio.dev"})
+
+        self.resource_service.delete_resource("resource")
+        self.assertIsNone(self.resource_dao.get_by_id("resource"))
+        self.assertEqual(self.vectorstore_service.deleted_sources, [])
+        self.assertEqual(self.answer_cache_service.invalidated_projects, ["project"])
+
+        job = self.job_dao.claim_next_job([])
+        self.assertEqual(job.job_type, ResourceService.DELETE_RESOURCE_JOB)
+        self.resource_service.job_service.handlers[job.job_type](job.payload)
+        self.assertEqual(self.vectorstore_service.deleted_sources, ["resource"])
+
+    def test_deleting_a_project_is_not_limited_by_the_queue_size(self):
+        for i in range(15):
+            self.resource_dao.add_resource(f"resource-{i}", "docs", ResourceType.Webpage, "project", {"url": str(i)})
+
+        self.resource_service.delete_resources_by_project_id("project")
+        self.assertEqual(self.resource_dao.get_resources_by_project_id("project"), [])
+        self.assertEqual(self.job_dao.get_pending_jobs_count(), 15)
+
+    def test_resubmitted_resource_is_indexed_after_its_deletion(self):
+        resource_id = self.resource_service.submit_webpage_resource("docs", "https://zio.dev", "project")
+        self.resource_service.delete_resource(resource_id)
+        self.assertEqual(self.resource_service.submit_webpage_resource("docs", "https://zio.dev", "project"),
+                         resource_id)
+
+        # The delete group is busy, so only the index jobs could be claimed
+        self.assertIsNone(self.job_dao.claim_next_job(["delete"]))
+        delete_job = self.job_dao.claim_next_job([])
+        self.assertEqual(delete_job.job_type, ResourceService.DELETE_RESOURCE_JOB)
+        self.assertIsNone(self.job_dao.claim_next_job([]))
+
+        self.resource_service.job_service.handlers[delete_job.job_type](delete_job.payload)
+        self.job_dao.set_status(delete_job.id, JobStatus.Finished)
+        index_job = self.job_dao.claim_next_job([])
+        self.assertEqual(index_job.job_type, ResourceService.INDEX_RESOURCE_JOB)
+        self.assertEqual(index_job.payload, {"resource_id": resource_id})
+
+    def test_resource_resubmitted_while_indexing_is_indexed_after_its_deletion(self):
+        resource_id = self.resource_service.submit_webpage_resource("docs", "https://zio.dev", "project")
+        running_index_job = self.job_dao.claim_next_job([])
+        self.resource_service.delete_resource(resource_id)
+        self.assertEqual(self.resource_service.submit_webpage_resource("docs", "https://zio.dev", "project"),
+                         resource_id)
+
+        # The delete job waits for the running index job, and the new index job for the delete job
+        self.assertIsNone(self.job_dao.claim_next_job([]))
+        chunk = webpage_chunk("saved by the running index job")
+        chunk.metadata["doc_source_id"] = resource_id
+        self.metadata_dao.save_docs_metadata([chunk])
+        self.job_dao.set_status(running_index_job.id, JobStatus.Finished)
+
+        delete_job = self.job_dao.claim_next_job([])
+        self.assertEqual(delete_job.job_type, ResourceService.DELETE_RESOURCE_JOB)
+        self.assertIsNone(self.job_dao.claim_next_job([]))
+        self.resource_service.job_service.handlers[delete_job.job_type](delete_job.payload)
+        self.assertEqual(self.vectorstore_service.deleted_sources, [resource_id])
+        # Otherwise the new index job would take the chunks for already indexed
+        self.assertEqual(self.metadata_dao.get_docs_ids_by_source_id(resource_id), [])
+        self.job_dao.set_status(delete_job.id, JobStatus.Finished)
+
+        self.assertEqual(self.job_dao.claim_next_job([]).job_type, ResourceService.INDEX_RESOURCE_JOB)
+
+
+class TestResourceUpdate(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.resource_dao = ResourceDao(os.path.join(self.temp_dir.name, "resources.db"))
+        self.job_dao = JobDao(os.path.join(self.temp_dir.name, "jobs.db"))
+        jobs_config = JobsConfig(workers=1, max_pending=1, poll_interval=0.05, concurrency={}, priority={})
+        self.resource_service = ResourceService(self.resource_dao,
+                                                RecordingVectorStoreService(),
+                                                MetadataDao(os.path.join(self.temp_dir.name, "metadata.db")),
+                                                JobService(self.job_dao, jobs_config),
+                                                IngestionConfig(16, 512, 128, 16, 0, 8))
+        self.resource_dao.add_resource("resource", "docs", ResourceType.Webpage, "project", {"url": "https://zio.dev"})
+        self.resource_dao.restore_state("resource", ResourceState.Finished, datetime.now() - timedelta(days=2))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_update_of_a_missing_resource_is_rejected(self):
+        self.assertFalse(self.resource_service.submit_resource_update("missing"))
+
+    def test_update_rejected_by_a_full_queue_keeps_the_resource_state(self):
+        last_updated_at = self.resource_dao.get_last_updated_at("resource")
+        self.job_dao.add_job("index", "webpage", 0, {})
+
+        with self.assertRaises(JobQueueFull):
+            self.resource_service.submit_resource_update("resource")
+        self.assertEqual(self.resource_dao.get_resource_status("resource"), ResourceState.Finished)
+        self.assertEqual(self.resource_dao.get_last_updated_at("resource"), last_updated_at)
+
+        self.job_dao.claim_next_job([])
+        self.assertTrue(self.resource_service.submit_resource_update("resource"))
+        self.assertEqual(self.resource_dao.get_resource_status("resource"), ResourceState.Pending)
+
+
+class TestProjectScoping(unittest.TestCase):
+    def test_startup_scopes_chunks_indexed_without_project(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            resource_dao = ResourceDao(os.path.join(temp_dir, "resources.db"))
+            metadata_dao = MetadataDao(os.path.join(temp_dir, "metadata.db"))
+            job_dao = JobDao(os.path.join(temp_dir, "jobs.db"))
+            vector_store = InMemoryVectorStore(FakeEmbeddings())
+            lexical_index = LexicalIndexDao(os.path.join(temp_dir, "lexical_index.db"))
+            vectorstore_service = VectorStoreService(vector_store, FakeClient(objects=0, limit=10), None,
+                                                     "Bytebrain", "text", lexical_index)
+            jobs_config = JobsConfig(workers=1, max_pending=10, poll_interval=0.05, concurrency={}, priority={})
+            resource_service = ResourceService(resource_dao, vectorstore_service, metadata_dao,
+                                               JobService(job_dao, jobs_config), IngestionConfig(16, 512, 128, 16, 0, 8))
+            resource_dao.add_resource("resource", "docs", ResourceType.Webpage, "project", {"url": "https://zio.dev"})
+            resource_dao.set_state("resource", ResourceState.Finished)
+            chunks = [webpage_chunk("fiber"), webpage_chunk("fiber interruption")]
+            vectorstore_service.index_docs([uuid.UUID(chunk.metadata["doc_uuid"]) for chunk in chunks], chunks)
+            metadata_dao.save_docs_metadata(chunks)
+            self.assertEqual(vector_store.similarity_search("fiber", k=5, where_filter=project_filter("project")), [])
+
+            resource_service.resume_unfinished_resources()
+            job = job_dao.claim_next_job([])
+            self.assertEqual(job.job_type, ResourceService.SCOPE_RESOURCE_JOB)
+            resource_service.job_service.handlers[job.job_type](job.payload)
+
+            documents = vector_store.similarity_search("fiber", k=5, where_filter=project_filter("project"))
+            self.assertEqual(len(documents), 2)
+            self.assertEqual(len(lexical_index.search("fiber", k=5, project_id="project")), 2)
+            self.assertEqual(lexical_index.search("fiber", k=5), [])
+            self.assertEqual(metadata_dao.get_unscoped_source_ids(), [])
+
+
+class TestLexicalIndexBackfill(unittest.TestCase):
+    def test_startup_adds_chunks_indexed_before_the_lexical_index(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            resource_dao = ResourceDao(os.path.join(temp_dir, "resources.db"))
+            metadata_dao = MetadataDao(os.path.join(temp_dir, "metadata.db"))
+            job_dao = JobDao(os.path.join(temp_dir, "jobs.db"))
+            vector_store = InMemoryVectorStore(FakeEmbeddings())
+            resource_dao.add_resource("resource", "docs", ResourceType.Webpage, "project", {"url": "https://zio.dev"})
+            resource_dao.set_state("resource", ResourceState.Finished)
+            chunks = [webpage_chunk("fiber"), webpage_chunk("fiber interruption")]
+            VectorStoreService(vector_store, FakeClient(objects=0, limit=10), None, "Bytebrain", "text") \
+                .index_docs([uuid.UUID(chunk.metadata["doc_uuid"]) for chunk in chunks], chunks, "project")
+            metadata_dao.save_docs_metadata(chunks)
+
+            lexical_index = LexicalIndexDao(os.path.join(temp_dir, "lexical_index.db"))
+            vectorstore_service = VectorStoreService(vector_store, FakeClient(objects=0, limit=10), None,
+                                                     "Bytebrain", "text", lexical_index)
+            jobs_config = JobsConfig(workers=1, max_pending=10, poll_interval=0.05, concurrency={}, priority={})
+            resource_service = ResourceService(resource_dao, vectorstore_service, metadata_dao,
+                                               JobService(job_dao, jobs_config), IngestionConfig(16, 512, 128, 16, 0, 8))
+            resource_service.resume_unfinished_resources()
+            job = job_dao.claim_next_job([])
+            self.assertEqual(job.job_type, ResourceService.LEXICAL_INDEX_RESOURCE_JOB)
+            resource_service.job_service.handlers[job.job_type](job.payload)
+            job_dao.set_status(job.id, JobStatus.Finished)
+
+            documents = [document for document, _ in lexical_index.search("interruption", k=5, project_id="project")]
+            self.assertEqual([document.page_content for document in documents], ["fiber interruption"])
+            self.assertEqual(documents[0].metadata["doc_url"], "https://zio.dev")
+            resource_service.resume_unfinished_resources()
+            self.assertIsNone(job_dao.claim_next_job([]))
+
+
+class TestYouTubeIndexing(unittest.TestCase):
+    def test_same_video_in_two_projects_has_distinct_chunks(self):
+        class FakeYoutubeLoader:
+            def load(self):
+                return [Document(page_content="Fibers are lightweight threads",
+                                 metadata={"title": "ZIO fibers", "view_count": 1, "thumbnail_url": None,
+                                           "publish_date": None, "length": 60, "author": "ZIO"})]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            resource_dao = ResourceDao(os.path.join(temp_dir, "resources.db"))
+            vectorstore_service = RecordingIndexingService()
+            jobs_config = JobsConfig(workers=1, max_pending=10, poll_interval=0.05, concurrency={}, priority={})
+            resource_service = ResourceService(resource_dao, vectorstore_service,
+                                               MetadataDao(os.path.join(temp_dir, "metadata.db")),
+                                               JobService(JobDao(os.path.join(temp_dir, "jobs.db")), jobs_config),
+                                               IngestionConfig(16, 512, 128, 16, 0, 8))
+            url = "https://www.youtube.com/watch?v=zio"
+            with mock.patch("core.docs.document_loader.YoutubeLoader.from_youtube_url",
+                            return_value=FakeYoutubeLoader()):
+                indexed_ids = {}
+                for project_id in ["project-1", "project-2"]:
+                    resource_id = resource_service.submit_youtube_resource("fibers", url, project_id)
+                    vectorstore_service.indexed_ids = []
+                    resource_service.index_youtube_resource(resource_id, url, project_id)
+                    indexed_ids[project_id] = set(vectorstore_service.indexed_ids)
+
+            self.assertEqual(len(indexed_ids["project-1"]), 1)
+            self.assertEqual(indexed_ids["project-1"] & indexed_ids["project-2"], set())
+
+
+class RecordingIndexingService:
+    def __init__(self):
+        self.indexed_ids = []
+        self.deleted_ids = []
+
+    def index_docs(self, uuids, docs, project_id=None):
+        for doc in docs:
+            doc.metadata["project_id"] = project_id
+        self.indexed_ids.extend(uuids)
+
+    def delete_docs(self, ids) -> int:
+        self.deleted_ids.extend(ids)
+        return len(ids)
+
+
+def webpage_chunk(content: str) -> Document:
+    return Document(page_content=content, metadata={"doc_uuid": str(uuid.uuid5(uuid.NAMESPACE_URL, content)),
+                                                    "doc_source_id": "resource",
+                                                    "doc_source_type": ResourceType.Webpage.value,
+                                                    "doc_url": "https://zio.dev",
+                                                    PAGE_HASH: "page-1"})
+
+
+class TestIncrementalIndexing(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.metadata_dao = MetadataDao(os.path.join(self.temp_dir.name, "metadata.db"))
+        self.vectorstore_service = RecordingIndexingService()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def index(self, contents, project_id="project") -> IndexingStats:
+        indexer = IncrementalIndexer(self.vectorstore_service, self.metadata_dao, "resource", ResourceType.Webpage,
+                                     project_id)
+        indexer.index([webpage_chunk(content) for content in contents])
+        return indexer.finish()
+
+    def test_reindexing_only_embeds_changed_chunks_and_deletes_vanished_ones(self):
+        self.assertEqual(self.index(["a", "b", "c"]), IndexingStats(indexed=3, unchanged=0, deleted=0))
+        self.vectorstore_service.indexed_ids = []
+
+        self.assertEqual(self.index(["a", "b", "d"]), IndexingStats(indexed=1, unchanged=2, deleted=1))
+        self.assertEqual(self.vectorstore_service.indexed_ids, [uuid.uuid5(uuid.NAMESPACE_URL, "d")])
+        self.assertEqual(self.vectorstore_service.deleted_ids, [uuid.uuid5(uuid.NAMESPACE_URL, "c")])
+        stored_ids = {m["doc_uuid"] for m in self.metadata_dao.get_metadata_list(ResourceType.Webpage.value,
+                                                                                  "resource")}
+        self.assertEqual(stored_ids, {str(uuid.uuid5(uuid.NAMESPACE_URL, content)) for content in "abd"})
+
+    def test_unchanged_page_keeps_its_chunks(self):
+        self.index(["a", "b"])
+        indexer = IncrementalIndexer(self.vectorstore_service, self.metadata_dao, "resource", ResourceType.Webpage,
+                                     "project")
+        self.assertEqual(indexer.indexed_pages, {"https://zio.dev": "page-1"})
+
+        indexer.index([unchanged_page("https://zio.dev")])
+        self.assertEqual(indexer.finish(), IndexingStats(indexed=0, unchanged=2, deleted=0))
+
+    def test_chunks_of_another_project_are_reindexed(self):
+        self.index(["a"], project_id="project-1")
+
+        self.assertEqual(self.index(["a"], project_id="project-2"), IndexingStats(indexed=1, unchanged=0, deleted=0))
+
+
+class TestGitHubIndexing(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.origin_path = os.path.join(self.temp_dir.name, "origin")
+        self.origin = Repo.init(self.origin_path, initial_branch="main")
+        self.resource_dao = ResourceDao(os.path.join(self.temp_dir.name, "resources.db"))
+        self.metadata_dao = MetadataDao(os.path.join(self.temp_dir.name, "metadata.db"))
+        self.vectorstore_service = RecordingIndexingService()
+        jobs_config = JobsConfig(workers=1, max_pending=10, poll_interval=0.05, concurrency={}, priority={})
+        self.git_mirrors_dir = os.path.join(self.temp_dir.name, "git-mirrors")
+        self.resource_service = ResourceService(self.resource_dao,
+                                                self.vectorstore_service,
+                                                self.metadata_dao,
+                                                JobService(JobDao(os.path.join(self.temp_dir.name, "jobs.db")),
+                                                           jobs_config),
+                                                IngestionConfig(16, 512, 128, 16, 0, 8),
+                                                git_mirrors_dir=self.git_mirrors_dir)
+        self.resource_dao.add_resource("resource", "zio", ResourceType.GitHub, "project",
+                                       {"language": "scala", "clone_url": self.origin_path, "paths": "**/*.scala",
+                                        "branch": None})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def commit(self, files):
+        for name, content in files.items():
+            path = os.path.join(self.origin_path, name)
+            if content is None:
+                self.origin.index.remove([name], working_tree=True)
+            else:
+                with open(path, "w") as file:
+                    file.write(content)
+                self.origin.index.add([name])
+        author = Actor("ZIO", "zio@example.com")
+        self.origin.index.commit("Update", author=author, committer=author)
+
+    def index(self):
+        self.vectorstore_service.indexed_ids = []
+        self.resource_service.index_github_resource("resource", self.origin_path, "scala", "**/*.scala", None,
+                                                    "project")
+
+    def indexed_paths(self):
+        return sorted(m["doc_path"] for m in self.metadata_dao.get_metadata_list(ResourceType.GitHub.value,
+                                                                                  "resource"))
+
+    def test_update_only_loads_the_files_changed_since_the_indexed_commit(self):
+        self.commit({"Fiber.scala": "object Fiber", "ZIO.scala": "object ZIO", "README.md": "# ZIO"})
+        self.index()
+        self.assertEqual(self.indexed_paths(), ["Fiber.scala", "ZIO.scala"])
+        self.assertEqual(self.resource_dao.get_by_id("resource").metadata["indexed_commit"],
+                         self.origin.head.commit.hexsha)
+
+        self.commit({"Fiber.scala": "object Fiber { def interrupt = ??? }", "ZIO.scala": None,
+                     "Schedule.scala": "object Schedule"})
+        self.index()
+        self.assertEqual(self.indexed_paths(), ["Fiber.scala", "Schedule.scala"])
+        self.assertEqual(len(self.vectorstore_service.indexed_ids), 2)
+        self.assertEqual(len(self.vectorstore_service.deleted_ids), 2)
+
+        self.commit({"README.md": "# ZIO 2"})
+        self.index()
+        self.assertEqual(self.indexed_paths(), ["Fiber.scala", "Schedule.scala"])
+        self.assertEqual(self.vectorstore_service.indexed_ids, [])
+
+    def test_deleting_the_resource_deletes_its_mirror(self):
+        self.commit({"ZIO.scala": "object ZIO"})
+        self.index()
+        self.assertTrue(os.path.isdir(os.path.join(self.git_mirrors_dir, "resource")))
+
+        self.resource_service.vectorstore_service = RecordingVectorStoreService()
+        self.resource_service._run_delete_job({"resource_id": "resource"})
+        self.assertFalse(os.path.isdir(os.path.join(self.git_mirrors_dir, "resource")))
+
+
+if __name__ == '__main__':
+    unittest.main()
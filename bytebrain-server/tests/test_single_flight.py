@@ -0,0 +1,120 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import unittest
+
+from core.llm.callbacks import QuestionTimer, StreamingLLMCallbackHandler
+from core.llm.single_flight import SingleFlight
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_json(self, data):
+        self.frames.append(data)
+
+    def text(self) -> str:
+        return "".join(frame["token"] for frame in self.frames)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.single_flight = SingleFlight()
+        self.calls = []
+
+    def answer(self, name: str, tokens=("ZIO ", "is ", "an ", "effect ", "system"), fail=False):
+        async def function(stream: StreamingLLMCallbackHandler):
+            self.calls.append(name)
+            for token in tokens:
+                await asyncio.sleep(0.01)
+                await stream.on_llm_new_token(token)
+            if fail:
+                raise ValueError("boom")
+            return f"references of {name}"
+
+        return function
+
+    async def ask(self, key, name: str, delay: float = 0.0, callbacks=(), **kwargs):
+        await asyncio.sleep(delay)
+        websocket = RecordingWebSocket()
+        result = await self.single_flight.run(key, StreamingLLMCallbackHandler(websocket), self.answer(name, **kwargs),
+                                              callbacks=callbacks)
+        return result, websocket.text()
+
+    def test_identical_questions_share_one_answer(self):
+        async def run():
+            return await asyncio.gather(self.ask("key", "first"), self.ask("key", "second", delay=0.025))
+
+        (first, first_text), (second, second_text) = asyncio.run(run())
+
+        self.assertEqual(self.calls, ["first"])
+        self.assertEqual(first, ("references of first", False))
+        self.assertEqual(second, ("references of first", True))
+        self.assertEqual(first_text, "ZIO is an effect system")
+        self.assertEqual(second_text, "ZIO is an effect system")
+        self.assertEqual(self.single_flight.flights, {})
+
+    def test_follower_timer_records_the_tokens_reaching_it(self):
+        leader_timer = QuestionTimer("project")
+        follower_timer = QuestionTimer("project")
+
+        async def run():
+            await asyncio.gather(self.ask("key", "first", callbacks=[leader_timer]),
+                                 self.ask("key", "second", delay=0.025, callbacks=[follower_timer]))
+
+        asyncio.run(run())
+
+        # The leader's tokens are reported by the answer itself, which doesn't know about the timer here
+        self.assertEqual(leader_timer.tokens, 0)
+        self.assertEqual(follower_timer.tokens, 5)
+        self.assertGreaterEqual(follower_timer.first_token_time - follower_timer.start_time, 0.025)
+        self.assertGreaterEqual(follower_timer.last_token_time, follower_timer.first_token_time)
+
+    def test_different_questions_and_later_questions_are_answered_separately(self):
+        async def run():
+            await asyncio.gather(self.ask("key", "first"), self.ask("other", "other"))
+            await self.ask("key", "later")
+
+        asyncio.run(run())
+
+        self.assertEqual(sorted(self.calls), ["first", "later", "other"])
+
+    def test_failures_are_shared(self):
+        async def run():
+            return await asyncio.gather(self.ask("key", "first", fail=True), self.ask("key", "second", delay=0.01),
+                                        return_exceptions=True)
+
+        results = asyncio.run(run())
+
+        self.assertIsInstance(results[0], ValueError)
+        self.assertIsInstance(results[1], ValueError)
+
+    def test_answer_completes_when_the_first_caller_leaves(self):
+        async def run():
+            first = asyncio.ensure_future(self.ask("key", "first"))
+            second = asyncio.ensure_future(self.ask("key", "second", delay=0.005))
+            await asyncio.sleep(0.02)
+            first.cancel()
+            return await second
+
+        (result, shared), text = asyncio.run(run())
+
+        self.assertEqual((result, shared), ("references of first", True))
+        self.assertEqual(text, "ZIO is an effect system")
+
+
+if __name__ == '__main__':
+    unittest.main()
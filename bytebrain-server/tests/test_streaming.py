@@ -0,0 +1,114 @@
+# Copyright 2023-2024 ByteBrain AI
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import unittest
+from unittest import mock
+
+from core.llm.callbacks import StreamingLLMCallbackHandler
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_json(self, data):
+        self.frames.append(data)
+
+
+class TestStreamingLLMCallbackHandler(unittest.TestCase):
+    def stream(self, handler: StreamingLLMCallbackHandler, tokens, delay: float = 0.0):
+        async def run():
+            for token in tokens:
+                await handler.on_llm_new_token(token)
+                await asyncio.sleep(delay)
+            await handler.flush()
+
+        asyncio.run(run())
+
+    def test_unbuffered_sends_a_frame_per_token(self):
+        websocket = RecordingWebSocket()
+        self.stream(StreamingLLMCallbackHandler(websocket), ["a", "b", "c"])
+
+        self.assertEqual(websocket.frames, [{"token": token, "completed": False} for token in ["a", "b", "c"]])
+
+    def test_buffered_flushes_when_enough_characters_are_buffered(self):
+        websocket = RecordingWebSocket()
+        handler = StreamingLLMCallbackHandler(websocket, flush_interval=60, flush_chars=4)
+        self.stream(handler, ["ab", "cd", "ef", "g"])
+
+        self.assertEqual([frame["token"] for frame in websocket.frames], ["abcd", "efg"])
+
+    def test_buffered_flushes_after_the_interval(self):
+        websocket = RecordingWebSocket()
+        handler = StreamingLLMCallbackHandler(websocket, flush_interval=0.01)
+
+        async def run():
+            await handler.on_llm_new_token("a")
+            await handler.on_llm_new_token("b")
+            await asyncio.sleep(0.05)
+            self.assertEqual(websocket.frames, [{"token": "ab", "completed": False}])
+            await handler.on_llm_new_token("c")
+            await handler.flush()
+
+        asyncio.run(run())
+        self.assertEqual([frame["token"] for frame in websocket.frames], ["ab", "c"])
+
+    def test_flush_waits_for_the_timed_flush(self):
+        sent = []
+
+        class SlowWebSocket:
+            async def send_json(self, data):
+                await asyncio.sleep(0.02)
+                sent.append(data["token"])
+
+        handler = StreamingLLMCallbackHandler(SlowWebSocket(), flush_interval=0.01)
+
+        async def run():
+            await handler.on_llm_new_token("a")
+            await asyncio.sleep(0.015)
+            self.assertEqual(len(handler.flush_tasks), 1)
+            await handler.on_llm_end(None)
+            self.assertEqual(sent, ["a"])
+            self.assertEqual(handler.flush_tasks, set())
+
+        asyncio.run(run())
+
+    def test_failed_timed_flush_is_logged(self):
+        class ClosedWebSocket:
+            async def send_json(self, data):
+                raise RuntimeError("closed")
+
+        handler = StreamingLLMCallbackHandler(ClosedWebSocket(), flush_interval=0.01)
+
+        async def run():
+            await handler.on_llm_new_token("a")
+            await asyncio.sleep(0.05)
+
+        with mock.patch("core.llm.callbacks.log") as log:
+            asyncio.run(run())
+        log.error.assert_called_once()
+        self.assertEqual(handler.flush_tasks, set())
+
+    def test_buffered_frames_reassemble_the_answer(self):
+        websocket = RecordingWebSocket()
+        answer = "Use `Ref.make`:\n\n```scala\nRef.make(0)\n```  done"
+        asyncio.run(StreamingLLMCallbackHandler(websocket, flush_interval=60, flush_chars=8).replay(answer))
+
+        self.assertLess(len(websocket.frames), len(answer.split()))
+        self.assertEqual("".join(frame["token"] for frame in websocket.frames), answer)
+
+
+if __name__ == '__main__':
+    unittest.main()